@@ -0,0 +1,170 @@
+"""
+pytest plumbing of the ingest benchmarks: command line options, the
+``bench`` fixture, the comparison with baselines.json and the results
+table printed at the end of the run.
+"""
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the Hammurabi scripts import each other as siblings
+sys.path.insert(0, os.path.dirname(HERE))
+
+ASSETS_DIR = os.path.join(os.path.dirname(HERE), "hammurabi-ui", "public", "assets")
+DEFAULT_DATA = os.path.join(ASSETS_DIR, "NBIA_DICOM_Files", "manifest-BaJgFARK7427162305084893340")
+BASELINES_JSON = os.path.join(HERE, "baselines.json")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("ingest benchmarks")
+    group.addoption("--bench-data", default=DEFAULT_DATA,
+                    help="NBIA manifest folder (metadata.csv + series folders) to run on")
+    group.addoption("--bench-assets", default=ASSETS_DIR,
+                    help="folder whose .dcm files (walked recursively) the archive-wide header benchmark reads")
+    group.addoption("--bench-repeat", type=int, default=5, help="timed runs per benchmark, the best one counts")
+    group.addoption("--bench-tolerance", type=float, default=0.5,
+                    help="flag throughput below (1 - tolerance) x baseline or peak memory "
+                         "above (1 + tolerance) x baseline (default 0.5)")
+    group.addoption("--bench-check", action="store_true",
+                    help="fail on flagged benchmarks; use it on the machine the baselines were recorded on "
+                         "(by default they are only reported)")
+    group.addoption("--update-baselines", action="store_true", help="record this run as the new baselines.json")
+    group.addoption("--bench-report", default=None, help="also write this run's results as JSON here")
+
+
+class Bench:
+    """Runs and records benchmarks; compares them with the stored baselines."""
+
+    def __init__(self, config):
+        self.repeat = max(1, config.getoption("--bench-repeat"))
+        self.tolerance = config.getoption("--bench-tolerance")
+        self.update = config.getoption("--update-baselines")
+        self.strict = config.getoption("--bench-check")
+        self.baselines = {}
+        self.baseline_machine = None
+        if os.path.exists(BASELINES_JSON):
+            with open(BASELINES_JSON, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            self.baselines = doc.get("benchmarks", {})
+            self.baseline_machine = doc.get("machine")
+        self.results = {}
+        self.regressions = {}
+
+    def run(self, name, fn, items, nbytes, unit="files"):
+        """
+        Time ``fn()`` (best of --bench-repeat runs, stdout silenced), then run
+        it once more under tracemalloc for the peak Python heap.  ``items``
+        and ``nbytes`` are the work one call does: files (or rows) and bytes.
+        """
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            best = float("inf")
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            tracemalloc.start()
+            try:
+                fn()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        result = {
+            "unit": unit,
+            "items": items,
+            "bytes": nbytes,
+            "seconds": round(best, 6),
+            "itemsPerSecond": round(items / best, 1),
+            "mbPerSecond": round(nbytes / 1e6 / best, 2),
+            "peakMB": round(peak / 1e6, 2),
+        }
+        self.results[name] = result
+        self.check(name, result)
+        return result
+
+    def check(self, name, result):
+        """
+        Compare with the baseline.  Absolute throughput only means something
+        on the machine that recorded it, so a regression fails the test with
+        --bench-check and is only reported otherwise.
+        """
+        baseline = self.baselines.get(name)
+        # baselines only mean something for the same amount of work
+        if self.update or not baseline or baseline["items"] != result["items"]:
+            return
+        problems = []
+        floor = baseline["itemsPerSecond"] * (1 - self.tolerance)
+        if result["itemsPerSecond"] < floor:
+            problems.append(f"{result['itemsPerSecond']:.0f} {result['unit']}/s, "
+                            f"baseline {baseline['itemsPerSecond']:.0f} (floor {floor:.0f})")
+        ceiling = baseline["peakMB"] * (1 + self.tolerance) + 1.0
+        if result["peakMB"] > ceiling:
+            problems.append(f"peak {result['peakMB']:.1f} MB, baseline {baseline['peakMB']:.1f} MB")
+        if problems:
+            self.regressions[name] = "; ".join(problems)
+            assert not self.strict, f"{name}: {self.regressions[name]}"
+
+    @staticmethod
+    def machine():
+        return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+    def save(self, path, results):
+        doc = {"machine": self.machine(), "benchmarks": results}
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(doc, out, indent=2, sort_keys=True)
+            out.write("\n")
+
+
+_BENCH = pytest.StashKey[Bench]()
+
+
+def pytest_configure(config):
+    config.stash[_BENCH] = Bench(config)
+
+
+@pytest.fixture(scope="session")
+def bench(pytestconfig):
+    return pytestconfig.stash[_BENCH]
+
+
+def pytest_sessionfinish(session, exitstatus):
+    bench = session.config.stash[_BENCH]
+    if not bench.results:
+        return
+    if bench.update:
+        bench.save(BASELINES_JSON, {**bench.baselines, **bench.results})
+    report = session.config.getoption("--bench-report")
+    if report:
+        bench.save(report, bench.results)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    bench = config.stash[_BENCH]
+    if not bench.results:
+        return
+    tr = terminalreporter
+    tr.section("ingest benchmarks")
+    tr.write_line(f"{'benchmark':<26}{'items':>8}{'seconds':>10}{'items/s':>12}{'MB/s':>9}{'peak MB':>9}{'vs base':>9}")
+    for name, r in bench.results.items():
+        baseline = bench.baselines.get(name)
+        versus = ""
+        if baseline and baseline["items"] == r["items"]:
+            versus = f"{100.0 * r['itemsPerSecond'] / baseline['itemsPerSecond']:.0f}%"
+        flag = " !" if name in bench.regressions else ""
+        tr.write_line(f"{name:<26}{r['items']:>8}{r['seconds']:>10.3f}{r['itemsPerSecond']:>12.0f}"
+                      f"{r['mbPerSecond']:>9.1f}{r['peakMB']:>9.1f}{versus:>9}  ({r['unit']}){flag}")
+    for name, problem in bench.regressions.items():
+        tr.write_line(f"! {name}: {problem}")
+    if bench.regressions and not bench.strict:
+        machine = bench.baseline_machine
+        where = "" if machine == bench.machine() else f" (baselines from another machine: {machine})"
+        tr.write_line(f"regressions reported only, pass --bench-check to fail on them{where}")
+    if bench.update:
+        tr.write_line(f"baselines written to {BASELINES_JSON}")
@@ -0,0 +1,118 @@
+"""
+Round trips of cine_stream.py (encoder -> CineStream reference decoder) on
+synthetic volumes, and the encode / decode throughput on the longest
+series of the bundled data (see --bench-data).
+
+    python -m pytest benchmarks/test_cine_stream.py -q
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from cine_stream import CineStream, encode_series, encode_volume
+from series_volume import HEADER_SUFFIX, open_volume, pack_series
+from synthetic_corpus import load_templates
+
+
+def _write_stream(tmp_path, volume, **kwargs):
+    """Encode ``volume`` and write an index as encode_series does; returns the CineStream."""
+    stream_path = str(tmp_path / "series.cine")
+    codec = kwargs.get("codec", "deflate")
+    chunks = encode_volume(volume, stream_path, **kwargs)
+    index = {"stream": "series.cine", "dtype": volume.dtype.str, "frames": len(volume), "rows": volume.shape[1],
+             "columns": volume.shape[2], "samplesPerPixel": volume.shape[3] if volume.ndim == 4 else 1,
+             "codec": codec, "chunks": chunks}
+    with open(tmp_path / "series.cine.json", "w", encoding="utf-8") as out:
+        json.dump(index, out)
+    return CineStream(str(tmp_path / "series.cine.json"))
+
+
+def _slices(dtype, frames=37, rows=48, columns=40, seed=0):
+    """Smooth, slowly changing slices plus noise: neighbours correlate like an MR stack."""
+    rng = np.random.default_rng(seed)
+    z, y, x = np.mgrid[0:frames, 0:rows, 0:columns]
+    body = 600 + 400 * np.sin(x / 7.0 + z / 11.0) * np.cos(y / 9.0)
+    return (body + rng.normal(0, 3, body.shape)).astype(dtype)
+
+
+@pytest.mark.parametrize("volume", [
+    _slices(np.uint16),
+    _slices(np.int16) - 900,
+    # extremes: every wrapped difference, including -32768 / 65535
+    np.array([[[0, 65535]], [[65535, 0]], [[32768, 32767]], [[1, 65534]]], dtype=np.uint16),
+    np.array([[[-32768, 32767]], [[32767, -32768]], [[0, -1]]], dtype=np.int16),
+    _slices(np.uint8, frames=5)[..., np.newaxis].repeat(3, axis=3),
+    _slices(np.float32, frames=9),
+], ids=["uint16", "int16", "uint16-wrap", "int16-wrap", "rgb", "float32"])
+def test_round_trip(tmp_path, volume):
+    stream = _write_stream(tmp_path, volume, chunk_frames=8)
+    decoded = stream.read_all()
+    assert decoded.dtype == volume.dtype and decoded.shape == volume.shape
+    assert np.array_equal(decoded, volume)
+    assert np.array_equal(np.stack(list(stream)), volume)
+
+
+def test_random_seek_reads_one_chunk(tmp_path):
+    volume = _slices(np.uint16)
+    stream = _write_stream(tmp_path, volume, chunk_frames=8)
+    assert [c["frames"] for c in stream.index["chunks"]] == [8, 8, 8, 8, 5]
+    for frame in np.random.default_rng(1).permutation(len(volume)):
+        assert np.array_equal(stream.frame(int(frame)), volume[frame])
+    assert stream.chunk_of(36) == 4
+    with pytest.raises(IndexError):
+        stream.frame(len(volume))
+
+
+def test_correlated_slices_are_delta_coded(tmp_path):
+    volume = _slices(np.uint16)
+    stream = _write_stream(tmp_path, volume)
+    assert all(c["delta"] for c in stream.index["chunks"])
+    assert os.path.getsize(stream.path) * 2 < volume.nbytes
+
+
+def test_zstd_round_trip(tmp_path):
+    pytest.importorskip("zstandard")
+    volume = _slices(np.int16)
+    assert np.array_equal(_write_stream(tmp_path, volume, codec="zstd").read_all(), volume)
+
+
+@pytest.fixture(scope="module")
+def packed_series(pytestconfig, tmp_path_factory):
+    """Header path of the longest bundled series, packed with series_volume.py."""
+    base_dir = pytestconfig.getoption("--bench-data")
+    templates = load_templates([base_dir]) if os.path.isdir(base_dir) else []
+    if not templates:
+        pytest.skip(f"no DICOM series under {base_dir}")
+    longest = max(templates, key=lambda t: len(t["paths"]))
+    out_dir = str(tmp_path_factory.mktemp("volumes"))
+    header = pack_series(("series", longest["paths"], out_dir))
+    if "error" in header:
+        pytest.skip(f"cannot pack {longest['paths'][0]}: {header['error']}")
+    return os.path.join(out_dir, "series" + HEADER_SUFFIX)
+
+
+def _decode(index_path, out):
+    out[:] = list(CineStream(index_path))
+
+
+def test_encode_series(bench, packed_series, tmp_path):
+    job = (packed_series, str(tmp_path), 16, "deflate", None)
+    index = encode_series(job)
+    assert "error" not in index
+    assert index["streamBytes"] < index["rawBytes"]
+
+    def encode():
+        os.remove(tmp_path / "series.cine.json")  # force a fresh encode
+        encode_series(job)
+
+    bench.run("cine_encode", encode, index["frames"], index["rawBytes"], unit="frames")
+    # unchanged volume and settings: the stream is reused
+    assert encode_series(job) == index
+
+    _, volume = open_volume(packed_series)
+    decoded = []
+    bench.run("cine_decode", lambda: _decode(str(tmp_path / "series.cine.json"), decoded),
+              index["frames"], index["rawBytes"], unit="frames")
+    assert np.array_equal(np.stack(decoded), volume)
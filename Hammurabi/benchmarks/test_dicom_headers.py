@@ -0,0 +1,113 @@
+"""
+The prefix reader of dicom_headers.py against pydicom: the same values
+for every header tag the catalog uses, on every .dcm file under
+--bench-assets, and the pydicom fallback for what it does not parse (no
+preamble, big endian, wanted sequences).
+
+    python -m pytest benchmarks/test_dicom_headers.py -q
+"""
+import pydicom
+import pytest
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRBigEndian, ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+from build_catalog import walk_files
+from dicom_headers import CATALOG_TAGS, UnsupportedHeader, read_header, read_prefix, read_transfer_syntax
+
+
+def _values(ds, tags):
+    return {tag: ds[tag].value if tag in ds else None for tag in tags}
+
+
+@pytest.fixture(scope="module")
+def asset_paths(pytestconfig):
+    paths = list(walk_files(pytestconfig.getoption("--bench-assets")))
+    if not paths:
+        pytest.skip("no .dcm files under --bench-assets")
+    return paths
+
+
+def test_prefix_reader_matches_pydicom(asset_paths):
+    fallbacks = 0
+    for path in asset_paths:
+        expected = _values(pydicom.dcmread(path, stop_before_pixels=True), CATALOG_TAGS)
+        try:
+            ds = read_prefix(path, CATALOG_TAGS)
+        except UnsupportedHeader:
+            fallbacks += 1
+            ds = read_header(path, CATALOG_TAGS)
+        assert _values(ds, CATALOG_TAGS) == expected, path
+    # the bundled files are all little endian with a preamble: none should need pydicom
+    assert fallbacks == 0
+
+
+def _with_sequence(ds, undefined_length):
+    """``ds`` plus a two item ReferencedImageSequence (0008,1140), ahead of the 0010 / 0020 group tags."""
+    items = []
+    for uid in ("1.2.3.4", "1.2.3.5"):
+        item = Dataset()
+        item.ReferencedSOPClassUID = "1.2.840.10008.5.1.4.1.1.4"
+        item.ReferencedSOPInstanceUID = uid
+        item.is_undefined_length_sequence_item = undefined_length
+        items.append(item)
+    ds.ReferencedImageSequence = Sequence(items)
+    ds["ReferencedImageSequence"].is_undefined_length = undefined_length
+    return ds
+
+
+@pytest.fixture
+def template(asset_paths):
+    ds = pydicom.dcmread(asset_paths[0], stop_before_pixels=True)
+    for tag in [t for t in ds.keys() if t.group >= 0x0028]:
+        del ds[tag]  # keep the files small; pixel description is not under test
+    return ds
+
+
+def _save(ds, path, syntax):
+    # a fresh data set: save_as refuses to re-encode one read as little endian into big endian
+    out = Dataset()
+    out.update(ds)
+    out.file_meta = ds.file_meta
+    out.file_meta.TransferSyntaxUID = syntax
+    out.save_as(path, enforce_file_format=True)
+    return str(path)
+
+
+@pytest.mark.parametrize("syntax", [ImplicitVRLittleEndian, ExplicitVRLittleEndian])
+def test_undefined_length_sequence_before_wanted_tags(template, tmp_path, syntax):
+    path = _save(_with_sequence(template, undefined_length=True), tmp_path / "sq.dcm", syntax)
+    with open(path, "rb") as f:
+        assert b"\xfe\xff\xdd\xe0" in f.read()  # sequence delimitation item
+    expected = _values(pydicom.dcmread(path), CATALOG_TAGS)
+    assert _values(read_prefix(path, CATALOG_TAGS), CATALOG_TAGS) == expected
+
+
+@pytest.mark.parametrize("undefined_length", [False, True], ids=["defined", "undefined"])
+def test_wanted_sequence_falls_back_to_pydicom(template, tmp_path, undefined_length):
+    path = _save(_with_sequence(template, undefined_length), tmp_path / "sq.dcm", ExplicitVRLittleEndian)
+    tags = ["ReferencedImageSequence", "InstanceNumber"]
+    with pytest.raises(UnsupportedHeader):
+        read_prefix(path, tags)
+    ds = read_header(path, tags)
+    assert [item.ReferencedSOPInstanceUID for item in ds.ReferencedImageSequence] == ["1.2.3.4", "1.2.3.5"]
+    assert ds.InstanceNumber == template.InstanceNumber
+
+
+def test_big_endian_falls_back_to_pydicom(template, tmp_path):
+    path = _save(template, tmp_path / "be.dcm", ExplicitVRBigEndian)
+    with pytest.raises(UnsupportedHeader):
+        read_prefix(path, CATALOG_TAGS)
+    assert read_transfer_syntax(path) == ExplicitVRBigEndian
+    assert _values(read_header(path, CATALOG_TAGS), CATALOG_TAGS) == _values(template, CATALOG_TAGS)
+
+
+def test_no_preamble_falls_back_to_pydicom(asset_paths, tmp_path):
+    path = tmp_path / "no-preamble.dcm"
+    with open(asset_paths[0], "rb") as f:
+        path.write_bytes(f.read()[132:])  # drop the preamble and "DICM", keep the meta group
+    with pytest.raises(UnsupportedHeader):
+        read_prefix(str(path), CATALOG_TAGS)
+    expected = _values(pydicom.dcmread(asset_paths[0], stop_before_pixels=True), CATALOG_TAGS)
+    assert _values(read_header(str(path), CATALOG_TAGS), CATALOG_TAGS) == expected
+    assert read_transfer_syntax(str(path)) == read_transfer_syntax(asset_paths[0])
@@ -0,0 +1,110 @@
+"""
+Throughput and peak memory of the phases of obtain_table_data.py on the
+bundled sample series (or any NBIA manifest folder, see --bench-data),
+plus a header read of every .dcm file under public/assets.
+
+    python -m pytest benchmarks -q                      # compare with baselines.json
+    python -m pytest benchmarks -q --update-baselines   # record new baselines
+
+MB/s is the size of the files a phase covers per second (the CSV for the
+parse, the .dcm files for the scan and header reads, the JSON written for
+the emission), not the bytes actually read.  Peak memory is the Python
+heap of this process, so pool workers are not included.
+"""
+import contextlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from build_catalog import walk_files
+from dicom_headers import read_sort_header
+from manifest_writer import write_manifest
+from obtain_table_data import (enumerate_series_files, iter_csv_patients, iter_series, read_csv_rows,
+                               scan_series_headers, stream_patients, to_final_patient)
+
+POOL_WORKERS = 2
+
+
+class Corpus:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.csv = os.path.join(base_dir, "metadata.csv")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self.rows = list(read_csv_rows(self.csv))
+            self.patients = list(iter_csv_patients(iter(self.rows)))
+            enumerate_series_files(self.patients, base_dir)
+        self.paths = [p for *_, series in iter_series(self.patients) for p in series["imageFilePaths"]]
+        self.dcm_bytes = sum(os.path.getsize(p) for p in self.paths)
+
+
+@pytest.fixture(scope="module")
+def corpus(pytestconfig):
+    base_dir = pytestconfig.getoption("--bench-data")
+    if not os.path.exists(os.path.join(base_dir, "metadata.csv")):
+        pytest.skip(f"no metadata.csv under {base_dir}")
+    corpus = Corpus(base_dir)
+    if not corpus.paths:
+        pytest.skip(f"no .dcm files found for the series of {corpus.csv}")
+    return corpus
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with ProcessPoolExecutor(max_workers=POOL_WORKERS) as pool:
+        list(pool.map(abs, range(POOL_WORKERS)))  # start the workers outside the timings
+        yield pool
+
+
+def test_csv_parse(bench, corpus):
+    result = bench.run("csv_parse", lambda: list(iter_csv_patients(read_csv_rows(corpus.csv))),
+                       len(corpus.rows), os.path.getsize(corpus.csv), unit="rows")
+    assert result["items"] > 0
+
+
+def test_directory_scan(bench, corpus):
+    bench.run("directory_scan", lambda: enumerate_series_files(corpus.patients, corpus.base_dir),
+              len(corpus.paths), corpus.dcm_bytes)
+    assert sum(len(s["imageFilePaths"]) for *_, s in iter_series(corpus.patients)) == len(corpus.paths)
+
+
+def _read_headers(paths, out):
+    out[:] = [read_sort_header(p) for p in paths]
+
+
+def test_header_extraction(bench, corpus):
+    headers = []
+    bench.run("header_extraction", lambda: _read_headers(corpus.paths, headers), len(corpus.paths), corpus.dcm_bytes)
+    assert not [h for h in headers if "error" in h]
+
+
+def test_assets_header_extraction(bench, pytestconfig):
+    paths = list(walk_files(pytestconfig.getoption("--bench-assets")))
+    if not paths:
+        pytest.skip("no .dcm files under --bench-assets")
+    headers = []
+    bench.run("assets_header_extraction", lambda: _read_headers(paths, headers),
+              len(paths), sum(os.path.getsize(p) for p in paths))
+    assert not [h for h in headers if "error" in h]
+
+
+def test_header_scan_pool(bench, corpus, pool):
+    bench.run("header_scan_pool", lambda: scan_series_headers(corpus.patients, pool),
+              len(corpus.paths), corpus.dcm_bytes)
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["indented", "compact"])
+def test_json_emission(bench, corpus, tmp_path, compact):
+    final = [to_final_patient(p) for p in corpus.patients]
+    output = str(tmp_path / "manifest.json")
+    write_manifest(final, output, compact=compact)
+    bench.run(f"json_emission_{'compact' if compact else 'indented'}",
+              lambda: write_manifest(final, output, compact=compact), len(corpus.paths), os.path.getsize(output))
+
+
+def test_pipeline(bench, corpus, tmp_path, pool):
+    output = str(tmp_path / "manifest.json")
+    bench.run("pipeline_scan_headers",
+              lambda: write_manifest(stream_patients(corpus.csv, corpus.base_dir, pool), output, compact=True),
+              len(corpus.paths), corpus.dcm_bytes)
+    assert os.path.getsize(output) > 0
@@ -0,0 +1,70 @@
+"""
+Incremental rebuilds of obtain_table_data.py --index (manifest_index.py)
+against a plain run, on a copy of the bundled sample series (see
+--bench-data).
+
+    python -m pytest benchmarks/test_manifest_index.py -q
+"""
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from manifest_index import ManifestIndex
+from obtain_table_data import stream_patients, update_index
+
+
+@pytest.fixture
+def base_dir(pytestconfig, tmp_path):
+    source = pytestconfig.getoption("--bench-data")
+    if not os.path.exists(os.path.join(source, "metadata.csv")):
+        pytest.skip(f"no metadata.csv under {source}")
+    return shutil.copytree(source, str(tmp_path / "data"))
+
+
+def _indexed(db_path, csv_file, base_dir, pool=None):
+    index = ManifestIndex(db_path)
+    try:
+        update_index(index, csv_file, base_dir, pool)
+        return list(index.iter_patients())
+    finally:
+        index.close()
+
+
+def _paths(patients):
+    return [p for patient in patients for study in patient["studies"]
+            for series in study["series"] for p in series["imageFilePaths"]]
+
+
+def test_new_base_dir_rebuilds(base_dir, tmp_path):
+    csv_file = os.path.join(base_dir, "metadata.csv")
+    moved = str(tmp_path / "moved")
+    os.symlink(base_dir, moved)
+    db_path = str(tmp_path / "index.sqlite")
+
+    first = _indexed(db_path, csv_file, base_dir)
+    assert _paths(first) and all(p.startswith(base_dir + os.sep) for p in _paths(first))
+    # same CSV, other --base-dir: the series must resolve under the new one
+    second = _indexed(db_path, csv_file, moved)
+    assert second == list(stream_patients(csv_file, moved))
+    assert all(p.startswith(moved + os.sep) for p in _paths(second))
+
+
+def test_scan_headers_warns_like_a_plain_run(base_dir, tmp_path, capsys):
+    csv_file = os.path.join(base_dir, "metadata.csv")
+    db_path = str(tmp_path / "index.sqlite")
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        _indexed(db_path, csv_file, base_dir, pool)
+        removed = sorted(_paths(list(stream_patients(csv_file, base_dir))))[0]
+        os.remove(removed)
+        capsys.readouterr()
+
+        plain = list(stream_patients(csv_file, base_dir, pool))
+        plain_warnings = [line for line in capsys.readouterr().out.splitlines() if line.startswith("WARNING")]
+        indexed = _indexed(db_path, csv_file, base_dir, pool)
+        index_warnings = [line for line in capsys.readouterr().out.splitlines() if line.startswith("WARNING")]
+
+    assert indexed == plain
+    assert len(plain_warnings) == 1 and "frames on disk" in plain_warnings[0]
+    assert index_warnings == plain_warnings
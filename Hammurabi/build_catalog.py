@@ -0,0 +1,181 @@
+"""
+Build the viewer's patient/study/series JSON straight from DICOM headers.
+
+Unlike obtain_table_data.py this needs no NBIA metadata.csv: it walks any
+directory tree, reads only the header of each file and groups instances by
+PatientID, StudyInstanceUID and SeriesInstanceUID.  Headers are read in
+fixed-size batches on a process pool and spilled into a scratch SQLite
+database, and the JSON is written one patient at a time, so memory stays
+bounded by the batch size and the largest series whatever the archive size.
+
+    python build_catalog.py hammurabi-ui/public/assets --url-prefix /assets \
+        --output hammurabi-ui/src/data/dicomCatalog.json
+"""
+import argparse
+import itertools
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from dicom_headers import read_catalog_header, sort_series_headers
+from manifest_shards import write_sharded_manifest
+from manifest_writer import with_urls, write_manifest
+
+# Files handed to the pool per round trip; bounds the in-flight memory.
+BATCH_SIZE = 2048
+CHUNKSIZE = 64
+
+SCHEMA = """
+CREATE TABLE studies (
+    study_uid TEXT PRIMARY KEY, patient_id TEXT, description TEXT, date TEXT
+);
+CREATE TABLE series (
+    series_uid TEXT PRIMARY KEY, study_uid TEXT, description TEXT, number INTEGER
+);
+CREATE TABLE instances (
+    path TEXT PRIMARY KEY, series_uid TEXT, instance_number INTEGER, location REAL, frames INTEGER
+);
+CREATE INDEX instances_by_series ON instances (series_uid);
+"""
+
+
+def walk_files(root, all_files=False):
+    """Yield file paths under ``root`` depth first, without building a list."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = sorted(os.scandir(folder), key=lambda e: e.name)
+        except OSError as exc:
+            print(f"WARNING: cannot list {folder}: {exc}")
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file() and (all_files or entry.name.lower().endswith(".dcm")):
+                yield entry.path
+
+
+def index_headers(conn, paths, workers=None):
+    """Read headers batch by batch and store them; returns (indexed, skipped)."""
+    indexed = skipped = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(itertools.islice(paths, BATCH_SIZE))
+            if not batch:
+                break
+            for h in pool.map(read_catalog_header, batch, chunksize=CHUNKSIZE):
+                if "error" in h or not h["seriesUID"]:
+                    skipped += 1
+                    continue
+                conn.execute("INSERT OR IGNORE INTO studies VALUES (?, ?, ?, ?)",
+                             (h["studyUID"], h["patientID"], h["studyDescription"], h["studyDate"]))
+                conn.execute("INSERT OR IGNORE INTO series VALUES (?, ?, ?, ?)",
+                             (h["seriesUID"], h["studyUID"], h["seriesDescription"], h["seriesNumber"]))
+                conn.execute("INSERT OR REPLACE INTO instances VALUES (?, ?, ?, ?, ?)",
+                             (h["path"], h["seriesUID"], h["instanceNumber"], h["location"], h["frames"]))
+                indexed += 1
+            conn.commit()
+            print(f" - {indexed} instances indexed, {skipped} files skipped")
+    return indexed, skipped
+
+
+# Studies are ordered by date, but the stored date is the viewer's MM-DD-YYYY
+# (format_study_date): sort on YYYYMMDD rebuilt from it, other values as is.
+STUDY_DATE_KEY = """
+CASE WHEN date GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+     THEN substr(date, 7, 4) || substr(date, 1, 2) || substr(date, 4, 2)
+     ELSE date END
+"""
+
+
+def iter_patients(conn):
+    """Yield one finished patient dict at a time, in PatientID order, studies oldest first."""
+    patient = None
+    studies = conn.execute(
+        "SELECT study_uid, patient_id, description, date FROM studies "
+        f"ORDER BY patient_id, {STUDY_DATE_KEY}, study_uid"
+    )
+    for study_uid, pid, study_desc, study_date in studies:
+        if patient is None or patient["patientID"] != pid:
+            if patient is not None:
+                yield patient
+            patient = {"patientID": pid, "studies": []}
+
+        s_obj = {
+            "studyUID": study_uid,
+            "studyDescription": study_desc,
+            "studyDate": study_date,
+            "series": []
+        }
+        series_rows = conn.execute(
+            "SELECT series_uid, description FROM series WHERE study_uid = ? "
+            "ORDER BY number IS NULL, number, series_uid",
+            (study_uid,),
+        ).fetchall()
+        for series_uid, series_desc in series_rows:
+            ordered = sort_series_headers([
+                {"path": p, "instanceNumber": inst, "location": loc, "frames": frames}
+                for p, inst, loc, frames in conn.execute(
+                    "SELECT path, instance_number, location, frames FROM instances WHERE series_uid = ?",
+                    (series_uid,),
+                )
+            ])
+            s_obj["series"].append({
+                "seriesUID": series_uid,
+                "seriesDescription": series_desc,
+                "numberOfImages": sum(h["frames"] or 1 for h in ordered),
+                "imageFilePaths": [h["path"] for h in ordered]
+            })
+        patient["studies"].append(s_obj)
+    if patient is not None:
+        yield patient
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the viewer JSON from DICOM headers, no CSV needed.")
+    parser.add_argument("root", help="directory tree to catalogue")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output", help="JSON file to write")
+    output.add_argument("--shard-dir", help="write a root index plus per-series shards here instead")
+    parser.add_argument("--url-prefix", default=None,
+                        help="emit paths as <prefix>/<path relative to root> (e.g. /assets) instead of absolute paths")
+    parser.add_argument("--all-files", action="store_true",
+                        help="probe every file, not only *.dcm (non-DICOM files are skipped)")
+    parser.add_argument("--workers", type=int, default=None, help="header reader processes (default: CPU count)")
+    parser.add_argument("--db", default=None, help="keep the scratch SQLite database here instead of a temp file")
+    parser.add_argument("--compact", action="store_true", help="production output: no indentation or whitespace")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    if args.db:
+        db_path = args.db
+        if os.path.exists(db_path):
+            os.remove(db_path)
+    else:
+        fd, db_path = tempfile.mkstemp(suffix=".sqlite", prefix="catalog-")
+        os.close(fd)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        print(f"Scanning {root} ...")
+        indexed, skipped = index_headers(conn, walk_files(root, args.all_files), args.workers)
+        patients = iter_patients(conn)
+        if args.url_prefix is not None:
+            patients = with_urls(patients, root, args.url_prefix)
+        if args.shard_dir:
+            written = write_sharded_manifest(patients, args.shard_dir)
+        else:
+            written = write_manifest(patients, args.output, compact=args.compact)
+    finally:
+        conn.close()
+        if not args.db:
+            os.remove(db_path)
+
+    print(f"\nDONE! {indexed} instances ({skipped} skipped) in {written} patients => {args.output or args.shard_dir}")
+
+
+if __name__ == "__main__":
+    main()
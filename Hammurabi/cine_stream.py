@@ -0,0 +1,296 @@
+"""
+Chunked, compressed cine streams of the packed series.
+
+The cine loop of newViewer.tsx (fps, isLooping) needs every frame of a
+series, downloaded at full 16-bit size and uncompressed, before it plays
+smoothly.  This stage re-encodes each packed volume (series_volume.py) as
+a stream of independently decodable chunks of --chunk-frames frames:
+
+    <out-dir>/<seriesUID>.cine        the compressed chunks, back to back
+    <out-dir>/<seriesUID>.cine.json   index: layout, codec and, per chunk, its
+                                      first frame, frame count, byte offset and length
+
+Inside a chunk the first frame is stored as is and every following one as
+its difference from the previous slice (modulo 2^bits, zigzag-mapped so
+that small changes of either sign become small numbers).  The samples are
+then split into byte planes (all low bytes, then all high bytes) and the
+chunk is compressed with deflate (zlib, what the browser's
+DecompressionStream("deflate") reads) or zstd.  Thick, noisy slices do not
+always correlate well enough for the difference to pay off, so each chunk
+keeps whichever of the two compresses smaller ("delta" in the index).
+
+The player can start as soon as the first chunk is in, and seeking to any
+frame costs one HTTP range request for its chunk.  CineStream is the
+reference decoder.  Run series_volume.py first.
+
+    python cine_stream.py hammurabi-ui/src/data/dicomCatalog.json \
+        --public-dir hammurabi-ui/public --out-dir hammurabi-ui/public/cine \
+        --url-prefix /cine --codec deflate
+"""
+import argparse
+import bisect
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from series_volume import header_path_for, iter_manifest_series, load_manifest, open_volume, save_manifest, url_for
+
+STREAM_SUFFIX = ".cine"
+INDEX_SUFFIX = ".cine.json"
+FORMAT_VERSION = 1
+# Frames per chunk: the seek granularity, and how far a delta chain runs.
+CHUNK_FRAMES = 16
+CODECS = ("deflate", "zstd")
+DEFAULT_LEVELS = {"deflate": 6, "zstd": 9}
+
+
+# ------------------------------------------------------------------------
+# Codecs
+# ------------------------------------------------------------------------
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("--codec zstd needs zstandard (pip install zstandard)")
+    return zstandard
+
+
+def compress(data, codec, level):
+    if codec == "deflate":
+        return zlib.compress(data, level)
+    return _zstandard().ZstdCompressor(level=level).compress(data)
+
+
+def decompress(data, codec):
+    if codec == "deflate":
+        return zlib.decompress(data)
+    return _zstandard().ZstdDecompressor().decompress(data)
+
+
+# ------------------------------------------------------------------------
+# Chunk filters: temporal delta (zigzag) + byte planes
+# ------------------------------------------------------------------------
+def _unsigned(dtype):
+    """Little-endian unsigned type of the same width: the deltas wrap around in it."""
+    return np.dtype(f"<u{np.dtype(dtype).itemsize}")
+
+
+def _zigzag(delta):
+    """Wrapped differences -> 0, -1, 1, -2, ... as 0, 1, 2, 3, ..."""
+    signed = delta.view(delta.dtype.str.replace("u", "i"))
+    return ((signed << 1) ^ (signed >> (8 * delta.dtype.itemsize - 1))).view(delta.dtype)
+
+
+def _unzigzag(values):
+    return (values >> 1) ^ (0 - (values & 1)).astype(values.dtype)
+
+
+def _to_planes(samples):
+    """(frames, ...) unsigned samples -> bytes, one plane per byte of the sample."""
+    width = samples.dtype.itemsize
+    return samples.view(np.uint8).reshape(-1, width).T.tobytes()
+
+
+def _from_planes(data, unsigned, shape):
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(unsigned.itemsize, -1)
+    return np.array(planes.T, order="C").view(unsigned).reshape(shape)
+
+
+def encode_chunk(frames, codec, level):
+    """(payload, delta) of a run of frames: the smaller of the plain and the delta encoding."""
+    samples = np.ascontiguousarray(frames).view(_unsigned(frames.dtype))
+    payload = compress(_to_planes(samples), codec, level)
+    if len(samples) < 2:
+        return payload, False
+    delta = samples.copy()
+    delta[1:] = _zigzag(samples[1:] - samples[:-1])
+    delta_payload = compress(_to_planes(delta), codec, level)
+    if len(delta_payload) < len(payload):
+        return delta_payload, True
+    return payload, False
+
+
+def frame_shape(index):
+    shape = (index["rows"], index["columns"])
+    if index.get("samplesPerPixel", 1) > 1:
+        shape += (index["samplesPerPixel"],)
+    return shape
+
+
+def decode_chunk(payload, index, chunk):
+    """Frames of one chunk, shape (chunk frames, rows, columns[, samples]), in the series dtype."""
+    dtype = np.dtype(index["dtype"])
+    unsigned = _unsigned(dtype)
+    samples = _from_planes(decompress(payload, index["codec"]), unsigned,
+                           (chunk["frames"],) + frame_shape(index))
+    if chunk["delta"]:
+        samples[1:] = _unzigzag(samples[1:])
+        samples = np.cumsum(samples, axis=0, dtype=unsigned)
+    return samples.view(dtype)
+
+
+# ------------------------------------------------------------------------
+# Encoding (runs in the worker processes)
+# ------------------------------------------------------------------------
+def encode_volume(volume, stream_path, chunk_frames=CHUNK_FRAMES, codec="deflate", level=None):
+    """Write ``volume`` (frames, rows, columns[, samples]) as a cine stream; returns the chunk list."""
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    chunks, offset = [], 0
+    with open(stream_path, "wb") as out:
+        for start in range(0, len(volume), chunk_frames):
+            frames = np.asarray(volume[start:start + chunk_frames])
+            payload, delta = encode_chunk(frames, codec, level)
+            out.write(payload)
+            chunks.append({"firstFrame": start, "frames": len(frames), "offset": offset,
+                           "length": len(payload), "delta": delta})
+            offset += len(payload)
+    return chunks
+
+
+def encode_series(job):
+    """
+    Encode one packed series.  ``job`` is (header_path, out_dir, chunk_frames,
+    codec, level).  Returns the stream index, or {"error"}.  A stream whose
+    index records the same volume signature and settings is left alone.
+    """
+    header_path, out_dir, chunk_frames, codec, level = job
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    stream_path = None
+    try:
+        header, volume = open_volume(header_path)
+        series_uid = header["seriesUID"]
+        index_path = os.path.join(out_dir, series_uid + INDEX_SUFFIX)
+        stream_path = os.path.join(out_dir, series_uid + STREAM_SUFFIX)
+        settings = {"version": FORMAT_VERSION, "codec": codec, "level": level, "chunkFrames": chunk_frames,
+                    "sourceSignature": header.get("sourceSignature")}
+        if os.path.exists(index_path) and os.path.exists(stream_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            if all(previous.get(key) == value for key, value in settings.items()):
+                return previous
+
+        chunks = encode_volume(volume, stream_path + ".tmp", chunk_frames, codec, level)
+        os.replace(stream_path + ".tmp", stream_path)
+    except Exception as exc:
+        if stream_path and os.path.exists(stream_path + ".tmp"):
+            os.remove(stream_path + ".tmp")
+        return {"error": str(exc)}
+
+    index = {
+        "seriesUID": series_uid,
+        "stream": series_uid + STREAM_SUFFIX,
+        "dtype": header["dtype"],
+        "frames": header["frames"],
+        "rows": header["rows"],
+        "columns": header["columns"],
+        "samplesPerPixel": header.get("samplesPerPixel", 1),
+        "frameLength": header["frameLength"],
+        **settings,
+        "rawBytes": header["frames"] * header["frameLength"],
+        "streamBytes": sum(c["length"] for c in chunks),
+        "chunks": chunks,
+    }
+    with open(index_path, "w", encoding="utf-8") as out:
+        json.dump(index, out, separators=(",", ":"))
+    return index
+
+
+# ------------------------------------------------------------------------
+# Reference decoder
+# ------------------------------------------------------------------------
+class CineStream:
+    """
+    Frames of a cine stream by number.  Reading frame i reads and decodes
+    only the chunk holding it; the last decoded chunk is kept, so playing
+    the frames in order decodes every chunk once.
+    """
+
+    def __init__(self, index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.path = os.path.join(os.path.dirname(index_path), self.index["stream"])
+        self._starts = [c["firstFrame"] for c in self.index["chunks"]]
+        self._cached = (None, None)
+
+    def __len__(self):
+        return self.index["frames"]
+
+    def chunk_of(self, frame):
+        if not 0 <= frame < len(self):
+            raise IndexError(f"frame {frame} out of range 0..{len(self) - 1}")
+        return bisect.bisect_right(self._starts, frame) - 1
+
+    def read_chunk(self, number):
+        if self._cached[0] != number:
+            chunk = self.index["chunks"][number]
+            with open(self.path, "rb") as f:
+                f.seek(chunk["offset"])
+                payload = f.read(chunk["length"])
+            self._cached = (number, decode_chunk(payload, self.index, chunk))
+        return self._cached[1]
+
+    def frame(self, frame):
+        number = self.chunk_of(frame)
+        return self.read_chunk(number)[frame - self._starts[number]]
+
+    def __iter__(self):
+        for number in range(len(self._starts)):
+            yield from self.read_chunk(number)
+
+    def read_all(self):
+        return np.concatenate([self.read_chunk(n) for n in range(len(self._starts))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode every packed series as a chunked, compressed cine stream.")
+    parser.add_argument("manifest", help="manifest JSON whose series carry a volumeHeader (series_volume.py)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving <seriesUID>.cine and .cine.json")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /cine)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--codec", choices=CODECS, default="deflate", help="chunk compression (zstd needs zstandard)")
+    parser.add_argument("--level", type=int, default=None,
+                        help="compression level (default: 6 for deflate, 9 for zstd)")
+    parser.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES,
+                        help=f"frames per independently decodable chunk (default {CHUNK_FRAMES})")
+    parser.add_argument("--workers", type=int, default=None, help="series encoded in parallel (default: CPU count)")
+    args = parser.parse_args()
+    if args.codec == "zstd":
+        _zstandard()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    patients = load_manifest(args.manifest)
+    series_list, jobs = [], []
+    for series in iter_manifest_series(patients):
+        header_path = header_path_for(series, args.public_dir)
+        if header_path is None:
+            print(f"WARNING: series {series['seriesUID']} has no packed volume, run series_volume.py first")
+            continue
+        series_list.append(series)
+        jobs.append((header_path, args.out_dir, args.chunk_frames, args.codec, args.level))
+
+    done = raw = encoded = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series, index in zip(series_list, pool.map(encode_series, jobs)):
+            if "error" in index:
+                print(f"WARNING: series {series['seriesUID']} not encoded: {index['error']}")
+                continue
+            series["cineStream"] = url_for(args.out_dir, series["seriesUID"] + INDEX_SUFFIX, args.url_prefix)
+            raw += index["rawBytes"]
+            encoded += index["streamBytes"]
+            delta = sum(c["delta"] for c in index["chunks"])
+            print(f" - {series['seriesUID']}: {index['rawBytes'] / 1e6:.1f} MB -> {index['streamBytes'] / 1e6:.1f} MB "
+                  f"({index['rawBytes'] / max(index['streamBytes'], 1):.1f}x, "
+                  f"{delta}/{len(index['chunks'])} chunks delta-coded)")
+            done += 1
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"\nDONE! {done}/{len(series_list)} series encoded, {raw / 1e6:.1f} MB -> {encoded / 1e6:.1f} MB "
+          f"({raw / max(encoded, 1):.1f}x) => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
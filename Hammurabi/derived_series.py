@@ -0,0 +1,158 @@
+"""
+Helpers for pipeline stages that publish derived series (MIP, MPR, ...).
+
+A derived series is written as ordinary single-frame DICOM files, so the
+viewer plays it like any acquired series, and is added to the manifest
+next to the series it was computed from.  UIDs are derived from the source
+series and the stage parameters, so re-running a stage with the same
+settings replaces the same series instead of adding a new one.
+"""
+import copy
+import os
+
+import numpy as np
+import pydicom
+from pydicom.dataset import FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+SECONDARY_CAPTURE = "1.2.840.10008.5.1.4.1.1.7"
+
+# Source tags that no longer describe a derived frame.
+_DROPPED_TAGS = [
+    "SliceLocation",
+    "ImagePositionPatient",
+    "ImageOrientationPatient",
+    "NumberOfFrames",
+    "WindowCenterWidthExplanation",
+    "ReferencedImageSequence",
+    "SourceImageSequence",
+    "LargestImagePixelValue",
+    "SmallestImagePixelValue",
+]
+
+
+def derived_uid(source_uid, *params):
+    """Deterministic UID for something derived from ``source_uid`` with ``params``."""
+    return generate_uid(entropy_srcs=[source_uid] + [str(p) for p in params])
+
+
+def _ds_list(values):
+    return [f"{v:.6g}" for v in values]
+
+
+def _quantize(values):
+    """
+    Float modality values -> (uint16 stored values, slope, intercept) spanning
+    their finite range; NaN / infinite samples take the lowest value.  Slope
+    and intercept are rounded to what fits a DS first, so the stored values
+    match what is written.
+    """
+    finite = values[np.isfinite(values)]
+    lo, hi = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 0.0)
+    intercept = float(f"{lo:.10g}")
+    slope = float(f"{(hi - intercept) / 65535:.10g}") if hi > intercept else 1.0
+    stored = np.rint((np.nan_to_num(values, nan=lo, posinf=hi, neginf=lo) - intercept) / slope)
+    return np.clip(stored, 0, 65535).astype(np.uint16), slope, intercept
+
+
+def write_derived_series(template_path, frames, out_dir, series_uid, description, image_type,
+                         pixel_spacing, positions=None, orientation=None, slice_thickness=None,
+                         sop_class=None):
+    """
+    Write ``frames`` (n, rows, columns) as ``out_dir/<i>.dcm`` and return the paths.
+
+    Patient / study tags are copied from ``template_path`` (one of the source
+    files); geometry comes from ``pixel_spacing`` and, when given, the
+    per-frame ``positions`` and the shared ``orientation``.  Without geometry
+    the files are stored as Secondary Capture.
+
+    Integer frames are stored values of the template's RescaleSlope /
+    RescaleIntercept.  Float frames are modality values (e.g. computed from a
+    series whose frames each have their own rescale): they are stored as
+    16-bit values with a RescaleSlope / RescaleIntercept of their own.
+    """
+    template = pydicom.dcmread(template_path, stop_before_pixels=True)
+    template.remove_private_tags()
+    for keyword in _DROPPED_TAGS:
+        if keyword in template:
+            delattr(template, keyword)
+
+    frames = np.asarray(frames)
+    if frames.dtype.kind == "f":
+        frames, slope, intercept = _quantize(frames)
+        template.RescaleSlope = f"{slope:.10g}"
+        template.RescaleIntercept = f"{intercept:.10g}"
+        template.BitsStored = 16
+    else:
+        slope = float(template.get("RescaleSlope", 1) or 1)
+        intercept = float(template.get("RescaleIntercept", 0) or 0)
+    dtype = frames.dtype.newbyteorder("<")
+    sop_class = sop_class or (template.SOPClassUID if positions is not None else SECONDARY_CAPTURE)
+    lo, hi = float(frames.min()) * slope + intercept, float(frames.max()) * slope + intercept
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i, frame in enumerate(frames):
+        ds = copy.deepcopy(template)
+        sop_uid = derived_uid(series_uid, i)
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.MediaStorageSOPClassUID = sop_class
+        ds.file_meta.MediaStorageSOPInstanceUID = sop_uid
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds.SOPClassUID = sop_class
+        ds.SOPInstanceUID = sop_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.SeriesDescription = description[:64]
+        ds.ImageType = ["DERIVED", "SECONDARY"] + list(image_type)
+        ds.InstanceNumber = i + 1
+        ds.Rows, ds.Columns = frame.shape
+        ds.PixelSpacing = _ds_list(pixel_spacing)
+        ds.SamplesPerPixel = 1
+        ds.BitsAllocated = dtype.itemsize * 8
+        ds.BitsStored = int(template.get("BitsStored", ds.BitsAllocated))
+        ds.HighBit = ds.BitsStored - 1
+        ds.PixelRepresentation = 1 if dtype.kind == "i" else 0
+        ds.WindowCenter = f"{(lo + hi) / 2:.6g}"
+        ds.WindowWidth = f"{max(hi - lo, 1):.6g}"
+        if positions is not None:
+            ds.ImagePositionPatient = _ds_list(positions[i])
+            ds.ImageOrientationPatient = _ds_list(orientation)
+        if slice_thickness is not None:
+            ds.SliceThickness = f"{slice_thickness:.6g}"
+        ds.PixelData = np.ascontiguousarray(frame, dtype=dtype).tobytes()
+        ds["PixelData"].VR = "OW" if dtype.itemsize > 1 else "OB"
+
+        path = os.path.join(out_dir, f"{i}.dcm")
+        pydicom.dcmwrite(path, ds, enforce_file_format=True)
+        paths.append(path)
+
+    # frames left over from a longer earlier run
+    for name in os.listdir(out_dir):
+        stem, ext = os.path.splitext(name)
+        if ext == ".dcm" and stem.isdigit() and int(stem) >= len(frames):
+            os.remove(os.path.join(out_dir, name))
+    return paths
+
+
+def add_derived_series(patients, source_uid, entry):
+    """
+    Put ``entry`` after the series ``source_uid`` (and the series already
+    derived from it) in the manifest, replacing an earlier entry with the
+    same seriesUID.  Returns False when
+    the source series is not in the manifest.
+    """
+    for patient in patients:
+        for study in patient["studies"]:
+            uids = [s["seriesUID"] for s in study["series"]]
+            if source_uid not in uids:
+                continue
+            if entry["seriesUID"] in uids:
+                study["series"][uids.index(entry["seriesUID"])] = entry
+            else:
+                # after the source and whatever was already derived from it
+                last = max(i for i, s in enumerate(study["series"])
+                           if source_uid in (s["seriesUID"], s.get("derivedFrom")))
+                study["series"].insert(last + 1, entry)
+            return True
+    return False
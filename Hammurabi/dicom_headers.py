@@ -0,0 +1,322 @@
+"""
+Header-only DICOM helpers shared by the ingest scripts.
+
+Nothing in here touches pixel data: files are opened with
+``stop_before_pixels`` and only the handful of tags needed to order a
+series and count its frames are kept.
+
+read_header() is the fast path: a minimal parser that reads the file
+prefix only as far as the highest requested tag and hands the few raw
+elements it kept to pydicom for value conversion.  Anything it does not
+handle (no preamble, big endian, deflate, requested sequences, ...) falls
+back to pydicom.dcmread.
+"""
+import os
+import re
+import struct
+
+import pydicom
+from pydicom.dataelem import RawDataElement
+from pydicom.datadict import dictionary_VR
+from pydicom.tag import Tag
+
+# Tags needed to put the instances of a series in display order.
+SORT_TAGS = [
+    "InstanceNumber",
+    "ImagePositionPatient",
+    "ImageOrientationPatient",
+    "NumberOfFrames",
+]
+
+# Extra tags needed to place a file in the patient/study/series tree.
+CATALOG_TAGS = SORT_TAGS + [
+    "PatientID",
+    "StudyInstanceUID",
+    "StudyDescription",
+    "StudyDate",
+    "SeriesInstanceUID",
+    "SeriesDescription",
+    "SeriesNumber",
+]
+
+
+# Transfer syntaxes whose data set is little endian; all but the first use explicit VR.
+IMPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2"
+_EXPLICIT_LE_SYNTAXES = ("1.2.840.10008.1.2.1", "1.2.840.10008.1.2.4.", "1.2.840.10008.1.2.5")
+_DEFLATED = "1.2.840.10008.1.2.1.99"
+
+# Explicit VRs with a 2 byte reserved field and a 4 byte length.
+_LONG_VRS = {b"OB", b"OD", b"OF", b"OL", b"OV", b"OW", b"SQ", b"SV", b"UC", b"UN", b"UR", b"UT", b"UV"}
+_UNDEFINED = 0xFFFFFFFF
+_ITEM, _ITEM_END, _SEQUENCE_END = 0xFFFEE000, 0xFFFEE00D, 0xFFFEE0DD
+_CHARSET = 0x00080005
+_PIXEL_DATA = 0x7FE00010
+_READ_SIZE = 16384
+
+
+class UnsupportedHeader(Exception):
+    """The prefix reader cannot handle this file; use pydicom instead."""
+
+
+class _Prefix:
+    """Bytes of a file read on demand, never further than needed."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = f.read(_READ_SIZE)
+
+    def need(self, end):
+        while len(self.buf) < end:
+            more = self.f.read(max(_READ_SIZE, end - len(self.buf)))
+            if not more:
+                raise UnsupportedHeader("truncated file")
+            self.buf += more
+
+
+def _element_header(prefix, pos, implicit):
+    """(tag, VR bytes or None, length, value offset) of the element at ``pos``."""
+    prefix.need(pos + 8)
+    group, elem = struct.unpack_from("<HH", prefix.buf, pos)
+    tag = group << 16 | elem
+    if implicit or group == 0xFFFE:  # items and delimiters never carry a VR
+        return tag, None, struct.unpack_from("<I", prefix.buf, pos + 4)[0], pos + 8
+    vr = prefix.buf[pos + 4:pos + 6]
+    if vr in _LONG_VRS:
+        prefix.need(pos + 12)
+        return tag, vr, struct.unpack_from("<I", prefix.buf, pos + 8)[0], pos + 12
+    return tag, vr, struct.unpack_from("<H", prefix.buf, pos + 6)[0], pos + 8
+
+
+def _skip_undefined(prefix, pos, implicit, end_tag):
+    """Position right after the ``end_tag`` delimiter closing an undefined length value."""
+    while True:
+        tag, vr, length, pos = _element_header(prefix, pos, implicit)
+        if tag == end_tag:
+            return pos
+        if length == _UNDEFINED:
+            # an item, or a nested sequence / encapsulated value
+            pos = _skip_undefined(prefix, pos, implicit, _ITEM_END if tag == _ITEM else _SEQUENCE_END)
+        else:
+            pos += length
+
+
+def _transfer_syntax(prefix):
+    """Parse the (always explicit little endian) meta group: (transfer syntax, data set offset)."""
+    prefix.need(132)
+    if prefix.buf[128:132] != b"DICM":
+        raise UnsupportedHeader("no DICM preamble")
+    pos, syntax = 132, None
+    while True:
+        prefix.need(pos + 2)
+        if struct.unpack_from("<H", prefix.buf, pos)[0] != 0x0002:
+            break
+        tag, _, length, value_pos = _element_header(prefix, pos, False)
+        prefix.need(value_pos + length)
+        if tag == 0x00020010:
+            syntax = prefix.buf[value_pos:value_pos + length].rstrip(b"\0 ").decode("ascii")
+        pos = value_pos + length
+    if syntax is None:
+        raise UnsupportedHeader("no transfer syntax")
+    return syntax, pos
+
+
+def read_prefix(path, tags):
+    """
+    Read only ``tags`` from the header of ``path``, parsing nothing past the
+    highest of them.  Returns a pydicom Dataset holding the elements found;
+    raises UnsupportedHeader when the file needs the full pydicom reader.
+    """
+    wanted = {int(Tag(t)) for t in tags}
+    wanted.add(_CHARSET)  # needed to decode text values
+    last = max(wanted)
+
+    with open(path, "rb") as f:
+        prefix = _Prefix(f)
+        syntax, pos = _transfer_syntax(prefix)
+        if syntax == _DEFLATED or not (syntax == IMPLICIT_VR_LITTLE_ENDIAN or syntax.startswith(_EXPLICIT_LE_SYNTAXES)):
+            raise UnsupportedHeader(f"transfer syntax {syntax}")
+        implicit = syntax == IMPLICIT_VR_LITTLE_ENDIAN
+
+        elements = {}
+        while True:
+            try:
+                tag, vr, length, value_pos = _element_header(prefix, pos, implicit)
+            except UnsupportedHeader:
+                break  # end of file before the last wanted tag
+            if tag > last or tag == _PIXEL_DATA:
+                break
+            if length == _UNDEFINED:
+                if tag in wanted:
+                    raise UnsupportedHeader(f"undefined length value in wanted tag {Tag(tag)}")
+                pos = _skip_undefined(prefix, value_pos, implicit, _SEQUENCE_END)
+                continue
+            if tag in wanted:
+                prefix.need(value_pos + length)
+                vr_name = vr.decode("ascii") if vr else None
+                if vr_name == "SQ" or (vr_name is None and _dictionary_vr(tag) == "SQ"):
+                    raise UnsupportedHeader(f"sequence in wanted tag {Tag(tag)}")
+                elements[Tag(tag)] = RawDataElement(
+                    Tag(tag), vr_name, length, prefix.buf[value_pos:value_pos + length],
+                    value_pos, implicit, True, True, False,
+                )
+            pos = value_pos + length
+    return pydicom.Dataset(elements)
+
+
+def _dictionary_vr(tag):
+    try:
+        return dictionary_VR(tag)
+    except KeyError:
+        return None
+
+
+def _meta_without_preamble(path):
+    """True when the file starts straight with the meta group (no preamble, no DICM)."""
+    with open(path, "rb") as f:
+        start = f.read(2)
+    return len(start) == 2 and struct.unpack("<H", start)[0] == 0x0002
+
+
+def read_transfer_syntax(path):
+    """Transfer syntax UID of ``path`` from its meta group (pydicom when there is no preamble)."""
+    try:
+        with open(path, "rb") as f:
+            return _transfer_syntax(_Prefix(f))[0]
+    except (UnsupportedHeader, struct.error, UnicodeDecodeError):
+        ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=["SOPInstanceUID"],
+                             force=_meta_without_preamble(path))
+        return str(ds.file_meta.get("TransferSyntaxUID", IMPLICIT_VR_LITTLE_ENDIAN))
+
+
+def read_header(path, tags):
+    """Header elements ``tags`` of ``path``: the prefix reader, or pydicom when it cannot cope."""
+    try:
+        return read_prefix(path, tags)
+    except (UnsupportedHeader, struct.error, UnicodeDecodeError):
+        return pydicom.dcmread(path, stop_before_pixels=True, specific_tags=list(tags),
+                               force=_meta_without_preamble(path))
+
+
+def _natural_key(name):
+    """Split a file name into text / int chunks so 1-2 sorts before 1-10."""
+    return [int(tok) if tok.isdigit() else tok.lower() for tok in re.split(r"(\d+)", name)]
+
+
+def _to_floats(value):
+    try:
+        return [float(v) for v in value]
+    except (TypeError, ValueError):
+        return None
+
+
+def read_sort_header(path):
+    """
+    Read only the ordering tags of a DICOM file.
+
+    Returns a small picklable dict so it can travel back from a worker
+    process: {"path", "instanceNumber", "location", "frames"}, where
+    "location" is the slice position along the series normal.
+    Unreadable files come back with "error" set instead of raising.
+    """
+    try:
+        ds = read_header(path, SORT_TAGS)
+    except Exception as exc:  # corrupt / non-DICOM file in a series folder
+        return {"path": path, "error": str(exc)}
+    return _sort_fields(path, ds)
+
+
+def read_catalog_header(path):
+    """
+    Like read_sort_header, plus the patient / study / series identity.
+
+    Adds "patientID", "studyUID", "studyDescription", "studyDate" (as
+    MM-DD-YYYY, the format of the NBIA CSV), "seriesUID",
+    "seriesDescription" and "seriesNumber".
+    """
+    try:
+        ds = read_header(path, CATALOG_TAGS)
+    except Exception as exc:
+        return {"path": path, "error": str(exc)}
+
+    header = _sort_fields(path, ds)
+    try:
+        series_number = int(ds.get("SeriesNumber"))
+    except (TypeError, ValueError):
+        series_number = None
+    header.update({
+        "patientID": str(ds.get("PatientID", "")).strip(),
+        "studyUID": str(ds.get("StudyInstanceUID", "")).strip(),
+        "studyDescription": str(ds.get("StudyDescription", "")).strip(),
+        "studyDate": format_study_date(ds.get("StudyDate", "")),
+        "seriesUID": str(ds.get("SeriesInstanceUID", "")).strip(),
+        "seriesDescription": str(ds.get("SeriesDescription", "")).strip(),
+        "seriesNumber": series_number,
+    })
+    return header
+
+
+def format_study_date(value):
+    """DICOM DA (YYYYMMDD) -> MM-DD-YYYY; anything else is returned as is."""
+    value = str(value or "").strip()
+    if len(value) == 8 and value.isdigit():
+        return f"{value[4:6]}-{value[6:8]}-{value[:4]}"
+    return value
+
+
+def _sort_fields(path, ds):
+    try:
+        instance_number = int(ds.get("InstanceNumber"))
+    except (TypeError, ValueError):
+        instance_number = None
+
+    try:
+        frames = int(ds.get("NumberOfFrames") or 1)
+    except (TypeError, ValueError):
+        frames = 1
+
+    return {
+        "path": path,
+        "instanceNumber": instance_number,
+        "location": slice_location(
+            _to_floats(ds.get("ImagePositionPatient")),
+            _to_floats(ds.get("ImageOrientationPatient")),
+        ),
+        "frames": frames,
+    }
+
+
+def slice_location(pos, ori):
+    """
+    Distance of a slice along the series normal (row x column direction).
+
+    Returns None when position or orientation are missing/malformed.
+    """
+    if not pos or not ori or len(pos) != 3 or len(ori) != 6:
+        return None
+    r, c = ori[:3], ori[3:]
+    normal = (
+        r[1] * c[2] - r[2] * c[1],
+        r[2] * c[0] - r[0] * c[2],
+        r[0] * c[1] - r[1] * c[0],
+    )
+    return sum(p * n for p, n in zip(pos, normal))
+
+
+def sort_series_headers(headers):
+    """
+    Order the headers of one series for display.
+
+    InstanceNumber wins when every instance has one; otherwise the slice
+    position along the normal is used; file name order (natural, so 1-2
+    before 1-10) is the last resort and the tie breaker.
+    """
+    def name_key(h):
+        return _natural_key(os.path.basename(h["path"]))
+
+    if headers and all(h.get("instanceNumber") is not None for h in headers):
+        return sorted(headers, key=lambda h: (h["instanceNumber"], name_key(h)))
+
+    if headers and all(h.get("location") is not None for h in headers):
+        return sorted(headers, key=lambda h: (h["location"], name_key(h)))
+
+    return sorted(headers, key=name_key)
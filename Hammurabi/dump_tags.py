@@ -0,0 +1,146 @@
+"""
+Batch tag dump of DICOM archives, the bulk version of the script.py dumpers.
+
+The script.py files next to the sample series print every element of one
+hard-coded file.  This CLI takes any number of directories and globs,
+reads headers only (never the pixel data) on a process pool and writes one
+record per file as JSON lines or CSV, so an archive audit can be queried
+afterwards instead of read off the terminal.
+
+    python dump_tags.py hammurabi-ui/public/assets --tags PatientID Modality 0028,0010 \
+        --format csv --output tags.csv
+    python dump_tags.py "archive/**/*.dcm" > tags.jsonl
+"""
+import argparse
+import csv
+import glob
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pydicom
+from pydicom.datadict import keyword_for_tag, tag_for_keyword
+from pydicom.tag import Tag
+from pydicom.valuerep import IS, DSfloat
+
+from build_catalog import walk_files
+
+# Files handed to the pool per round trip; bounds the in-flight memory.
+BATCH_SIZE = 2048
+CHUNKSIZE = 64
+
+
+def parse_tag(text):
+    """Keyword (PatientID) or hex tag (0010,0020 / 00100020 / (0010,0020)) -> Tag."""
+    text = text.strip()
+    tag = tag_for_keyword(text)
+    if tag is not None:
+        return Tag(tag)
+    digits = text.strip("()").replace(",", "").replace(" ", "")
+    if len(digits) != 8:
+        raise argparse.ArgumentTypeError(f"unknown tag {text!r}")
+    try:
+        return Tag(int(digits, 16))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"unknown tag {text!r}")
+
+
+def column_name(tag):
+    """Keyword of a tag, or its GGGG,EEEE form for private / unknown tags (as in script.py)."""
+    return keyword_for_tag(tag) or f"{tag.group:04X},{tag.element:04X}"
+
+
+def element_value(elem):
+    """JSON-friendly value of a data element."""
+    value = elem.value
+    if isinstance(value, bytes):
+        return "<binary data>"
+    if elem.VR == "SQ":
+        return f"<sequence of {len(value)} items>"
+    if isinstance(value, pydicom.multival.MultiValue):
+        return [_scalar(v) for v in value]
+    return _scalar(value)
+
+
+def _scalar(value):
+    # DS / IS keep their original text; US, UL, FL... stay numbers
+    if isinstance(value, (int, float)) and not isinstance(value, (DSfloat, IS)):
+        return value
+    return str(value)
+
+
+def dump_file(job):
+    """``job`` is (path, tags or None).  Returns {"path", <column>: value, ...} or {"path", "error"}."""
+    path, tags = job
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=tags)
+    except Exception as exc:
+        return {"path": path, "error": str(exc)}
+    record = {"path": path}
+    for elem in ds:
+        record[column_name(elem.tag)] = element_value(elem)
+    return record
+
+
+def iter_inputs(inputs, all_files=False):
+    """Files under every directory, files matching every glob, plain files as given."""
+    for item in inputs:
+        if os.path.isdir(item):
+            yield from walk_files(item, all_files)
+        elif os.path.isfile(item):
+            yield item
+        else:
+            for path in sorted(glob.iglob(item, recursive=True)):
+                if os.path.isdir(path):
+                    yield from walk_files(path, all_files)
+                else:
+                    yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump DICOM header tags of many files as JSON lines or CSV.")
+    parser.add_argument("inputs", nargs="+", help="files, directories (walked recursively) or globs")
+    parser.add_argument("--tags", nargs="+", type=parse_tag, default=None,
+                        help="keywords or hex tags to keep (default: every header element)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl", help="output format")
+    parser.add_argument("--output", default=None, help="file to write (default: stdout)")
+    parser.add_argument("--all-files", action="store_true", help="in directories, probe every file, not only *.dcm")
+    parser.add_argument("--workers", type=int, default=None, help="header reader processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.format == "csv" and not args.tags:
+        parser.error("--format csv needs --tags (the columns must be known up front)")
+    columns = ["path"] + [column_name(t) for t in args.tags or []] + ["error"]
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    dumped = failed = 0
+    try:
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore") if args.format == "csv" else None
+        if writer:
+            writer.writeheader()
+        jobs = ((path, args.tags) for path in iter_inputs(args.inputs, args.all_files))
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            while True:
+                batch = list(itertools.islice(jobs, BATCH_SIZE))
+                if not batch:
+                    break
+                for record in pool.map(dump_file, batch, chunksize=CHUNKSIZE):
+                    if "error" in record:
+                        failed += 1
+                    else:
+                        dumped += 1
+                    if writer:
+                        writer.writerow({k: "\\".join(map(str, v)) if isinstance(v, list) else v
+                                         for k, v in record.items()})
+                    else:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    print(f"DONE! {dumped} files dumped, {failed} unreadable", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
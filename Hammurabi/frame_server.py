@@ -0,0 +1,351 @@
+"""
+Local DICOMweb-style server for the catalog built by obtain_table_data.py.
+
+nginx serves every frame as a separate full-file GET.  This async service
+(aiohttp) serves the same manifest through QIDO-RS / WADO-RS style
+endpoints, so a viewer can fetch a whole range of frames in one
+multipart/related response:
+
+    GET /studies[?PatientID=...]                          studies (DICOM JSON)
+    GET /studies/{study}/series                           series of a study
+    GET /studies/{study}/series/{series}/instances        instances of a series
+    GET /studies/{study}/series/{series}/instances/{sop}  the .dcm (byte ranges)
+    GET /studies/{study}/series/{series}/instances/{sop}/frames/{1,3,5-9}
+    GET /studies/{study}/series/{series}/frames/{1-200}   frames across the series
+
+Frame numbers are 1-based; series frames count in display order over all
+instances.  Pixel data comes from the packed volume (series_volume.py)
+when the series has one, else from the files.  Every response carries an
+ETag (If-None-Match answers 304), files honour Range requests, and JSON /
+multipart bodies are gzip/deflate compressed when the client accepts it,
+with Vary: Accept-Encoding and a distinct ETag per content coding.
+
+    python frame_server.py hammurabi-ui/src/data/dicomData_updated.json \
+        --public-dir hammurabi-ui/public --port 8042
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+
+import numpy as np
+import pydicom
+from aiohttp import web
+
+from dicom_headers import read_header
+from series_volume import header_path_for, load_manifest, local_path, open_volume
+
+INSTANCE_TAGS = ["SOPInstanceUID", "SOPClassUID", "InstanceNumber", "NumberOfFrames",
+                 "Rows", "Columns", "BitsAllocated", "SamplesPerPixel"]
+
+
+def parse_frame_list(text, count):
+    """'1,3,5-9' -> [1, 3, 5, 6, 7, 8, 9]; raises ValueError outside 1..count."""
+    frames = []
+    for part in text.split(","):
+        first, _, last = part.strip().partition("-")
+        start, stop = int(first), int(last or first)
+        if start < 1 or stop > count or start > stop:
+            raise ValueError(f"frame range {part!r} outside 1-{count}")
+        frames.extend(range(start, stop + 1))
+    return frames
+
+
+def dicom_json(**attributes):
+    """{"0020000D": {"vr": "UI", "Value": [...]}} from (tag hex, vr, value) keyword arguments."""
+    out = {}
+    for tag, (vr, value) in attributes.items():
+        if value is None or value == "":
+            out[tag] = {"vr": vr}
+        else:
+            out[tag] = {"vr": vr, "Value": [{"Alphabetic": value} if vr == "PN" else value]}
+    return out
+
+
+# ------------------------------------------------------------------------
+# Catalog
+# ------------------------------------------------------------------------
+class Catalog:
+    """The manifest, indexed by study and series, with lazily read instance headers."""
+
+    def __init__(self, manifest_json, public_dir=None):
+        self.public_dir = public_dir
+        self.studies = {}
+        self.series = {}
+        for patient in load_manifest(manifest_json):
+            for study in patient["studies"]:
+                self.studies[study["studyUID"]] = {"patientID": patient["patientID"], **study}
+                for series in study["series"]:
+                    self.series[series["seriesUID"]] = {"studyUID": study["studyUID"], **series}
+        self._instances = {}
+
+    def instances(self, series_uid):
+        """[{"path", "sop", "frames", "first"}...] of a series in display order (cached)."""
+        if series_uid not in self._instances:
+            rows, first = [], 1
+            for path in self.series[series_uid].get("imageFilePaths") or []:
+                path = local_path(path, self.public_dir)
+                ds = read_header(path, INSTANCE_TAGS)
+                frames = int(ds.get("NumberOfFrames") or 1)
+                rows.append({
+                    "path": path,
+                    "sop": str(ds.get("SOPInstanceUID", "")),
+                    "sopClass": str(ds.get("SOPClassUID", "")),
+                    "number": ds.get("InstanceNumber"),
+                    "frames": frames,
+                    "first": first,
+                    "rows": ds.get("Rows"),
+                    "columns": ds.get("Columns"),
+                })
+                first += frames
+            self._instances[series_uid] = rows
+        return self._instances[series_uid]
+
+    def volume(self, series_uid):
+        """(header, memmap) of the packed volume of a series, or None."""
+        header_path = header_path_for(self.series[series_uid], self.public_dir)
+        return open_volume(header_path) if header_path else None
+
+
+def file_frames(path, numbers):
+    """Raw little endian pixel data of frames ``numbers`` (1-based) of one file."""
+    ds = pydicom.dcmread(path)
+    syntax = ds.file_meta.TransferSyntaxUID
+    count = int(ds.get("NumberOfFrames") or 1)
+    if syntax.is_compressed or not syntax.is_little_endian:
+        pixels = ds.pixel_array.reshape((count,) + ds.pixel_array.shape[-2 - (ds.SamplesPerPixel > 1):])
+        pixels = pixels.astype(pixels.dtype.newbyteorder("<"))
+        return [pixels[n - 1].tobytes() for n in numbers]
+    length = ds.Rows * ds.Columns * ds.SamplesPerPixel * ds.BitsAllocated // 8
+    data = ds.PixelData
+    return [data[(n - 1) * length:n * length] for n in numbers]
+
+
+def series_frames(catalog, series_uid, numbers):
+    """Raw pixel data of series frames ``numbers`` (1-based, across instances)."""
+    packed = catalog.volume(series_uid)
+    if packed is not None:
+        _, volume = packed
+        return [np.ascontiguousarray(volume[n - 1]).tobytes() for n in numbers]
+    out, instances = {}, catalog.instances(series_uid)
+    wanted = set(numbers)
+    for inst in instances:
+        mine = [n for n in range(inst["first"], inst["first"] + inst["frames"]) if n in wanted]
+        if mine:
+            for n, data in zip(mine, file_frames(inst["path"], [n - inst["first"] + 1 for n in mine])):
+                out[n] = data
+    return [out[n] for n in numbers]
+
+
+# ------------------------------------------------------------------------
+# HTTP helpers
+# ------------------------------------------------------------------------
+def _etag(*parts):
+    return '"' + hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def _file_tag(path):
+    st = os.stat(path)
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _coding(request):
+    """Content coding the body goes out with: "gzip", "deflate" or None (identity)."""
+    accepted = request.headers.get("Accept-Encoding", "")
+    return next((coding for coding in ("gzip", "deflate") if coding in accepted), None)
+
+
+def _coded_etag(request, etag):
+    """A strong ETag per content coding: a cache must not validate one body with another."""
+    coding = _coding(request)
+    return etag if coding is None else f'{etag[:-1]}-{coding}"'
+
+
+def _not_modified(request, etag):
+    match = request.headers.get("If-None-Match", "")
+    return _coded_etag(request, etag) in [m.strip() for m in match.split(",")] or match.strip() == "*"
+
+
+def _not_modified_response(request, etag):
+    return web.Response(status=304, headers={"ETag": _coded_etag(request, etag), "Vary": "Accept-Encoding"})
+
+
+def _compressed(request, response, etag):
+    response.headers["ETag"] = _coded_etag(request, etag)
+    response.headers["Vary"] = "Accept-Encoding"
+    coding = _coding(request)
+    if coding is not None:
+        response.enable_compression(web.ContentCoding(coding))
+    return response
+
+
+def json_response(request, payload, etag):
+    if _not_modified(request, etag):
+        return _not_modified_response(request, etag)
+    response = web.Response(body=json.dumps(payload).encode("utf-8"),
+                            headers={"Content-Type": "application/dicom+json"})
+    return _compressed(request, response, etag)
+
+
+def multipart_response(request, frames, etag, location):
+    """multipart/related; type="application/octet-stream" body of raw frames."""
+    if _not_modified(request, etag):
+        return _not_modified_response(request, etag)
+    # same frames, same bytes: the boundary comes from the (strong) ETag
+    boundary = "frames-" + etag.strip('"')
+    chunks = []
+    for number, data in frames:
+        chunks.append(
+            f"--{boundary}\r\nContent-Type: application/octet-stream\r\n"
+            f"Content-Location: {location}/{number}\r\n\r\n".encode("ascii"))
+        chunks.append(data)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+    response = web.Response(body=b"".join(chunks), headers={
+        "Content-Type": f'multipart/related; type="application/octet-stream"; boundary={boundary}',
+    })
+    return _compressed(request, response, etag)
+
+
+# ------------------------------------------------------------------------
+# Handlers
+# ------------------------------------------------------------------------
+def _catalog(request):
+    return request.app["catalog"]
+
+
+def _series_or_404(request):
+    catalog = _catalog(request)
+    series = catalog.series.get(request.match_info["series"])
+    if series is None or series["studyUID"] != request.match_info["study"]:
+        raise web.HTTPNotFound(text="unknown series")
+    return catalog, series
+
+
+async def search_studies(request):
+    catalog = _catalog(request)
+    patient_id = request.query.get("PatientID")
+    study_uid = request.query.get("StudyInstanceUID")
+    results = []
+    for uid, study in catalog.studies.items():
+        if (patient_id and study["patientID"] != patient_id) or (study_uid and uid != study_uid):
+            continue
+        date = study.get("studyDate") or ""
+        if len(date) == 10 and date[2] == "-":  # MM-DD-YYYY back to DA
+            date = date[6:] + date[:2] + date[3:5]
+        results.append(dicom_json(**{
+            "00100020": ("LO", study["patientID"]),
+            "0020000D": ("UI", uid),
+            "00081030": ("LO", study.get("studyDescription")),
+            "00080020": ("DA", date),
+            "00201206": ("IS", len(study["series"])),
+            "00201208": ("IS", sum(s.get("numberOfImages") or 0 for s in study["series"])),
+        }))
+    return json_response(request, results, _etag("studies", request.app["manifest_tag"], request.query_string))
+
+
+async def search_series(request):
+    catalog = _catalog(request)
+    study = catalog.studies.get(request.match_info["study"])
+    if study is None:
+        raise web.HTTPNotFound(text="unknown study")
+    results = [dicom_json(**{
+        "0020000D": ("UI", study["studyUID"]),
+        "0020000E": ("UI", s["seriesUID"]),
+        "0008103E": ("LO", s.get("seriesDescription")),
+        "00201209": ("IS", s.get("numberOfImages")),
+    }) for s in study["series"]]
+    return json_response(request, results, _etag("series", request.app["manifest_tag"], study["studyUID"]))
+
+
+async def search_instances(request):
+    catalog, series = _series_or_404(request)
+    instances = await asyncio.to_thread(catalog.instances, series["seriesUID"])
+    results = [dicom_json(**{
+        "0020000E": ("UI", series["seriesUID"]),
+        "00080016": ("UI", inst["sopClass"]),
+        "00080018": ("UI", inst["sop"]),
+        "00200013": ("IS", inst["number"]),
+        "00280008": ("IS", inst["frames"]),
+        "00280010": ("US", inst["rows"]),
+        "00280011": ("US", inst["columns"]),
+    }) for inst in instances]
+    return json_response(request, results, _etag("instances", request.app["manifest_tag"], series["seriesUID"]))
+
+
+def _instance_or_404(catalog, series_uid, sop):
+    for inst in catalog.instances(series_uid):
+        if inst["sop"] == sop:
+            return inst
+    raise web.HTTPNotFound(text="unknown instance")
+
+
+async def retrieve_instance(request):
+    catalog, series = _series_or_404(request)
+    inst = await asyncio.to_thread(_instance_or_404, catalog, series["seriesUID"], request.match_info["sop"])
+    # FileResponse handles Range / If-Range, ETag and If-None-Match itself
+    return web.FileResponse(inst["path"], headers={"Content-Type": "application/dicom"})
+
+
+async def retrieve_instance_frames(request):
+    catalog, series = _series_or_404(request)
+    inst = await asyncio.to_thread(_instance_or_404, catalog, series["seriesUID"], request.match_info["sop"])
+    try:
+        numbers = parse_frame_list(request.match_info["frames"], inst["frames"])
+    except ValueError as exc:
+        raise web.HTTPBadRequest(text=str(exc))
+    etag = _etag("frames", _file_tag(inst["path"]), numbers)
+    if _not_modified(request, etag):
+        return _not_modified_response(request, etag)
+    frames = await asyncio.to_thread(file_frames, inst["path"], numbers)
+    return multipart_response(request, list(zip(numbers, frames)), etag, request.path.rsplit("/", 1)[0])
+
+
+async def retrieve_series_frames(request):
+    catalog, series = _series_or_404(request)
+    instances = await asyncio.to_thread(catalog.instances, series["seriesUID"])
+    count = sum(inst["frames"] for inst in instances)
+    try:
+        numbers = parse_frame_list(request.match_info["frames"], count)
+    except ValueError as exc:
+        raise web.HTTPBadRequest(text=str(exc))
+    etag = _etag("series-frames", request.app["manifest_tag"], series["seriesUID"], numbers,
+                 *(_file_tag(inst["path"]) for inst in instances))
+    if _not_modified(request, etag):
+        return _not_modified_response(request, etag)
+    frames = await asyncio.to_thread(series_frames, catalog, series["seriesUID"], numbers)
+    return multipart_response(request, list(zip(numbers, frames)), etag, request.path.rsplit("/", 1)[0])
+
+
+def make_app(manifest_json, public_dir=None):
+    app = web.Application()
+    app["catalog"] = Catalog(manifest_json, public_dir)
+    app["manifest_tag"] = _file_tag(manifest_json)
+    base = "/studies/{study}/series/{series}"
+    app.add_routes([
+        web.get("/studies", search_studies),
+        web.get("/studies/{study}/series", search_series),
+        web.get(base + "/instances", search_instances),
+        web.get(base + "/instances/{sop}", retrieve_instance),
+        web.get(base + "/instances/{sop}/frames/{frames}", retrieve_instance_frames),
+        web.get(base + "/frames/{frames}", retrieve_series_frames),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a manifest through DICOMweb-style endpoints.")
+    parser.add_argument("manifest", help="manifest JSON produced by obtain_table_data.py / build_catalog.py")
+    parser.add_argument("--public-dir", default=None, help="folder that /assets/... URLs in the manifest live under")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8042)
+    args = parser.parse_args()
+
+    app = make_app(args.manifest, args.public_dir)
+    print(f"Serving {len(app['catalog'].series)} series from {args.manifest}")
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Phase timing for the ingest scripts.
+
+A Tracer records named spans (wall-clock intervals, nested as they run)
+and counters.  At the end of a run it prints a summary table, per phase
+the calls, total and self time (total minus the phases nested inside),
+and can export the run as a Chrome trace (chrome://tracing, Perfetto,
+speedscope) to see which phase a slow nightly ingest spent its time in:
+
+    trace = Tracer()
+    with trace.span("list series folder", series=uid):
+        ...
+    trace.count("files found", len(files))
+    trace.print_summary()
+    trace.write_chrome_trace("ingest-trace.json")
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.events = []  # (name, start ns, duration ns, thread, args)
+        self.counters = {}
+        self._counter_events = []  # (name, ns, value)
+        self._open = threading.local()
+
+    def _now(self):
+        return time.perf_counter_ns() - self.origin
+
+    @contextmanager
+    def span(self, name, **args):
+        """Time the enclosed block as phase ``name``; ``args`` end up in the trace."""
+        stack = self._open.__dict__.setdefault("stack", [])
+        start = self._now()
+        stack.append([name, 0])  # [name, time spent in nested spans]
+        try:
+            yield
+        finally:
+            duration = self._now() - start
+            _, nested = stack.pop()
+            if stack:
+                stack[-1][1] += duration
+            self.events.append((name, start, duration, nested, threading.get_ident(), args))
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+        self._counter_events.append((name, self._now(), self.counters[name]))
+
+    # --------------------------------------------------------------------
+    # Reports
+    # --------------------------------------------------------------------
+    def summary(self):
+        """[{"phase", "calls", "total", "self", "max"}] in seconds, in order of first appearance."""
+        rows = {}
+        for name, start, duration, nested, _, _ in sorted(self.events, key=lambda e: e[1]):
+            row = rows.setdefault(name, {"phase": name, "calls": 0, "total": 0.0, "self": 0.0, "max": 0.0})
+            row["calls"] += 1
+            row["total"] += duration / 1e9
+            row["self"] += (duration - nested) / 1e9
+            row["max"] = max(row["max"], duration / 1e9)
+        return list(rows.values())
+
+    def print_summary(self, file=None):
+        file = file or sys.stdout
+        wall = self._now() / 1e9
+        print(f"\n{'phase':<28}{'calls':>8}{'total s':>10}{'self s':>10}{'max ms':>10}{'self %':>8}", file=file)
+        for row in self.summary():
+            print(f"{row['phase']:<28}{row['calls']:>8}{row['total']:>10.3f}{row['self']:>10.3f}"
+                  f"{1000 * row['max']:>10.1f}{100 * row['self'] / wall if wall else 0:>7.1f}%", file=file)
+        print(f"{'wall clock':<28}{'':>8}{wall:>10.3f}", file=file)
+        for name, value in self.counters.items():
+            print(f"{name:<28}{value:>8}", file=file)
+
+    def write_chrome_trace(self, path):
+        """Write the spans and counters in the Chrome trace event format."""
+        pid = os.getpid()
+        events = [
+            {"name": name, "cat": "ingest", "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+             "pid": pid, "tid": tid, "args": args}
+            for name, start, duration, _, tid, args in self.events
+        ]
+        events += [
+            {"name": name, "cat": "ingest", "ph": "C", "ts": ts / 1000, "pid": pid, "args": {name: value}}
+            for name, ts, value in self._counter_events
+        ]
+        doc = {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": self.counters}}
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(doc, out)
@@ -0,0 +1,294 @@
+"""
+Persistent SQLite index behind incremental manifest rebuilds.
+
+The index remembers what the last run saw: the CSV (size + mtime, and the
+--base-dir / --scan-headers it was resolved with), every series row it
+produced, every series folder (mtime) and every .dcm file
+(path, size, mtime and the header fields used for ordering).  A rebuild
+lists every series folder but only re-reads headers of files whose
+size/mtime changed; the JSON is regenerated from the index.
+"""
+import os
+import sqlite3
+
+from dicom_headers import sort_series_headers
+
+# Bumped whenever the tables change; an index of another version is dropped
+# and rebuilt (it is only a cache of the CSV and the folders).
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path          TEXT PRIMARY KEY,
+    size          INTEGER NOT NULL,
+    mtime_ns      INTEGER NOT NULL,
+    base_dir      TEXT NOT NULL,
+    scan_headers  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series (
+    series_uid         TEXT PRIMARY KEY,
+    patient_id         TEXT NOT NULL,
+    study_uid          TEXT NOT NULL,
+    study_description  TEXT,
+    study_date         TEXT,
+    series_description TEXT,
+    csv_images         INTEGER,
+    csv_order          INTEGER NOT NULL,
+    folder             TEXT NOT NULL,
+    folder_mtime_ns    INTEGER,
+    scanned            INTEGER NOT NULL DEFAULT 0,
+    frame_count        INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    path             TEXT PRIMARY KEY,
+    series_uid       TEXT NOT NULL,
+    size             INTEGER NOT NULL,
+    mtime_ns         INTEGER NOT NULL,
+    instance_number  INTEGER,
+    location         REAL,
+    frames           INTEGER,
+    unreadable       INTEGER NOT NULL DEFAULT 0,
+    error            TEXT,
+    position         INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_by_series ON files (series_uid, position);
+"""
+
+
+class ManifestIndex:
+    def __init__(self, db_path):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS series; DROP TABLE IF EXISTS files;"
+                f"PRAGMA user_version = {SCHEMA_VERSION};"
+            )
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    # CSV source
+    # ------------------------------------------------------------------
+    def source_unchanged(self, path, base_dir, scan_headers):
+        """True when the CSV, and the base dir and scan mode it was indexed with, are those of the last run."""
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, base_dir, scan_headers FROM sources WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        return row == (st.st_size, st.st_mtime_ns, os.path.abspath(base_dir), int(scan_headers))
+
+    def record_source(self, path, base_dir, scan_headers):
+        st = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sources (path, size, mtime_ns, base_dir, scan_headers) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(path), st.st_size, st.st_mtime_ns, os.path.abspath(base_dir), int(scan_headers)),
+        )
+        self.conn.commit()
+
+    def store_series(self, rows):
+        """
+        Replace the series table with the rows streamed from the CSV.
+
+        ``rows`` are read_csv_rows() records with the resolved series
+        "folder" added.  Series whose folder is unchanged keep their scan
+        state; series that disappeared from the CSV are dropped together
+        with their files.  A series listed twice keeps its first row, as in
+        a plain run.
+        """
+        seen = {}
+        for order, row in enumerate(rows):
+            if row["seriesUID"] in seen:
+                continue
+            seen[row["seriesUID"]] = None
+            self.conn.execute(
+                """
+                INSERT INTO series (series_uid, patient_id, study_uid, study_description, study_date,
+                                    series_description, csv_images, csv_order, folder)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (series_uid) DO UPDATE SET
+                    patient_id = excluded.patient_id,
+                    study_uid = excluded.study_uid,
+                    study_description = excluded.study_description,
+                    study_date = excluded.study_date,
+                    series_description = excluded.series_description,
+                    csv_images = excluded.csv_images,
+                    csv_order = excluded.csv_order,
+                    folder_mtime_ns = CASE WHEN folder = excluded.folder THEN folder_mtime_ns END,
+                    folder = excluded.folder
+                """,
+                (
+                    row["seriesUID"], row["patientID"], row["studyUID"], row["studyDescription"],
+                    row["studyDate"], row["seriesDescription"], row["numberOfImages"], order, row["folder"],
+                ),
+            )
+
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (series_uid TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM seen")
+        self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((uid,) for uid in seen))
+        removed = self.conn.execute(
+            "DELETE FROM series WHERE series_uid NOT IN (SELECT series_uid FROM seen)"
+        ).rowcount
+        self.conn.execute("DELETE FROM files WHERE series_uid NOT IN (SELECT series_uid FROM series)")
+        self.conn.commit()
+        return removed
+
+    # ------------------------------------------------------------------
+    # Series folders / files
+    # ------------------------------------------------------------------
+    def series_folders(self):
+        """(series_uid, folder, folder_mtime_ns, scanned) for every indexed series."""
+        return self.conn.execute(
+            "SELECT series_uid, folder, folder_mtime_ns, scanned FROM series ORDER BY csv_order"
+        ).fetchall()
+
+    def file_stats(self, series_uid):
+        """{path: (size, mtime_ns)} of the files indexed for a series."""
+        rows = self.conn.execute(
+            "SELECT path, size, mtime_ns FROM files WHERE series_uid = ?", (series_uid,)
+        )
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def mark_missing(self, series_uid):
+        self.conn.execute("DELETE FROM files WHERE series_uid = ?", (series_uid,))
+        self.conn.execute(
+            "UPDATE series SET folder_mtime_ns = NULL, scanned = 0, frame_count = NULL WHERE series_uid = ?",
+            (series_uid,),
+        )
+
+    def update_series_files(self, series_uid, folder_mtime_ns, stats, headers, scanned):
+        """
+        Bring one series' files in line with what is on disk.
+
+        ``stats`` maps every current path to (size, mtime_ns); ``headers``
+        holds freshly read sort headers for the paths that changed (empty
+        when headers are not scanned).  Display order is recomputed for the
+        whole series from the stored + fresh header fields.
+        """
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS present (path TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM present")
+        self.conn.executemany("INSERT INTO present VALUES (?)", ((p,) for p in stats))
+        self.conn.execute(
+            "DELETE FROM files WHERE series_uid = ? AND path NOT IN (SELECT path FROM present)",
+            (series_uid,),
+        )
+
+        for path, header in headers.items():
+            size, mtime_ns = stats[path]
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO files (path, series_uid, size, mtime_ns,
+                                              instance_number, location, frames, unreadable, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    path, series_uid, size, mtime_ns, header.get("instanceNumber"),
+                    header.get("location"), header.get("frames"), int("error" in header), header.get("error"),
+                ),
+            )
+        if not scanned:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, series_uid, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                ((p, series_uid, size, mtime) for p, (size, mtime) in stats.items()),
+            )
+
+        rows = self.conn.execute(
+            "SELECT path, instance_number, location, frames FROM files "
+            "WHERE series_uid = ? AND unreadable = 0",
+            (series_uid,),
+        ).fetchall()
+        if scanned:
+            ordered = sort_series_headers([
+                {"path": p, "instanceNumber": inst, "location": loc, "frames": frames}
+                for p, inst, loc, frames in rows
+            ])
+            frame_count = sum(h["frames"] or 1 for h in ordered)
+        else:
+            # same order the plain listing has always produced
+            ordered = [{"path": p} for p in sorted(r[0] for r in rows)]
+            frame_count = None
+
+        self.conn.executemany(
+            "UPDATE files SET position = ? WHERE path = ?",
+            ((i, h["path"]) for i, h in enumerate(ordered)),
+        )
+        self.conn.execute(
+            "UPDATE series SET folder_mtime_ns = ?, scanned = ?, frame_count = ? WHERE series_uid = ?",
+            (folder_mtime_ns, int(scanned), frame_count, series_uid),
+        )
+        self.conn.commit()
+
+    def scan_problems(self):
+        """
+        (patient_id, series_uid, [(path, error)], frame_count, csv_images)
+        of every header-scanned series with unreadable files or a frame
+        count that differs from the CSV, in CSV order.
+        """
+        rows = self.conn.execute(
+            """
+            SELECT series_uid, patient_id, csv_images, frame_count FROM series AS s
+            WHERE scanned = 1
+              AND EXISTS (SELECT 1 FROM files WHERE files.series_uid = s.series_uid)
+              AND (frame_count IS NOT csv_images
+                   OR EXISTS (SELECT 1 FROM files WHERE files.series_uid = s.series_uid AND unreadable = 1))
+            ORDER BY csv_order
+            """
+        ).fetchall()
+        for series_uid, pid, csv_images, frame_count in rows:
+            unreadable = self.conn.execute(
+                "SELECT path, error FROM files WHERE series_uid = ? AND unreadable = 1 ORDER BY path",
+                (series_uid,),
+            ).fetchall()
+            yield pid, series_uid, unreadable, frame_count, csv_images
+
+    # ------------------------------------------------------------------
+    # Regenerate the patient list, one finished patient at a time
+    # ------------------------------------------------------------------
+    def iter_patients(self):
+        """
+        Yield patients in the shape of the output JSON.
+
+        Patients and studies keep the order of their first CSV row, so the
+        result matches a plain (non-indexed) run; only one patient is held
+        in memory at a time.
+        """
+        series_rows = self.conn.execute(
+            """
+            SELECT series_uid, patient_id, study_uid, study_description, study_date,
+                   series_description, csv_images, scanned, frame_count
+            FROM series
+            ORDER BY MIN(csv_order) OVER (PARTITION BY patient_id),
+                     MIN(csv_order) OVER (PARTITION BY patient_id, study_uid),
+                     csv_order
+            """
+        )
+        patient = None
+        for (series_uid, pid, study_uid, study_desc, study_date,
+             series_desc, csv_images, scanned, frame_count) in series_rows:
+            if patient is None or patient["patientID"] != pid:
+                if patient is not None:
+                    yield patient
+                patient = {"patientID": pid, "studies": []}
+            if not patient["studies"] or patient["studies"][-1]["studyUID"] != study_uid:
+                patient["studies"].append({
+                    "studyUID": study_uid,
+                    "studyDescription": study_desc,
+                    "studyDate": study_date,
+                    "series": []
+                })
+
+            paths = [r[0] for r in self.conn.execute(
+                "SELECT path FROM files WHERE series_uid = ? AND unreadable = 0 ORDER BY position",
+                (series_uid,),
+            )]
+            patient["studies"][-1]["series"].append({
+                "seriesUID": series_uid,
+                "seriesDescription": series_desc,
+                "numberOfImages": frame_count if scanned and paths else csv_images,
+                "imageFilePaths": paths,
+            })
+        if patient is not None:
+            yield patient
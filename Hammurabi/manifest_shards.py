@@ -0,0 +1,156 @@
+"""
+Sharded manifest: a small root index plus one content-hashed file per series.
+
+The root index keeps the patient/study/series tree with counts but no
+image paths; each series entry points at its shard.  A shard replaces the
+list of full paths with a path template and the runs of numbers that fill
+it in, e.g. ``.../1-{n}.dcm`` with padding 2 and runs [[1, 60]] for
+1-01.dcm … 1-60.dcm.  Shard names are a hash of their content, so they can
+be cached forever and the UI only downloads the series it opens.
+
+    python manifest_shards.py hammurabi-ui/src/data/dicomData_updated.json \
+        hammurabi-ui/public/manifest
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from manifest_writer import write_manifest
+
+INDEX_NAME = "index.json"
+SHARD_DIR = "series"
+HASH_LENGTH = 16
+# Numbers must survive JSON.parse in the browser (Number.MAX_SAFE_INTEGER).
+MAX_SAFE_INTEGER = 2 ** 53 - 1
+
+_NUMBERED = re.compile(r"^(.*?)(\d+)(\D*)$")
+
+
+def _runs(numbers):
+    """[1, 2, 3, 7, 8] -> [[1, 3], [7, 2]] (start, length)."""
+    runs = []
+    for n in numbers:
+        if runs and n == runs[-1][0] + runs[-1][1]:
+            runs[-1][1] += 1
+        else:
+            runs.append([n, 1])
+    return runs
+
+
+def compress_paths(paths):
+    """
+    Describe an ordered list of paths as a template + numbers when they all
+    share a folder, prefix and suffix around one number; otherwise (or when
+    the paths themselves contain "{n}") fall back to the folder plus the
+    list of file names.
+    """
+    if not paths:
+        return {"files": []}
+
+    # folder keeps its trailing slash so "/x.dcm" and "x.dcm" both round-trip
+    folder = paths[0][:paths[0].rfind("/") + 1]
+    names = []
+    for p in paths:
+        head, name = p[:p.rfind("/") + 1], p[p.rfind("/") + 1:]
+        if head != folder:
+            return {"files": list(paths)}
+        names.append(name)
+
+    matches = [_NUMBERED.match(name) for name in names]
+    if all(matches):
+        prefix, suffix = matches[0].group(1), matches[0].group(3)
+        digits = [m.group(2) for m in matches]
+        same_shape = all(m.group(1) == prefix and m.group(3) == suffix for m in matches)
+        padded = {len(d) for d in digits if d.startswith("0") and len(d) > 1}
+        padding = padded.pop() if len(padded) == 1 else 0
+        numbers = [int(d) for d in digits]
+        literal = "{n}" in folder + prefix + suffix  # expand_paths would fill it in too
+        if same_shape and not literal and len(set(numbers)) == len(numbers) and max(numbers) <= MAX_SAFE_INTEGER and all(
+            (str(n).zfill(padding) if padding else str(n)) == d for n, d in zip(numbers, digits)
+        ):
+            template = f"{prefix}{{n}}{suffix}"
+            return {
+                "pathTemplate": folder + template,
+                "padding": padding,
+                "numberRuns": _runs(numbers),
+            }
+
+    return {"folder": folder, "files": names}
+
+
+def expand_paths(shard):
+    """Inverse of compress_paths: the ordered list of paths of a shard."""
+    if "pathTemplate" in shard:
+        pad = shard.get("padding", 0)
+        return [
+            shard["pathTemplate"].replace("{n}", str(n).zfill(pad))
+            for start, length in shard["numberRuns"]
+            for n in range(start, start + length)
+        ]
+    if "folder" in shard:
+        return [shard["folder"] + name for name in shard["files"]]
+    return list(shard["files"])
+
+
+def _write_shard(series, shard_dir):
+    shard = {
+        "seriesUID": series["seriesUID"],
+        "numberOfImages": series["numberOfImages"],
+        **compress_paths([p.replace("\\", "/") for p in series["imageFilePaths"]]),
+    }
+    data = json.dumps(shard, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    name = hashlib.sha256(data).hexdigest()[:HASH_LENGTH] + ".json"
+    path = os.path.join(shard_dir, name)
+    if not os.path.exists(path):  # same content => same name, nothing to do
+        with open(path, "wb") as out:
+            out.write(data)
+    return name
+
+
+def iter_index_patients(patients, out_dir, written):
+    """Write each series' shard and yield the patient without its paths."""
+    shard_dir = os.path.join(out_dir, SHARD_DIR)
+    for patient in patients:
+        for study in patient["studies"]:
+            for series in study["series"]:
+                name = _write_shard(series, shard_dir)
+                written.add(name)
+                del series["imageFilePaths"]
+                series["shard"] = f"{SHARD_DIR}/{name}"
+        yield patient
+
+
+def write_sharded_manifest(patients, out_dir):
+    """
+    Write ``out_dir/index.json`` and ``out_dir/series/<hash>.json`` from a
+    stream of patients in the usual manifest shape; shards no longer
+    referenced by the new index are removed.  Returns the patient count.
+    """
+    os.makedirs(os.path.join(out_dir, SHARD_DIR), exist_ok=True)
+    written = set()
+    count = write_manifest(iter_index_patients(patients, out_dir, written),
+                           os.path.join(out_dir, INDEX_NAME), compact=True)
+
+    shard_dir = os.path.join(out_dir, SHARD_DIR)
+    for name in os.listdir(shard_dir):
+        if name.endswith(".json") and name not in written:
+            os.remove(os.path.join(shard_dir, name))
+    print(f"Wrote {count} patients, {len(written)} series shards => {out_dir}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a manifest JSON into a root index and per-series shards.")
+    parser.add_argument("manifest", help="manifest JSON (list of patients with imageFilePaths)")
+    parser.add_argument("out_dir", help="folder receiving index.json and series/<hash>.json")
+    args = parser.parse_args()
+
+    with open(args.manifest, "r", encoding="utf-8") as f:
+        patients = json.load(f)
+    write_sharded_manifest(patients, args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Streaming writer for the viewer's patient list JSON.
+
+Patients are serialised as they arrive from a generator, so the whole
+manifest never has to exist in memory.  ``compact=True`` is the
+production format: no indentation and no spaces after separators.
+with_urls() turns file system paths into the URLs the viewer fetches.
+"""
+import json
+import os
+
+
+def write_manifest(patients, output_json, compact=False):
+    """Write ``patients`` (any iterable) as a JSON array; returns the count."""
+    if os.path.dirname(output_json):
+        os.makedirs(os.path.dirname(output_json), exist_ok=True)
+
+    if compact:
+        dump_kwargs = {"separators": (",", ":")}
+        sep, first, end = ",", "", "]"
+    else:
+        dump_kwargs = {"indent": 2}
+        sep, first, end = ",\n", "\n", "\n]"
+
+    count = 0
+    with open(output_json, "w", encoding="utf-8") as out:
+        out.write("[")
+        for patient in patients:
+            out.write(sep if count else first)
+            text = json.dumps(patient, ensure_ascii=False, **dump_kwargs)
+            if not compact:
+                # nest the patient one level inside the top-level array
+                text = "  " + text.replace("\n", "\n  ")
+            out.write(text)
+            count += 1
+        out.write(end if count else "]")
+    return count
+
+
+def to_url(path, root, url_prefix):
+    """<url_prefix>/<path relative to root>, with forward slashes."""
+    rel = os.path.relpath(path, root).replace(os.sep, "/")
+    return url_prefix.rstrip("/") + "/" + rel
+
+
+def with_urls(patients, root, url_prefix):
+    """Yield ``patients`` with every imageFilePaths entry turned into a URL."""
+    for patient in patients:
+        for study in patient["studies"]:
+            for series in study["series"]:
+                series["imageFilePaths"] = [to_url(p, root, url_prefix) for p in series["imageFilePaths"]]
+        yield patient
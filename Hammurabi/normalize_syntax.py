@@ -0,0 +1,120 @@
+"""
+Normalize incoming DICOM files to Explicit VR Little Endian.
+
+loadDicomImage reads pixel data straight from the PixelData offset, so it
+only understands uncompressed little endian files; a JPEG, JPEG 2000 or
+RLE series renders as noise.  This stage checks the transfer syntax of
+every file from its meta group and rewrites the others, decompressing
+encapsulated pixel data once at ingest instead of on every viewer.  Files
+already in Explicit VR Little Endian are skipped (or just copied when
+writing to --out-dir), so re-running it on a growing archive is cheap.
+
+    python normalize_syntax.py incoming/ --out-dir hammurabi-ui/public/assets/incoming --workers 8
+
+Decoding JPEG family syntaxes needs one of pydicom's pixel data plugins
+(pylibjpeg with its JPEG / OpenJPEG plugins, or GDCM); RLE and the
+uncompressed syntaxes work with NumPy alone.
+"""
+import argparse
+import itertools
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pydicom
+from pydicom.uid import ExplicitVRLittleEndian
+
+from dicom_headers import read_transfer_syntax
+from dump_tags import iter_inputs
+
+# Files handed to the pool per round trip; bounds the in-flight memory.
+BATCH_SIZE = 512
+CHUNKSIZE = 8
+
+
+def _target(path, root, out_dir):
+    if out_dir is None:
+        return path
+    return os.path.join(out_dir, os.path.relpath(path, root))
+
+
+def _up_to_date(path, target):
+    """A normalized copy newer than the source already exists."""
+    return (os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)
+            and read_transfer_syntax(target) == ExplicitVRLittleEndian)
+
+
+def normalize_file(job):
+    """
+    ``job`` is (path, target).  Returns (status, path, detail) where status is
+    "skipped", "copied", "normalized" or "failed".
+    """
+    path, target = job
+    try:
+        if target != path and _up_to_date(path, target):
+            return "skipped", path, None
+        syntax = read_transfer_syntax(path)
+        if syntax == ExplicitVRLittleEndian:
+            if target == path:
+                return "skipped", path, syntax
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(path, target)
+            return "copied", path, syntax
+
+        ds = pydicom.dcmread(path)
+        if ds.file_meta.TransferSyntaxUID.is_compressed:
+            # keep the SOP Instance UID: the manifest and the viewer refer to it
+            ds.decompress(generate_instance_uid=False)
+        elif "PixelData" in ds and not ds.file_meta.TransferSyntaxUID.is_little_endian:
+            ds.PixelData = ds.pixel_array.astype(ds.pixel_array.dtype.newbyteorder("<")).tobytes()
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        tmp = target + ".tmp"
+        # force_encoding also covers big endian sources, which save_as refuses to convert
+        pydicom.dcmwrite(tmp, ds, implicit_vr=False, little_endian=True, force_encoding=True)
+        os.replace(tmp, target)
+        return "normalized", path, syntax
+    except Exception as exc:
+        if os.path.exists(target + ".tmp"):
+            os.remove(target + ".tmp")
+        return "failed", path, str(exc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite DICOM files as Explicit VR Little Endian, decompressing them.")
+    parser.add_argument("inputs", nargs="+", help="files, directories (walked recursively) or globs")
+    parser.add_argument("--out-dir", default=None,
+                        help="write the normalized tree here (relative to --root) instead of in place")
+    parser.add_argument("--root", default=None,
+                        help="folder the --out-dir layout is relative to (default: the first input directory)")
+    parser.add_argument("--all-files", action="store_true", help="in directories, probe every file, not only *.dcm")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    root = args.root or next((i for i in args.inputs if os.path.isdir(i)), os.getcwd())
+    jobs = ((p, _target(p, root, args.out_dir)) for p in iter_inputs(args.inputs, args.all_files))
+
+    counts = {"skipped": 0, "copied": 0, "normalized": 0, "failed": 0}
+    syntaxes = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        while True:
+            batch = list(itertools.islice(jobs, BATCH_SIZE))
+            if not batch:
+                break
+            for status, path, detail in pool.map(normalize_file, batch, chunksize=CHUNKSIZE):
+                counts[status] += 1
+                if status == "failed":
+                    print(f"WARNING: {path}: {detail}")
+                elif status == "normalized":
+                    syntaxes[detail] = syntaxes.get(detail, 0) + 1
+            print(" - " + ", ".join(f"{n} {status}" for status, n in counts.items()))
+
+    for syntax, n in sorted(syntaxes.items()):
+        print(f"   {n} files from {syntax}")
+    print(f"\nDONE! {counts['normalized']} normalized, {counts['skipped'] + counts['copied']} already explicit VR LE, "
+          f"{counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
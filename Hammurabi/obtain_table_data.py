@@ -1,174 +1,478 @@
-import csv
-import json
-import os
-
-# =====================================================================
-# CONFIGURE THESE PATHS
-# =====================================================================
-
-# A) The location of your CSV (the one with the "File Size" comma problem)
-CSV_FILE = r"C:\Users\giacomo.pedemonte\Hammurabi\DICOM_PACS_VIEWER_REFACTORED\hammurabi-ui\public\assets\NBIA_DICOM_Files\manifest-BaJgFARK7427162305084893340\metadata.csv"
-
-# B) The base folder that should be joined with the CSV's "File Location"
-#    Example: "C:\Users\...\public\assets\NBIA_DICOM_Files\manifest-BaJgFARK7427162305084893340"
-BASE_DIR = r"C:\Users\giacomo.pedemonte\Hammurabi\DICOM_PACS_VIEWER_REFACTORED\hammurabi-ui\public\assets\NBIA_DICOM_Files\manifest-BaJgFARK7427162305084893340"
-
-# C) The final JSON we want to produce
-OUTPUT_JSON = r"C:\Users\giacomo.pedemonte\Hammurabi\DICOM_PACS_VIEWER_REFACTORED\hammurabi-ui\src\data\dicomDataFromCSV.json"
-
-# Here are the indexes that match the official header you gave:
-SERIES_UID_IDX   = 0  # "Series UID"
-SUBJECT_ID_IDX   = 4  # "Subject ID"
-STUDY_UID_IDX    = 5  # "Study UID"
-STUDY_DESC_IDX   = 6  # "Study Description"
-STUDY_DATE_IDX   = 7  # "Study Date"
-SERIES_DESC_IDX  = 8  # "Series Description"
-NUM_IMAGES_IDX   = 13 # "Number of Images"
-FILE_LOC_IDX     = 16 # "File Location" (only if your CSV truly has it at index 15)
-
-# If your CSV has an unquoted comma in "File Size" that splits it,
-# the real file path might shift to index 16 or 17.  Adjust as needed!
-
-
-# ------------------------------------------------------------------------
-# 1) BUILD A NESTED DICT => patients_dict[patient_id]["studies"][study_uid]["series"][series_uid]
-# ------------------------------------------------------------------------
-patients_dict = {}
-
-with open(CSV_FILE, "r", encoding="utf-8") as f:
-    reader = csv.reader(f)
-
-    # Skip the header row
-    header = next(reader, None)
-    if not header:
-        raise SystemExit("ERROR: CSV is empty or missing header")
-
-    row_count = 0
-    for row in reader:
-        row_count += 1
-        # If the row is missing columns, skip or warn
-        if len(row) <= FILE_LOC_IDX:
-            print(f"Row {row_count} has only {len(row)} columns, skipping: {row}")
-            continue
-
-        # Extract columns by index
-        series_uid  = row[SERIES_UID_IDX].strip()
-        patient_id  = row[SUBJECT_ID_IDX].strip()
-        study_uid   = row[STUDY_UID_IDX].strip()
-        study_desc  = row[STUDY_DESC_IDX].strip()
-        study_date  = row[STUDY_DATE_IDX].strip()
-        series_desc = row[SERIES_DESC_IDX].strip()
-        num_img_str = row[NUM_IMAGES_IDX].strip()
-        file_loc    = row[FILE_LOC_IDX].strip()
-
-        # parse integer
-        try:
-            number_of_images = int(num_img_str)
-        except ValueError:
-            number_of_images = 0
-
-        # Insert into nested dict
-        if patient_id not in patients_dict:
-            patients_dict[patient_id] = {
-                "patientID": patient_id,
-                "studies": {}
-            }
-
-        if study_uid not in patients_dict[patient_id]["studies"]:
-            patients_dict[patient_id]["studies"][study_uid] = {
-                "studyUID": study_uid,
-                "studyDescription": study_desc,
-                "studyDate": study_date,
-                "series": {}
-            }
-
-        if series_uid not in patients_dict[patient_id]["studies"][study_uid]["series"]:
-            patients_dict[patient_id]["studies"][study_uid]["series"][series_uid] = {
-                "seriesUID": series_uid,
-                "seriesDescription": series_desc,
-                "numberOfImages": number_of_images,
-                # We'll add imageFilePaths after enumerating .dcm
-                "imageFilePaths": [],
-                "csvFileLocation": file_loc
-            }
-
-print(f"Parsed {row_count} data rows from CSV.\n")
-
-# ------------------------------------------------------------------------
-# 2) ENUMERATE .DCM FILES PER SERIES FOLDER
-# ------------------------------------------------------------------------
-for pid, pinfo in patients_dict.items():
-    for study_uid, study_val in pinfo["studies"].items():
-        for series_uid, series_val in study_val["series"].items():
-            csv_loc = series_val["csvFileLocation"]
-
-            # handle leading "./" or ".\"
-            if csv_loc.startswith("./") or csv_loc.startswith(".\\"):
-                csv_loc = csv_loc[2:]
-
-            # unify slashes
-            csv_loc = csv_loc.replace("/", os.sep).replace("\\", os.sep)
-
-            abs_folder = os.path.join(BASE_DIR, csv_loc)
-
-            print("---------------------------------------------------")
-            print(f"PatientID: {pid}")
-            print(f"StudyUID:  {study_uid}")
-            print(f"SeriesUID: {series_uid}")
-            print(f" - CSV File Location: {series_val['csvFileLocation']}")
-            print(f" - Constructed Path => {abs_folder}")
-            dir_exists = os.path.isdir(abs_folder)
-            print(f" - Directory exists? {dir_exists}")
-
-            if not dir_exists:
-                print(" --> Path invalid or missing, skipping.\n")
-                continue
-
-            # find .dcm files
-            all_files = sorted(os.listdir(abs_folder))
-            dcm_files = [f for f in all_files if f.lower().endswith(".dcm")]
-            print(f" - Found {len(dcm_files)} .dcm files.\n")
-
-            # store full absolute paths
-            full_paths = []
-            for df in dcm_files:
-                full_paths.append(os.path.join(abs_folder, df))
-
-            series_val["imageFilePaths"] = full_paths
-
-
-# ------------------------------------------------------------------------
-# 3) CONVERT NESTED DICT => FINAL LIST [ { patientID, studies: [...] }, ... ]
-# ------------------------------------------------------------------------
-final_list = []
-for pid, pval in patients_dict.items():
-    p_obj = {
-        "patientID": pval["patientID"],
-        "studies": []
-    }
-    for st_uid, st_data in pval["studies"].items():
-        s_obj = {
-            "studyUID": st_data["studyUID"],
-            "studyDescription": st_data["studyDescription"],
-            "studyDate": st_data["studyDate"],
-            "series": []
-        }
-        for sr_uid, sr_val in st_data["series"].items():
-            s_obj["series"].append({
-                "seriesUID": sr_val["seriesUID"],
-                "seriesDescription": sr_val["seriesDescription"],
-                "numberOfImages": sr_val["numberOfImages"],
-                "imageFilePaths": sr_val["imageFilePaths"]
-            })
-        p_obj["studies"].append(s_obj)
-    final_list.append(p_obj)
-
-# ------------------------------------------------------------------------
-# 4) WRITE THE OUTPUT JSON
-# ------------------------------------------------------------------------
-os.makedirs(os.path.dirname(OUTPUT_JSON), exist_ok=True)
-
-with open(OUTPUT_JSON, "w", encoding="utf-8") as out:
-    json.dump(final_list, out, indent=2, ensure_ascii=False)
-
-print("\nDONE! Wrote JSON =>", OUTPUT_JSON)
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from ingest_trace import Tracer
+
+# =====================================================================
+# CONFIGURE THESE PATHS
+# =====================================================================
+
+# A) The location of your CSV (the one with the "File Size" comma problem)
+CSV_FILE = r"C:\Users\giacomo.pedemonte\Hammurabi\DICOM_PACS_VIEWER_REFACTORED\hammurabi-ui\public\assets\NBIA_DICOM_Files\manifest-BaJgFARK7427162305084893340\metadata.csv"
+
+# B) The base folder that should be joined with the CSV's "File Location"
+#    Example: "C:\Users\...\public\assets\NBIA_DICOM_Files\manifest-BaJgFARK7427162305084893340"
+BASE_DIR = r"C:\Users\giacomo.pedemonte\Hammurabi\DICOM_PACS_VIEWER_REFACTORED\hammurabi-ui\public\assets\NBIA_DICOM_Files\manifest-BaJgFARK7427162305084893340"
+
+# C) The final JSON we want to produce
+OUTPUT_JSON = r"C:\Users\giacomo.pedemonte\Hammurabi\DICOM_PACS_VIEWER_REFACTORED\hammurabi-ui\src\data\dicomDataFromCSV.json"
+
+# Columns are looked up by their header name, so their position in the CSV
+# does not matter:
+SERIES_UID_COL   = "Series UID"
+SUBJECT_ID_COL   = "Subject ID"
+STUDY_UID_COL    = "Study UID"
+STUDY_DESC_COL   = "Study Description"
+STUDY_DATE_COL   = "Study Date"
+SERIES_DESC_COL  = "Series Description"
+NUM_IMAGES_COL   = "Number of Images"
+FILE_LOC_COL     = "File Location"
+
+# "File Size" is written unquoted with a decimal comma ("10,04 MB"), which
+# splits it in two and shifts every column after it.  Extra cells in a row
+# are put down to this column, so the columns after it are read shifted.
+FILE_SIZE_COL    = "File Size"
+
+# D) Header scan: files handed to each worker process in one go, and how
+#    many files' worth of patients are scanned together
+SCAN_CHUNKSIZE = 64
+SCAN_BATCH_FILES = 4096
+
+# E) Per-series progress lines (--quiet turns them off; at archive scale
+#    printing them costs more than listing the folders) and the phase timings
+VERBOSE = True
+TRACE = Tracer()
+
+
+# ------------------------------------------------------------------------
+# 1) STREAM THE CSV => one patient at a time
+#    patient["studies"][study_uid]["series"][series_uid]
+# ------------------------------------------------------------------------
+def read_csv_rows(csv_file):
+    """Yield one dict per CSV data row, with columns resolved by header name."""
+    wanted = {
+        "seriesUID": SERIES_UID_COL,
+        "patientID": SUBJECT_ID_COL,
+        "studyUID": STUDY_UID_COL,
+        "studyDescription": STUDY_DESC_COL,
+        "studyDate": STUDY_DATE_COL,
+        "seriesDescription": SERIES_DESC_COL,
+        "numberOfImages": NUM_IMAGES_COL,
+        "fileLocation": FILE_LOC_COL,
+    }
+
+    with open(csv_file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+
+        header = next(reader, None)
+        if not header:
+            raise SystemExit("ERROR: CSV is empty or missing header")
+        header = [h.strip() for h in header]
+
+        missing = [col for col in wanted.values() if col not in header]
+        if missing:
+            raise SystemExit(f"ERROR: CSV header has no column(s) {missing}")
+        columns = {key: header.index(col) for key, col in wanted.items()}
+        size_idx = header.index(FILE_SIZE_COL) if FILE_SIZE_COL in header else len(header)
+
+        row_count = 0
+        for row in reader:
+            row_count += 1
+            shift = max(len(row) - len(header), 0)
+            try:
+                record = {
+                    key: row[idx + shift if idx > size_idx else idx].strip()
+                    for key, idx in columns.items()
+                }
+            except IndexError:
+                print(f"Row {row_count} has only {len(row)} columns, skipping: {row}")
+                TRACE.count("csv rows skipped")
+                continue
+
+            # parse integer
+            try:
+                record["numberOfImages"] = int(record["numberOfImages"])
+            except ValueError:
+                record["numberOfImages"] = 0
+            yield record
+
+    TRACE.count("csv rows", row_count)
+    print(f"Parsed {row_count} data rows from CSV.\n")
+
+
+def iter_csv_patients(rows):
+    """
+    Group rows into patients and yield each one as soon as it is complete.
+
+    NBIA exports interleave subjects, so rows are first spilled into a
+    private on-disk SQLite table and read back grouped (patients and
+    studies in order of their first row); only one patient is ever held
+    in memory.
+    """
+    db = sqlite3.connect("")  # "" = private temporary on-disk database
+    try:
+        db.execute("CREATE TABLE rows (ord INTEGER PRIMARY KEY, patient TEXT, study TEXT, data TEXT)")
+        with TRACE.span("csv parse"):
+            db.executemany(
+                "INSERT INTO rows VALUES (?, ?, ?, ?)",
+                ((i, row["patientID"], row["studyUID"], json.dumps(row)) for i, row in enumerate(rows)),
+            )
+        ordered = db.execute(
+            """
+            SELECT data FROM rows
+            ORDER BY MIN(ord) OVER (PARTITION BY patient),
+                     MIN(ord) OVER (PARTITION BY patient, study),
+                     ord
+            """
+        )
+
+        patient = None
+        for (data,) in ordered:
+            row = json.loads(data)
+            if patient is None or patient["patientID"] != row["patientID"]:
+                if patient is not None:
+                    yield patient
+                patient = {
+                    "patientID": row["patientID"],
+                    "studies": {}
+                }
+
+            if row["studyUID"] not in patient["studies"]:
+                patient["studies"][row["studyUID"]] = {
+                    "studyUID": row["studyUID"],
+                    "studyDescription": row["studyDescription"],
+                    "studyDate": row["studyDate"],
+                    "series": {}
+                }
+
+            series = patient["studies"][row["studyUID"]]["series"]
+            if row["seriesUID"] not in series:
+                series[row["seriesUID"]] = {
+                    "seriesUID": row["seriesUID"],
+                    "seriesDescription": row["seriesDescription"],
+                    "numberOfImages": row["numberOfImages"],
+                    # We'll add imageFilePaths after enumerating .dcm
+                    "imageFilePaths": [],
+                    "csvFileLocation": row["fileLocation"]
+                }
+
+        if patient is not None:
+            yield patient
+    finally:
+        db.close()
+
+
+# ------------------------------------------------------------------------
+# 2) ENUMERATE .DCM FILES PER SERIES FOLDER
+# ------------------------------------------------------------------------
+def series_folder(base_dir, csv_loc):
+    # handle leading "./" or ".\"
+    if csv_loc.startswith("./") or csv_loc.startswith(".\\"):
+        csv_loc = csv_loc[2:]
+
+    # unify slashes
+    csv_loc = csv_loc.replace("/", os.sep).replace("\\", os.sep)
+
+    return os.path.join(base_dir, csv_loc)
+
+
+def iter_series(patients):
+    for pinfo in patients:
+        pid = pinfo["patientID"]
+        for study_uid, study_val in pinfo["studies"].items():
+            for series_uid, series_val in study_val["series"].items():
+                yield pid, study_uid, series_uid, series_val
+
+
+def enumerate_series_files(patients, base_dir):
+    for pid, study_uid, series_uid, series_val in iter_series(patients):
+        abs_folder = series_folder(base_dir, series_val["csvFileLocation"])
+        TRACE.count("series")
+
+        if VERBOSE:
+            print("---------------------------------------------------")
+            print(f"PatientID: {pid}")
+            print(f"StudyUID:  {study_uid}")
+            print(f"SeriesUID: {series_uid}")
+            print(f" - CSV File Location: {series_val['csvFileLocation']}")
+            print(f" - Constructed Path => {abs_folder}")
+        dir_exists = os.path.isdir(abs_folder)
+        if VERBOSE:
+            print(f" - Directory exists? {dir_exists}")
+
+        if not dir_exists:
+            if VERBOSE:
+                print(" --> Path invalid or missing, skipping.\n")
+            TRACE.count("series folders missing")
+            continue
+
+        # find .dcm files
+        with TRACE.span("list series folder"):
+            all_files = sorted(os.listdir(abs_folder))
+            dcm_files = [f for f in all_files if f.lower().endswith(".dcm")]
+        TRACE.count("files found", len(dcm_files))
+        if VERBOSE:
+            print(f" - Found {len(dcm_files)} .dcm files.\n")
+
+        # store full absolute paths
+        full_paths = []
+        for df in dcm_files:
+            full_paths.append(os.path.join(abs_folder, df))
+
+        series_val["imageFilePaths"] = full_paths
+
+
+def read_headers(paths, pool):
+    """{path: sort header} for ``paths``, read on the given process pool."""
+    from dicom_headers import read_sort_header
+
+    if not paths:
+        return {}
+    print(f"Reading headers of {len(paths)} files...")
+    with TRACE.span("read headers", files=len(paths)):
+        headers = dict(zip(paths, pool.map(read_sort_header, paths, chunksize=SCAN_CHUNKSIZE)))
+    TRACE.count("headers read", len(headers))
+    return headers
+
+
+def warn_series(pid, series_uid, unreadable, frame_count, csv_images):
+    """Warn about a scanned series' unreadable (path, error) files and a frame count the CSV disagrees with."""
+    for path, error in unreadable:
+        print(f"WARNING: {path} is not readable as DICOM ({error}), dropped.")
+        TRACE.count("unreadable files")
+    if frame_count != csv_images:
+        print(f"WARNING: series {series_uid} (patient {pid}) has {frame_count} frames on disk, "
+              f"CSV says {csv_images}.")
+
+
+# ------------------------------------------------------------------------
+# 2b) (--scan-headers) READ HEADERS IN PARALLEL, SORT FRAMES, CHECK COUNTS
+# ------------------------------------------------------------------------
+def scan_series_headers(patients, pool):
+    """
+    Re-order every series' imageFilePaths by InstanceNumber (or slice
+    position) and check the frame count against the CSV.
+
+    Only headers are read, and all files of all series are spread over a
+    single process pool so a few large series do not serialise the scan.
+    """
+    from dicom_headers import sort_series_headers
+
+    all_paths = []
+    for _, _, _, series_val in iter_series(patients):
+        all_paths.extend(series_val["imageFilePaths"])
+
+    headers = read_headers(all_paths, pool)
+
+    with TRACE.span("sort series"):
+        for pid, study_uid, series_uid, series_val in iter_series(patients):
+            series_headers = [headers[p] for p in series_val["imageFilePaths"]]
+            if not series_headers:
+                continue
+
+            ordered = sort_series_headers([h for h in series_headers if "error" not in h])
+            frame_count = sum(h["frames"] for h in ordered)
+            warn_series(pid, series_uid, [(h["path"], h["error"]) for h in series_headers if "error" in h],
+                        frame_count, series_val["numberOfImages"])
+
+            series_val["imageFilePaths"] = [h["path"] for h in ordered]
+            series_val["numberOfImages"] = frame_count
+
+
+# ------------------------------------------------------------------------
+# 2c) (--index) INCREMENTAL REBUILD: ONLY TOUCH WHAT CHANGED SINCE LAST RUN
+# ------------------------------------------------------------------------
+def list_dcm_stats(folder):
+    stats = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith(".dcm"):
+                st = entry.stat()
+                stats[entry.path] = (st.st_size, st.st_mtime_ns)
+    return stats
+
+
+def update_index(index, csv_file, base_dir, pool=None):
+    """
+    Sync the on-disk index with the CSV and the series folders.
+
+    The CSV is only re-parsed when its size/mtime, ``base_dir`` or the
+    scan mode changed.  Every series folder is listed and its files'
+    size/mtime compared with the index (a file rewritten in place does not
+    move the folder mtime, so that is only a hint); only files that differ
+    get their header read again (on ``pool``; no pool means headers are not
+    scanned).  Scanned series get the same warnings as a plain run.
+    """
+    scan_headers = pool is not None
+    if index.source_unchanged(csv_file, base_dir, scan_headers):
+        print("CSV unchanged since last run, reusing indexed series.\n")
+    else:
+        with TRACE.span("csv parse"):
+            removed = index.store_series(
+                dict(row, folder=series_folder(base_dir, row["fileLocation"]))
+                for row in read_csv_rows(csv_file)
+            )
+        index.record_source(csv_file, base_dir, scan_headers)
+        print(f"Indexed CSV series, {removed} series no longer listed were dropped.\n")
+
+    changed = []
+    unchanged = 0
+    for series_uid, folder, folder_mtime_ns, scanned in index.series_folders():
+        try:
+            current_mtime_ns = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            index.mark_missing(series_uid)
+            continue
+        with TRACE.span("list series folder"):
+            stats = list_dcm_stats(folder)
+        TRACE.count("files found", len(stats))
+        known = index.file_stats(series_uid)
+        if (stats == known and current_mtime_ns == folder_mtime_ns
+                and scanned == int(scan_headers)):
+            unchanged += 1
+            continue
+
+        # headers were never read for this series: treat every file as new
+        if scan_headers and not scanned:
+            known = {}
+        stale = [p for p, st in stats.items() if known.get(p) != st]
+        changed.append((series_uid, current_mtime_ns, stats, stale))
+
+    headers = {}
+    if scan_headers:
+        headers = read_headers([p for c in changed for p in c[3]], pool)
+    with TRACE.span("update index"):
+        for series_uid, current_mtime_ns, stats, stale in changed:
+            index.update_series_files(
+                series_uid, current_mtime_ns, stats,
+                {p: headers[p] for p in stale if p in headers}, scan_headers,
+            )
+    if scan_headers:
+        for problem in index.scan_problems():
+            warn_series(*problem)
+
+    print(f"Index updated: {unchanged} series unchanged, {len(changed)} series refreshed, "
+          f"{len(headers)} headers read.")
+
+
+# ------------------------------------------------------------------------
+# 3) CONVERT A NESTED PATIENT => { patientID, studies: [ { ..., series: [...] } ] }
+# ------------------------------------------------------------------------
+def to_final_patient(pval):
+    p_obj = {
+        "patientID": pval["patientID"],
+        "studies": []
+    }
+    for st_uid, st_data in pval["studies"].items():
+        s_obj = {
+            "studyUID": st_data["studyUID"],
+            "studyDescription": st_data["studyDescription"],
+            "studyDate": st_data["studyDate"],
+            "series": []
+        }
+        for sr_uid, sr_val in st_data["series"].items():
+            s_obj["series"].append({
+                "seriesUID": sr_val["seriesUID"],
+                "seriesDescription": sr_val["seriesDescription"],
+                "numberOfImages": sr_val["numberOfImages"],
+                "imageFilePaths": sr_val["imageFilePaths"]
+            })
+        p_obj["studies"].append(s_obj)
+    return p_obj
+
+
+def stream_patients(csv_file, base_dir, pool=None):
+    """
+    CSV rows in, finished patients out.  With a pool, patients are held
+    back only until SCAN_BATCH_FILES files are queued, so the header scan
+    keeps every worker busy without buffering the whole archive.
+    """
+    batch, batch_files = [], 0
+    for patient in iter_csv_patients(read_csv_rows(csv_file)):
+        enumerate_series_files([patient], base_dir)
+        if pool is None:
+            yield to_final_patient(patient)
+            continue
+
+        batch.append(patient)
+        batch_files += sum(len(sv["imageFilePaths"]) for _, _, _, sv in iter_series([patient]))
+        if batch_files >= SCAN_BATCH_FILES:
+            scan_series_headers(batch, pool)
+            yield from (to_final_patient(p) for p in batch)
+            batch, batch_files = [], 0
+
+    if batch:
+        scan_series_headers(batch, pool)
+        yield from (to_final_patient(p) for p in batch)
+
+
+# ------------------------------------------------------------------------
+# 4) WRITE THE OUTPUT JSON, PATIENT BY PATIENT
+# ------------------------------------------------------------------------
+def main():
+    from manifest_shards import write_sharded_manifest
+    from manifest_writer import with_urls, write_manifest
+
+    parser = argparse.ArgumentParser(description="Convert an NBIA metadata.csv into the viewer's nested JSON.")
+    parser.add_argument("--csv", default=CSV_FILE, help="NBIA metadata.csv")
+    parser.add_argument("--base-dir", default=BASE_DIR, help="folder the CSV 'File Location' is relative to")
+    parser.add_argument("--output", default=OUTPUT_JSON, help="JSON file to write")
+    parser.add_argument("--shard-dir", default=None,
+                        help="write a root index plus content-hashed per-series shards here instead of --output")
+    parser.add_argument("--url-prefix", default=None,
+                        help="emit paths as <prefix>/<path relative to --base-dir> instead of absolute paths")
+    parser.add_argument("--scan-headers", action="store_true",
+                        help="read DICOM headers (no pixel data) to order frames and check frame counts")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used by --scan-headers (default: CPU count)")
+    parser.add_argument("--index", default=None,
+                        help="SQLite index file; rebuilds only touch series added, removed or changed since the last run")
+    parser.add_argument("--compact", action="store_true",
+                        help="production output: no indentation or whitespace")
+    parser.add_argument("--quiet", action="store_true",
+                        help="no per-series progress lines (warnings and the summary are still printed)")
+    parser.add_argument("--trace", default=None,
+                        help="write the phase timings as a Chrome trace (chrome://tracing, Perfetto) to this file")
+    args = parser.parse_args()
+
+    global VERBOSE
+    VERBOSE = not args.quiet
+
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.scan_headers else None
+    index = None
+    try:
+        if args.index:
+            from manifest_index import ManifestIndex
+
+            index = ManifestIndex(args.index)
+            update_index(index, args.csv, args.base_dir, pool)
+            patients = index.iter_patients()
+        else:
+            patients = stream_patients(args.csv, args.base_dir, pool)
+        if args.url_prefix is not None:
+            patients = with_urls(patients, args.base_dir, args.url_prefix)
+        # the builders are generators: the phases above run nested inside this span
+        with TRACE.span("write json"):
+            if args.shard_dir:
+                count = write_sharded_manifest(patients, args.shard_dir)
+            else:
+                count = write_manifest(patients, args.output, compact=args.compact)
+    finally:
+        if index is not None:
+            index.close()
+        if pool is not None:
+            pool.shutdown()
+
+    print(f"\nDONE! Wrote {count} patients to JSON =>", args.shard_dir or args.output)
+    TRACE.print_summary()
+    if args.trace:
+        TRACE.write_chrome_trace(args.trace)
+        print(f"Trace written to {args.trace}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Per-series metadata files for the viewer's metadata panel.
+
+loadDicomImage in newViewer.tsx pulls ~60 tags out of every frame it
+downloads, although most of them are identical across a series.  This
+stage reads the same tags once at ingest (headers only, on a process
+pool) and writes one compact file per series:
+
+    {"seriesUID": ..., "instances": 98,
+     "shared":      {"modality": "MR", "rows": "256", ...},
+     "perInstance": {"instanceNumber": ["1", "2", ...], "sliceLocation": [...], ...}}
+
+Keys and value formats are the ones of the viewer's metadata object, so the
+panel can use them unchanged.  Files are named by a hash of their content,
+and each series of the manifest gets a "metadata" URL.
+
+    python series_metadata.py hammurabi-ui/src/data/dicomData_updated.json \
+        --public-dir hammurabi-ui/public --out-dir hammurabi-ui/public/metadata \
+        --url-prefix /metadata
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pydicom
+from pydicom.tag import Tag
+
+from dicom_headers import read_header
+from series_volume import iter_manifest_series, load_manifest, local_path, save_manifest, url_for
+
+CHUNKSIZE = 64
+HASH_LENGTH = 16
+
+# (viewer key, tag, format) in the order of loadDicomImage.  "text" is the
+# raw string as dicomParser returns it, "split" a list of strings and
+# "numbers" a list of floats.  Binary and sequence tags are left out.
+METADATA_TAGS = [
+    ("specificCharacterSet", "SpecificCharacterSet", "text"),
+    ("imageType", "ImageType", "split"),
+    ("sopClassUID", "SOPClassUID", "text"),
+    ("sopInstanceUID", "SOPInstanceUID", "text"),
+    ("studyDate", "StudyDate", "text"),
+    ("seriesDate", "SeriesDate", "text"),
+    ("acquisitionDate", "AcquisitionDate", "text"),
+    ("contentDate", "ContentDate", "text"),
+    ("studyTime", "StudyTime", "text"),
+    ("seriesTime", "SeriesTime", "text"),
+    ("acquisitionTime", "AcquisitionTime", "text"),
+    ("contentTime", "ContentTime", "text"),
+    ("accessionNumber", "AccessionNumber", "text"),
+    ("modality", "Modality", "text"),
+    ("manufacturer", "Manufacturer", "text"),
+    ("referringPhysicianName", "ReferringPhysicianName", "text"),
+    ("stationName", "StationName", "text"),
+    ("studyDescription", "StudyDescription", "text"),
+    ("seriesDescription", "SeriesDescription", "text"),
+    ("manufacturerModelName", "ManufacturerModelName", "text"),
+    ("patientName", "PatientName", "text"),
+    ("patientId", "PatientID", "text"),
+    ("patientBirthDate", "PatientBirthDate", "text"),
+    ("patientSex", "PatientSex", "text"),
+    ("privateCreator", 0x00110010, "text"),
+    ("normalizationCoefficient", 0x00111002, "text"),
+    ("receivingGain", 0x00111003, "text"),
+    ("meanImageNoise", 0x00111004, "text"),
+    ("privateTagData", 0x00111008, "text"),
+    ("bodyPartExamined", "BodyPartExamined", "text"),
+    ("scanningSequence", "ScanningSequence", "text"),
+    ("sequenceVariant", "SequenceVariant", "text"),
+    ("scanOptions", "ScanOptions", "text"),
+    ("mRAcquisitionType", "MRAcquisitionType", "text"),
+    ("sequenceName", "SequenceName", "text"),
+    ("sliceThickness", "SliceThickness", "text"),
+    ("repetitionTime", "RepetitionTime", "text"),
+    ("echoTime", "EchoTime", "text"),
+    ("numberOfAverages", "NumberOfAverages", "text"),
+    ("imagingFrequency", "ImagingFrequency", "text"),
+    ("imagedNucleus", "ImagedNucleus", "text"),
+    ("echoNumbers", "EchoNumbers", "text"),
+    ("magneticFieldStrength", "MagneticFieldStrength", "text"),
+    ("spacingBetweenSlices", "SpacingBetweenSlices", "text"),
+    ("echoTrainLength", "EchoTrainLength", "text"),
+    ("pixelBandwidth", "PixelBandwidth", "text"),
+    ("deviceSerialNumber", "DeviceSerialNumber", "text"),
+    ("softwareVersions", "SoftwareVersions", "text"),
+    ("protocolName", "ProtocolName", "text"),
+    ("receiveCoilName", "ReceiveCoilName", "text"),
+    ("acquisitionMatrix", "AcquisitionMatrix", "text"),
+    ("inPlanePhaseEncodingDirection", "InPlanePhaseEncodingDirection", "text"),
+    ("flipAngle", "FlipAngle", "text"),
+    ("patientPosition", "PatientPosition", "text"),
+    ("studyInstanceUID", "StudyInstanceUID", "text"),
+    ("seriesInstanceUID", "SeriesInstanceUID", "text"),
+    ("studyID", "StudyID", "text"),
+    ("seriesNumber", "SeriesNumber", "text"),
+    ("instanceNumber", "InstanceNumber", "text"),
+    ("frameOfReferenceUID", "FrameOfReferenceUID", "text"),
+    ("imagesInAcquisition", "ImagesInAcquisition", "text"),
+    ("positionReferenceIndicator", "PositionReferenceIndicator", "text"),
+    ("sliceLocation", "SliceLocation", "text"),
+    ("imagePositionPatient", "ImagePositionPatient", "numbers"),
+    ("imageOrientationPatient", "ImageOrientationPatient", "numbers"),
+    ("samplesPerPixel", "SamplesPerPixel", "text"),
+    ("photometricInterpretation", "PhotometricInterpretation", "text"),
+    ("rows", "Rows", "text"),
+    ("columns", "Columns", "text"),
+    ("pixelSpacing", "PixelSpacing", "numbers"),
+    ("bitsAllocated", "BitsAllocated", "text"),
+    ("bitsStored", "BitsStored", "text"),
+    ("highBit", "HighBit", "text"),
+    ("pixelRepresentation", "PixelRepresentation", "text"),
+    ("windowCenter", "WindowCenter", "text"),
+    ("windowWidth", "WindowWidth", "text"),
+    ("lossyImageCompression", "LossyImageCompression", "text"),
+    ("performedProcedureStepStartDate", "PerformedProcedureStepStartDate", "text"),
+    ("performedProcedureStepStartTime", "PerformedProcedureStepStartTime", "text"),
+    ("performedProcedureStepID", "PerformedProcedureStepID", "text"),
+]
+
+_TAGS = [Tag(tag) for _, tag, _ in METADATA_TAGS]
+
+
+def _text(value):
+    if isinstance(value, (list, pydicom.multival.MultiValue)):
+        return "\\".join(str(v) for v in value)
+    return str(value).strip()
+
+
+def format_value(value, kind):
+    if value is None or value == "":
+        return None
+    if kind == "split":
+        return _text(value).split("\\")
+    if kind == "numbers":
+        try:
+            return [float(v) for v in _text(value).split("\\")]
+        except ValueError:
+            return None
+    return _text(value)
+
+
+def read_metadata(path):
+    """Viewer metadata of one file: {key: value} for the tags present, or {"error"}."""
+    try:
+        ds = read_header(path, _TAGS)
+    except Exception as exc:
+        return {"error": f"{path}: {exc}"}
+    record = {}
+    for (key, _, kind), tag in zip(METADATA_TAGS, _TAGS):
+        elem = ds.get(tag)
+        if elem is None or elem.VR in ("SQ", "OB", "OW", "UN"):
+            continue
+        value = format_value(elem.value, kind)
+        if value is not None:
+            record[key] = value
+    # the viewer falls back to ProtocolName when there is no StudyDescription
+    if "studyDescription" not in record and "protocolName" in record:
+        record["studyDescription"] = record["protocolName"]
+    return record
+
+
+def split_series(records):
+    """
+    Split per-file records into the tags every instance shares and the
+    columns of the tags that vary (null where an instance lacks the tag).
+    """
+    keys = [key for key, _, _ in METADATA_TAGS if any(key in r for r in records)]
+    shared, per_instance = {}, {}
+    for key in keys:
+        column = [r.get(key) for r in records]
+        if all(v == column[0] for v in column):
+            shared[key] = column[0]
+        else:
+            per_instance[key] = column
+    return shared, per_instance
+
+
+def write_series_metadata(series_uid, records, out_dir):
+    shared, per_instance = split_series(records)
+    doc = {"seriesUID": series_uid, "instances": len(records), "shared": shared, "perInstance": per_instance}
+    data = json.dumps(doc, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    name = hashlib.sha256(data).hexdigest()[:HASH_LENGTH] + ".json"
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):  # same content => same name, nothing to do
+        with open(path, "wb") as out:
+            out.write(data)
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write one shared + per-instance metadata file per series.")
+    parser.add_argument("manifest", help="manifest JSON (list of patients with imageFilePaths)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving the content-hashed metadata files")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /metadata)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--workers", type=int, default=None, help="header reader processes (default: CPU count)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    patients = load_manifest(args.manifest)
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series in iter_manifest_series(patients):
+            paths = [local_path(p, args.public_dir) for p in series.get("imageFilePaths") or []]
+            if not paths:
+                continue
+            records = []
+            chunksize = max(1, min(CHUNKSIZE, len(paths) // (4 * (args.workers or os.cpu_count() or 1))))
+            for record in pool.map(read_metadata, paths, chunksize=chunksize):
+                if "error" in record:
+                    print(f"WARNING: {record['error']}")
+                    record = {}
+                records.append(record)
+            name = write_series_metadata(series["seriesUID"], records, args.out_dir)
+            series["metadata"] = url_for(args.out_dir, name, args.url_prefix)
+            written += 1
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"DONE! Metadata for {written} series => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Rotating maximum intensity projections (MIP), published as a derived series.
+
+The ForMIP folder holds a 98-slice 3D TOF acquisition made for MIP.  This
+stage reads a packed series volume (series_volume.py) through its memmap,
+rotates the viewing direction around the slice normal (the head-feet axis
+of an axial acquisition) and keeps the brightest sample along every ray.
+Slices are processed in chunks, so the whole volume is never loaded; the
+sample indices of each angle are computed once and reused for every chunk.
+
+The projections are written as single-frame DICOM files, one per angle,
+and added to the manifest right after the source series, so the viewer's
+cine loop plays them like any other series.
+
+    python series_mip.py hammurabi-ui/src/data/dicomCatalog.json \
+        --series 1.3.76.2.1.1.4.1.3.9044.778600979 --public-dir hammurabi-ui/public \
+        --out-dir hammurabi-ui/public/derived --url-prefix /derived --step 6 --arc 180
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+
+from derived_series import add_derived_series, derived_uid, write_derived_series
+from dicom_headers import slice_location
+from series_volume import (chunk_values, header_path_for, iter_manifest_series, load_manifest, local_path,
+                           open_volume, per_frame_rescale, save_manifest, url_for)
+
+# Slices read from the memmap per step.
+CHUNK_SLICES = 16
+
+
+def slice_spacing(header):
+    """(locations along the normal, median slice spacing) of a packed series."""
+    locations = [slice_location(p, header["orientation"]) for p in header["positions"]]
+    if None in locations or len(locations) < 2:
+        thickness = header.get("sliceThickness") or 1.0
+        return [i * thickness for i in range(header["frames"])], thickness
+    diffs = np.abs(np.diff(np.sort(locations)))
+    return locations, float(np.median(diffs)) or (header.get("sliceThickness") or 1.0)
+
+
+def ray_indices(rows, columns, row_spacing, col_spacing, angle, size, spacing):
+    """
+    Flat pixel indices (size, samples) of the rays through one slice for a
+    viewing direction ``angle`` degrees from the column axis; samples
+    falling outside the slice are -1.
+    """
+    theta = math.radians(angle)
+    u_axis = np.array([math.cos(theta), math.sin(theta)])
+    t_axis = np.array([-math.sin(theta), math.cos(theta)])
+    half = (size - 1) / 2.0
+    offsets = (np.arange(size) - half) * spacing
+    u, t = np.meshgrid(offsets, offsets, indexing="ij")
+    x = u * u_axis[0] + t * t_axis[0]
+    y = u * u_axis[1] + t * t_axis[1]
+    col = np.rint(x / col_spacing + (columns - 1) / 2.0).astype(np.int64)
+    row = np.rint(y / row_spacing + (rows - 1) / 2.0).astype(np.int64)
+    inside = (col >= 0) & (col < columns) & (row >= 0) & (row < rows)
+    return np.where(inside, row * columns + col, -1)
+
+
+def rotating_mip(header, volume, angles, size=None):
+    """
+    MIP of ``volume`` for every angle: returns (frames, pixel spacing).
+
+    Each frame has one row per output height step (head at the top) and
+    ``size`` columns; rows are resampled from the slice positions so the
+    pixels are square.  When the frames have different rescales the maximum
+    is taken over modality values and the frames are float.
+    """
+    frames, rows, columns = volume.shape[:3]
+    row_spacing, col_spacing = header.get("pixelSpacing") or (1.0, 1.0)
+    diagonal = math.hypot(rows * row_spacing, columns * col_spacing)
+    spacing = min(row_spacing, col_spacing)
+    if size is None:
+        size = int(math.ceil(diagonal / spacing))
+    spacing = diagonal / size
+    indices = [ray_indices(rows, columns, row_spacing, col_spacing, a, size, spacing) for a in angles]
+    outside = [idx < 0 for idx in indices]
+    indices = [np.where(idx < 0, 0, idx) for idx in indices]
+
+    rescale = per_frame_rescale(header)
+    dtype = np.dtype(np.float32) if rescale else volume.dtype
+    floor = dtype.type(np.iinfo(dtype).min if dtype.kind in "iu" else -np.inf)
+    lines = np.empty((len(angles), frames, size), dtype=dtype)
+    for start in range(0, frames, CHUNK_SLICES):
+        chunk = np.asarray(volume[start:start + CHUNK_SLICES]).reshape(-1, rows * columns)
+        if rescale:
+            slope, intercept = chunk_values(header, start, start + len(chunk), ndim=2)[:2]
+            chunk = chunk * slope + intercept
+        for a, (idx, out) in enumerate(zip(indices, outside)):
+            samples = chunk[:, idx]                      # (slices, size, samples along the ray)
+            samples[:, out] = floor
+            lines[a, start:start + len(chunk)] = samples.max(axis=2)
+
+    # stack the per-slice lines head first, resampled to square pixels
+    locations, dz = slice_spacing(header)
+    order = np.argsort(locations)[::-1]
+    height = max(1, int(round(frames * dz / spacing)))
+    picks = order[np.clip(np.rint(np.arange(height) * spacing / dz).astype(int), 0, frames - 1)]
+    return lines[:, picks, :], (spacing, spacing)
+
+
+def parse_angles(args):
+    if args.angles:
+        return args.angles
+    count = max(1, int(round(args.arc / args.step)))
+    return [i * args.step for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish rotating MIP projections of a series as a derived series.")
+    parser.add_argument("manifest", help="manifest JSON whose series carry a volumeHeader (series_volume.py)")
+    parser.add_argument("--series", action="append", required=True, help="SeriesInstanceUID to project (repeatable)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving <derived seriesUID>/<n>.dcm")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /derived)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--step", type=float, default=10.0, help="degrees between projections (default 10)")
+    parser.add_argument("--arc", type=float, default=360.0, help="total rotation in degrees (default 360)")
+    parser.add_argument("--angles", type=float, nargs="+", default=None, help="explicit angles, overrides --step/--arc")
+    parser.add_argument("--size", type=int, default=None,
+                        help="projection width in pixels (default: volume diagonal at in-plane resolution)")
+    args = parser.parse_args()
+
+    angles = parse_angles(args)
+    patients = load_manifest(args.manifest)
+    by_uid = {s["seriesUID"]: s for s in iter_manifest_series(patients)}
+    for uid in args.series:
+        series = by_uid.get(uid)
+        header_path = header_path_for(series, args.public_dir) if series else None
+        if header_path is None:
+            print(f"WARNING: series {uid} is not in the manifest or has no packed volume, skipped")
+            continue
+
+        header, volume = open_volume(header_path)
+        if volume.ndim != 3:
+            print(f"WARNING: series {uid} is not greyscale, skipped")
+            continue
+        frames, pixel_spacing = rotating_mip(header, volume, angles, args.size)
+
+        mip_uid = derived_uid(uid, "MIP", angles, args.size)
+        description = f"MIP {series.get('seriesDescription') or ''}".strip()
+        paths = write_derived_series(
+            local_path(series["imageFilePaths"][0], args.public_dir), frames,
+            os.path.join(args.out_dir, mip_uid), mip_uid, description, ["MIP"], pixel_spacing,
+        )
+        add_derived_series(patients, uid, {
+            "seriesUID": mip_uid,
+            "seriesDescription": description,
+            "numberOfImages": len(paths),
+            "imageFilePaths": [url_for(args.out_dir, f"{mip_uid}/{os.path.basename(p)}", args.url_prefix)
+                               for p in paths],
+            "derivedFrom": uid,
+            "derivation": {"type": "MIP", "angles": angles},
+        })
+        print(f" - {uid}: {len(paths)} projections {frames.shape[2]}x{frames.shape[1]} => {mip_uid}")
+
+    save_manifest(patients, args.output or args.manifest)
+    print("\nDONE!")
+
+
+if __name__ == "__main__":
+    main()
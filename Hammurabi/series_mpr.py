@@ -0,0 +1,206 @@
+"""
+Offline multiplanar reformats (MPR) published as derived series.
+
+The viewer can only step through the acquired plane.  This stage places a
+packed series (series_volume.py) in patient space from its
+ImagePositionPatient, ImageOrientationPatient and PixelSpacing, and
+resamples it on isotropic axial, coronal and sagittal grids with trilinear
+interpolation.  Output slices are computed one at a time by gathering only
+the voxels they need from the memmapped volume, so the acquisition is never
+loaded into RAM as a whole.
+
+Every plane is written as single-frame DICOM files with proper geometry
+and added to the manifest after the source series.
+
+    python series_mpr.py hammurabi-ui/src/data/dicomCatalog.json \
+        --series 1.3.76.2.1.1.4.1.3.9044.778600540 --public-dir hammurabi-ui/public \
+        --out-dir hammurabi-ui/public/derived --url-prefix /derived
+"""
+import argparse
+import os
+
+import numpy as np
+
+from derived_series import add_derived_series, derived_uid, write_derived_series
+from dicom_headers import slice_location
+from series_volume import (chunk_values, header_path_for, iter_manifest_series, load_manifest, local_path,
+                           open_volume, per_frame_rescale, save_manifest, url_for)
+
+# Row and column direction (LPS) of every output plane, as in ImageOrientationPatient.
+PLANES = {
+    "axial": ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0)),
+    "coronal": ((1.0, 0.0, 0.0), (0.0, 0.0, -1.0)),
+    "sagittal": ((0.0, 1.0, 0.0), (0.0, 0.0, -1.0)),
+}
+
+
+class VolumeGeometry:
+    """Maps patient coordinates (mm, LPS) to fractional voxel indices of a packed series."""
+
+    def __init__(self, header):
+        if not header.get("orientation") or None in header["positions"]:
+            raise ValueError("series has no ImagePositionPatient / ImageOrientationPatient")
+        ori = np.array(header["orientation"], dtype=np.float64)
+        self.row_dir, self.col_dir = ori[:3], ori[3:]
+        self.normal = np.cross(self.row_dir, self.col_dir)
+        self.row_spacing, self.col_spacing = header.get("pixelSpacing") or (1.0, 1.0)
+        self.shape = (header["frames"], header["rows"], header["columns"])
+
+        positions = np.array(header["positions"], dtype=np.float64)
+        locations = np.array([slice_location(p, header["orientation"]) for p in header["positions"]])
+        self.order = np.argsort(locations)        # frame index of the k-th slice along the normal
+        self.locations = locations[self.order]
+        if len(self.locations) > 1 and np.any(np.diff(self.locations) == 0):
+            raise ValueError("several frames share the same slice position")
+        self.origins = positions[self.order]
+
+    def corners(self):
+        rows, columns = self.shape[1] - 1, self.shape[2] - 1
+        return np.array([
+            origin + i * self.row_spacing * self.col_dir + j * self.col_spacing * self.row_dir
+            for origin in (self.origins[0], self.origins[-1])
+            for i in (0, rows) for j in (0, columns)
+        ])
+
+    def voxel_coords(self, points):
+        """(..., 3) patient points -> slice (fractional, along the normal), row, column."""
+        rel = points - self.origins[0]
+        column = rel @ self.row_dir / self.col_spacing
+        row = rel @ self.col_dir / self.row_spacing
+        location = points @ self.normal
+        if len(self.locations) > 1:
+            k = np.interp(location, self.locations, np.arange(len(self.locations)), left=-1, right=-1)
+        else:
+            k = np.where(np.abs(location - self.locations[0]) < 1e-3, 0.0, -1.0)
+        return k, row, column
+
+
+def sample_trilinear(volume, geometry, k, row, column, fill=0, rescale=None):
+    """
+    Trilinear samples of the memmapped ``volume`` at fractional (k, row, column).
+
+    ``rescale`` is (slopes, intercepts) per frame: voxels are then turned
+    into modality values before they are interpolated.
+    """
+    frames, rows, columns = geometry.shape
+    inside = (k >= 0) & (k <= frames - 1) & (row >= 0) & (row <= rows - 1) & (column >= 0) & (column <= columns - 1)
+    k, row, column = (np.where(inside, a, 0.0) for a in (k, row, column))
+    k0, r0, c0 = (np.floor(a).astype(np.int64) for a in (k, row, column))
+    k1, r1, c1 = np.minimum(k0 + 1, frames - 1), np.minimum(r0 + 1, rows - 1), np.minimum(c0 + 1, columns - 1)
+    fk, fr, fc = k - k0, row - r0, column - c0
+    f0, f1 = geometry.order[k0], geometry.order[k1]   # slice rank -> frame in the volume
+
+    out = np.zeros(k.shape, dtype=np.float64)
+    for f, wk in ((f0, 1 - fk), (f1, fk)):
+        for r, wr in ((r0, 1 - fr), (r1, fr)):
+            for c, wc in ((c0, 1 - fc), (c1, fc)):
+                voxels = volume[f, r, c]
+                if rescale is not None:
+                    voxels = voxels * rescale[0][f] + rescale[1][f]
+                out += voxels * (wk * wr * wc)
+    return np.where(inside, out, fill)
+
+
+def reformat(header, volume, plane, spacing=None):
+    """
+    Resample ``volume`` on one plane: returns (frames, positions, orientation, spacing).
+
+    ``positions`` are the ImagePositionPatient of every output slice.  When
+    the frames have different rescales the modality values are interpolated
+    and the frames are float (NaN outside the volume).
+    """
+    geometry = VolumeGeometry(header)
+    if spacing is None:
+        steps = np.diff(geometry.locations)
+        spacing = min(geometry.row_spacing, geometry.col_spacing, *(steps if len(steps) else []))
+    row_dir, col_dir = (np.array(v) for v in PLANES[plane])
+    normal = np.cross(row_dir, col_dir)
+
+    corners = geometry.corners()
+    lo = {name: (corners @ axis).min() for name, axis in (("r", row_dir), ("c", col_dir), ("n", normal))}
+    hi = {name: (corners @ axis).max() for name, axis in (("r", row_dir), ("c", col_dir), ("n", normal))}
+    width = int(np.floor((hi["r"] - lo["r"]) / spacing)) + 1
+    height = int(np.floor((hi["c"] - lo["c"]) / spacing)) + 1
+    count = int(np.floor((hi["n"] - lo["n"]) / spacing)) + 1
+
+    origin = lo["r"] * row_dir + lo["c"] * col_dir + lo["n"] * normal
+    grid = (np.arange(height)[:, None, None] * spacing * col_dir
+            + np.arange(width)[None, :, None] * spacing * row_dir)
+
+    rescale = None
+    dtype = volume.dtype
+    if per_frame_rescale(header):
+        rescale = chunk_values(header, 0, header["frames"], ndim=1)[:2]
+        dtype = np.dtype(np.float32)
+    info = np.iinfo(dtype) if dtype.kind in "iu" else None
+    fill = max(0, info.min) if info else (np.nan if rescale is not None else 0)
+    frames = np.empty((count, height, width), dtype=dtype)
+    positions = []
+    for s in range(count):
+        top_left = origin + s * spacing * normal
+        k, row, column = geometry.voxel_coords(grid + top_left)
+        values = sample_trilinear(volume, geometry, k, row, column, fill, rescale)
+        if info:
+            values = np.clip(np.rint(values), info.min, info.max)
+        frames[s] = values
+        positions.append(top_left.tolist())
+    return frames, positions, list(row_dir) + list(col_dir), spacing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish axial / coronal / sagittal reformats of a series.")
+    parser.add_argument("manifest", help="manifest JSON whose series carry a volumeHeader (series_volume.py)")
+    parser.add_argument("--series", action="append", required=True, help="SeriesInstanceUID to reformat (repeatable)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving <derived seriesUID>/<n>.dcm")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /derived)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--planes", nargs="+", choices=sorted(PLANES), default=["axial", "coronal", "sagittal"])
+    parser.add_argument("--spacing", type=float, default=None,
+                        help="output voxel size in mm (default: finest of pixel spacing and slice spacing)")
+    args = parser.parse_args()
+
+    patients = load_manifest(args.manifest)
+    by_uid = {s["seriesUID"]: s for s in iter_manifest_series(patients)}
+    for uid in args.series:
+        series = by_uid.get(uid)
+        header_path = header_path_for(series, args.public_dir) if series else None
+        if header_path is None:
+            print(f"WARNING: series {uid} is not in the manifest or has no packed volume, skipped")
+            continue
+        header, volume = open_volume(header_path)
+        if volume.ndim != 3:
+            print(f"WARNING: series {uid} is not greyscale, skipped")
+            continue
+
+        template = local_path(series["imageFilePaths"][0], args.public_dir)
+        for plane in args.planes:
+            try:
+                frames, positions, orientation, spacing = reformat(header, volume, plane, args.spacing)
+            except ValueError as exc:
+                print(f"WARNING: series {uid} cannot be reformatted: {exc}")
+                break
+            mpr_uid = derived_uid(uid, "MPR", plane, spacing)
+            description = f"{series.get('seriesDescription') or ''} MPR {plane}".strip()
+            paths = write_derived_series(
+                template, frames, os.path.join(args.out_dir, mpr_uid), mpr_uid, description,
+                ["REFORMATTED", plane.upper()], (spacing, spacing),
+                positions=positions, orientation=orientation, slice_thickness=spacing,
+            )
+            add_derived_series(patients, uid, {
+                "seriesUID": mpr_uid,
+                "seriesDescription": description,
+                "numberOfImages": len(paths),
+                "imageFilePaths": [url_for(args.out_dir, f"{mpr_uid}/{os.path.basename(p)}", args.url_prefix)
+                                   for p in paths],
+                "derivedFrom": uid,
+                "derivation": {"type": "MPR", "plane": plane, "spacing": spacing},
+            })
+            print(f" - {uid}: {plane} {len(paths)} slices {frames.shape[2]}x{frames.shape[1]} => {mpr_uid}")
+
+    save_manifest(patients, args.output or args.manifest)
+    print("\nDONE!")
+
+
+if __name__ == "__main__":
+    main()
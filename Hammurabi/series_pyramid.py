@@ -0,0 +1,162 @@
+"""
+Multi-resolution frame pyramid for progressive first paint.
+
+The viewer shows nothing until a full-resolution .dcm has been downloaded
+and decoded.  This stage writes every frame of a packed series at several
+scales (by default 1/4, 1/2 and full), windowed to 8 bits like
+series_renditions.py, plus one sprite sheet of the coarsest level, so the
+viewer can paint the whole series from a single small image first and
+refine the frames the user is looking at:
+
+    <out-dir>/<seriesUID>/<divisor>/<frame>.png
+    <out-dir>/<seriesUID>/<coarsest divisor>/sprite.png
+
+Each series of the manifest gets a "pyramid" entry listing the levels from
+coarsest to full resolution.
+
+    python series_pyramid.py hammurabi-ui/src/data/dicomCatalog.json \
+        --public-dir hammurabi-ui/public --out-dir hammurabi-ui/public/pyramid \
+        --url-prefix /pyramid
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from manifest_shards import compress_paths
+from series_renditions import SPRITE_NAME, encode_image, iter_windowed, sprite_layout
+from series_volume import (header_path_for, iter_manifest_series, load_manifest, open_volume,
+                           save_manifest, url_for)
+
+DEFAULT_DIVISORS = [4, 2, 1]
+STATE_NAME = "pyramid.json"
+
+
+def downsample(frames, divisor):
+    """Block-mean ``frames`` (n, H, W[, 3]) uint8 by ``divisor``; edges are padded by repetition."""
+    if divisor == 1:
+        return frames
+    n, height, width = frames.shape[:3]
+    pad_h, pad_w = -height % divisor, -width % divisor
+    if pad_h or pad_w:
+        pad = [(0, 0), (0, pad_h), (0, pad_w)] + [(0, 0)] * (frames.ndim - 3)
+        frames = np.pad(frames, pad, mode="edge")
+    h, w = frames.shape[1] // divisor, frames.shape[2] // divisor
+    blocks = frames.reshape((n, h, divisor, w, divisor) + frames.shape[3:])
+    return np.rint(blocks.mean(axis=(2, 4), dtype=np.float32)).astype(np.uint8)
+
+
+def build_pyramid(job):
+    """
+    ``job`` is (header path, out_dir, format, divisors).  Writes every level
+    of one series and returns a state dict, or {"error"}.  Series whose
+    volume and options did not change are skipped.
+    """
+    header_path, out_dir, fmt, divisors = job
+    try:
+        header, volume = open_volume(header_path)
+        series_dir = os.path.join(out_dir, header["seriesUID"])
+        state_path = os.path.join(series_dir, STATE_NAME)
+        options = {"source": header["sourceSignature"], "format": fmt, "divisors": divisors}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            if previous.get("options") == options:
+                return previous
+
+        levels = []
+        for divisor in divisors:
+            os.makedirs(os.path.join(series_dir, str(divisor)), exist_ok=True)
+            levels.append({
+                "divisor": divisor,
+                "width": -(-header["columns"] // divisor),
+                "height": -(-header["rows"] // divisor),
+                "files": [],
+            })
+        coarsest = levels[0]
+        layout = sprite_layout(len(volume), coarsest["height"], coarsest["width"])
+        sheet = np.zeros((layout["rows"] * coarsest["height"], layout["columns"] * coarsest["width"])
+                         + volume.shape[3:], dtype=np.uint8)
+
+        for start, frames in iter_windowed(header, volume):
+            for level in levels:
+                scaled = downsample(frames, level["divisor"])
+                for i, frame in enumerate(scaled, start):
+                    name = f"{level['divisor']}/{i}.{fmt}"
+                    with open(os.path.join(series_dir, name), "wb") as out:
+                        out.write(encode_image(frame, fmt))
+                    level["files"].append(name)
+                    if level is coarsest:
+                        r, c = divmod(i, layout["columns"])
+                        sheet[r * level["height"]:(r + 1) * level["height"],
+                              c * level["width"]:(c + 1) * level["width"]] = frame
+        layout["file"] = f"{coarsest['divisor']}/{SPRITE_NAME}.{fmt}"
+        with open(os.path.join(series_dir, layout["file"]), "wb") as out:
+            out.write(encode_image(sheet, fmt))
+    except Exception as exc:
+        return {"error": str(exc)}
+
+    state = {"seriesUID": header["seriesUID"], "options": options, "levels": levels, "sprite": layout}
+    with open(state_path, "w", encoding="utf-8") as out:
+        json.dump(state, out)
+    return state
+
+
+def manifest_entry(state, out_dir, url_prefix, fmt):
+    uid = state["seriesUID"]
+    levels = []
+    for level in state["levels"]:
+        urls = [url_for(out_dir, f"{uid}/{name}", url_prefix).replace("\\", "/") for name in level["files"]]
+        levels.append({
+            "scale": 1.0 / level["divisor"],
+            "width": level["width"],
+            "height": level["height"],
+            **compress_paths(urls),
+        })
+    sprite = dict(state["sprite"])
+    sprite["url"] = url_for(out_dir, f"{uid}/{sprite.pop('file')}", url_prefix)
+    return {"format": fmt, "levels": levels, "sprite": sprite}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a 1/4, 1/2, full resolution pyramid of every packed series.")
+    parser.add_argument("manifest", help="manifest JSON whose series carry a volumeHeader (series_volume.py)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving <seriesUID>/<divisor>/<frame>.<format>")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /pyramid)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--divisors", type=int, nargs="+", default=DEFAULT_DIVISORS,
+                        help="downscale factors, one level each (default: 4 2 1)")
+    parser.add_argument("--format", choices=("png", "webp"), default="png", help="frame format (webp needs Pillow)")
+    parser.add_argument("--workers", type=int, default=None, help="series processed in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    divisors = sorted(set(args.divisors), reverse=True)
+    patients = load_manifest(args.manifest)
+    series_list, jobs = [], []
+    for series in iter_manifest_series(patients):
+        header_path = header_path_for(series, args.public_dir)
+        if header_path is None:
+            print(f"WARNING: series {series['seriesUID']} has no packed volume, run series_volume.py first")
+            continue
+        series_list.append(series)
+        jobs.append((header_path, args.out_dir, args.format, divisors))
+
+    built = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series, state in zip(series_list, pool.map(build_pyramid, jobs)):
+            if "error" in state:
+                print(f"WARNING: series {series['seriesUID']} has no pyramid: {state['error']}")
+                continue
+            series["pyramid"] = manifest_entry(state, args.out_dir, args.url_prefix, args.format)
+            built += 1
+            print(f" - {series['seriesUID']}: {len(state['levels'])} levels")
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"\nDONE! {built}/{len(series_list)} series => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
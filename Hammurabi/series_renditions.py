@@ -0,0 +1,237 @@
+"""
+Pre-windowed 8-bit renditions of every frame of the packed series.
+
+The viewer used to scale raw 16-bit samples by 1/65535 pixel by pixel,
+ignoring RescaleSlope/Intercept and WindowCenter/Width, which leaves most
+MR/CT frames nearly black.  This stage applies the modality rescale and the
+VOI window to whole chunks of frames with NumPy and writes compressed 8-bit
+frames the browser can draw directly:
+
+    <out-dir>/<seriesUID>/<frame>.png   (or .webp, needs Pillow)
+    <out-dir>/<seriesUID>/sprite.png    all frames tiled in one image (--sprite)
+
+Each series of the manifest gets a "renditions" entry (path template +
+frame numbers, as in the shards, and the sprite layout).  Run
+series_volume.py first: renditions are cut from the packed volumes.
+
+    python series_renditions.py hammurabi-ui/src/data/dicomCatalog.json \
+        --public-dir hammurabi-ui/public --out-dir hammurabi-ui/public/renditions \
+        --url-prefix /renditions --sprite
+"""
+import argparse
+import io
+import json
+import math
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from manifest_shards import compress_paths
+from series_volume import (chunk_values, header_path_for, iter_manifest_series, load_manifest,
+                           open_volume, save_manifest, url_for)
+
+# Frames converted to float per step; bounds memory on long series.
+CHUNK_FRAMES = 16
+STATE_NAME = "renditions.json"
+SPRITE_NAME = "sprite"
+
+
+# ------------------------------------------------------------------------
+# Windowing
+# ------------------------------------------------------------------------
+def apply_window(values, center, width, invert=False):
+    """
+    DICOM linear VOI window (PS3.3 C.11.2.1.2) of rescaled ``values`` to uint8.
+
+    ``values`` is a float array of any shape; ``center``/``width`` are
+    scalars or arrays broadcasting against it (one per frame).
+    """
+    center = np.asarray(center, dtype=np.float32) - 0.5
+    width = np.maximum(np.asarray(width, dtype=np.float32) - 1.0, 1.0)
+    out = ((values - center) / width + 0.5) * 255.0
+    np.clip(out, 0.0, 255.0, out=out)
+    if invert:
+        out = 255.0 - out
+    return np.rint(out).astype(np.uint8)
+
+
+def series_range(header, volume):
+    """Min / max of the rescaled values of a whole series, read chunk by chunk."""
+    lo, hi = np.inf, -np.inf
+    for start in range(0, len(volume), CHUNK_FRAMES):
+        stop = min(start + CHUNK_FRAMES, len(volume))
+        slope, intercept, _, _ = chunk_values(header, start, stop, volume.ndim)
+        chunk = volume[start:stop].astype(np.float32) * slope + intercept
+        lo, hi = min(lo, float(chunk.min())), max(hi, float(chunk.max()))
+    return lo, hi
+
+
+def iter_windowed(header, volume, window=None):
+    """
+    Yield (start, uint8 frames) chunk by chunk.
+
+    ``window`` (center, width) overrides the window stored in the files;
+    frames without one fall back to the full range of the series.
+    """
+    invert = header.get("photometricInterpretation") == "MONOCHROME1"
+    fallback = None
+    for start in range(0, len(volume), CHUNK_FRAMES):
+        stop = min(start + CHUNK_FRAMES, len(volume))
+        slope, intercept, center, width = chunk_values(header, start, stop, volume.ndim)
+        if window is not None:
+            center, width = np.float32(window[0]), np.float32(window[1])
+        elif np.isnan(center).any() or np.isnan(width).any() or (width <= 0).any():
+            if fallback is None:
+                lo, hi = series_range(header, volume)
+                fallback = ((lo + hi) / 2.0, max(hi - lo, 1.0))
+            center = np.where(np.isnan(center) | (width <= 0), fallback[0], center)
+            width = np.where(np.isnan(width) | (width <= 0), fallback[1], width)
+        values = volume[start:stop].astype(np.float32) * slope + intercept
+        yield start, apply_window(values, center, width, invert)
+
+
+# ------------------------------------------------------------------------
+# Encoding
+# ------------------------------------------------------------------------
+def _png_chunk(kind, data):
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def encode_png(pixels):
+    """8-bit greyscale (H, W) or RGB (H, W, 3) array -> PNG bytes, stdlib only."""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    color = 2 if pixels.ndim == 3 else 0
+    # filter type 0 (none) in front of every row
+    raw = np.zeros((height, pixels[0].size + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, -1)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color, 0, 0, 0))
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + _png_chunk(b"IEND", b""))
+
+
+def encode_image(pixels, fmt):
+    if fmt == "png":
+        return encode_png(pixels)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise SystemExit("--format webp needs Pillow (pip install pillow)")
+    buf = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(pixels)).save(buf, format="WEBP", quality=90, method=4)
+    return buf.getvalue()
+
+
+def sprite_layout(frames, rows, columns):
+    tiles = math.ceil(math.sqrt(frames))
+    return {"columns": tiles, "rows": math.ceil(frames / tiles), "tileWidth": columns, "tileHeight": rows}
+
+
+# ------------------------------------------------------------------------
+# One series (runs in the worker processes)
+# ------------------------------------------------------------------------
+def render_series(job):
+    """
+    ``job`` is (header path, out_dir, format, window, sprite).  Writes the
+    frames (and sprite) of one series and returns a small state dict, or
+    {"error"}.  Series whose volume and options did not change are skipped.
+    """
+    header_path, out_dir, fmt, window, sprite = job
+    try:
+        header, volume = open_volume(header_path)
+        series_dir = os.path.join(out_dir, header["seriesUID"])
+        state_path = os.path.join(series_dir, STATE_NAME)
+        options = {"source": header["sourceSignature"], "format": fmt, "window": window, "sprite": sprite}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            if previous.get("options") == options:
+                return previous
+
+        os.makedirs(series_dir, exist_ok=True)
+        layout = sprite_layout(len(volume), header["rows"], header["columns"]) if sprite else None
+        sheet = None
+        if layout:
+            sheet = np.zeros((layout["rows"] * header["rows"], layout["columns"] * header["columns"])
+                             + volume.shape[3:], dtype=np.uint8)
+
+        names = []
+        for start, frames in iter_windowed(header, volume, window):
+            for i, frame in enumerate(frames, start):
+                name = f"{i}.{fmt}"
+                with open(os.path.join(series_dir, name), "wb") as out:
+                    out.write(encode_image(frame, fmt))
+                names.append(name)
+                if sheet is not None:
+                    r, c = divmod(i, layout["columns"])
+                    sheet[r * header["rows"]:(r + 1) * header["rows"],
+                          c * header["columns"]:(c + 1) * header["columns"]] = frame
+        if sheet is not None:
+            layout["file"] = f"{SPRITE_NAME}.{fmt}"
+            with open(os.path.join(series_dir, layout["file"]), "wb") as out:
+                out.write(encode_image(sheet, fmt))
+    except Exception as exc:
+        return {"error": str(exc)}
+
+    state = {"seriesUID": header["seriesUID"], "options": options, "files": names, "sprite": layout}
+    with open(state_path, "w", encoding="utf-8") as out:
+        json.dump(state, out)
+    return state
+
+
+def manifest_entry(state, out_dir, url_prefix, fmt):
+    series_dir = state["seriesUID"]
+    urls = [url_for(out_dir, f"{series_dir}/{name}", url_prefix) for name in state["files"]]
+    entry = {"format": fmt, **compress_paths([u.replace("\\", "/") for u in urls])}
+    if state.get("sprite"):
+        sprite = dict(state["sprite"])
+        sprite["url"] = url_for(out_dir, f"{series_dir}/{sprite.pop('file')}", url_prefix)
+        entry["sprite"] = sprite
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write pre-windowed 8-bit frames for every packed series.")
+    parser.add_argument("manifest", help="manifest JSON whose series carry a volumeHeader (series_volume.py)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving <seriesUID>/<frame>.<format>")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /renditions)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--format", choices=("png", "webp"), default="png", help="frame format (webp needs Pillow)")
+    parser.add_argument("--window", type=float, nargs=2, metavar=("CENTER", "WIDTH"), default=None,
+                        help="override the window stored in the files")
+    parser.add_argument("--sprite", action="store_true", help="also tile all frames of a series into one image")
+    parser.add_argument("--workers", type=int, default=None, help="series rendered in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    patients = load_manifest(args.manifest)
+    series_list, jobs = [], []
+    for series in iter_manifest_series(patients):
+        header_path = header_path_for(series, args.public_dir)
+        if header_path is None:
+            print(f"WARNING: series {series['seriesUID']} has no packed volume, run series_volume.py first")
+            continue
+        series_list.append(series)
+        jobs.append((header_path, args.out_dir, args.format, args.window, args.sprite))
+
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series, state in zip(series_list, pool.map(render_series, jobs)):
+            if "error" in state:
+                print(f"WARNING: series {series['seriesUID']} not rendered: {state['error']}")
+                continue
+            series["renditions"] = manifest_entry(state, args.out_dir, args.url_prefix, args.format)
+            rendered += 1
+            print(f" - {series['seriesUID']}: {len(state['files'])} frames")
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"\nDONE! Rendered {rendered}/{len(series_list)} series => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Series thumbnails and keyframe strips for the worklist tables.
+
+NestedDicomTable and Sidebar list series as plain text; a preview would
+cost the browser one full .dcm download and decode per row.  This stage
+reads only a few frames of every series (the middle one for the thumbnail,
+``--keyframes`` evenly spaced ones for the strip), windows them to 8 bits
+and shrinks them to ``--size`` pixels.  Series are processed in parallel
+and the images are named by a hash of their content, so they can be
+cached forever and identical previews are stored once:
+
+    <out-dir>/<hash>.png
+
+Each series gets a "thumbnail" URL and, with --keyframes, a "keyframes"
+strip (URL, tile size and the frame numbers it shows).
+
+    python series_thumbnails.py hammurabi-ui/src/data/dicomData_updated.json \
+        --public-dir hammurabi-ui/public --out-dir hammurabi-ui/public/thumbs \
+        --url-prefix /thumbs --keyframes 5
+"""
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pydicom
+
+from series_renditions import apply_window, encode_png
+from series_volume import (as_float, first_float, iter_manifest_series, load_manifest, local_path,
+                           save_manifest, url_for)
+
+HASH_LENGTH = 16
+DEFAULT_SIZE = 128
+
+
+def fit(image, size):
+    """Shrink an (H, W) uint8 image to fit a ``size`` box: block mean, then nearest neighbour."""
+    height, width = image.shape
+    scale = max(height, width) / float(size)
+    if scale <= 1:
+        return image
+    divisor = int(scale)
+    if divisor > 1:
+        h, w = height // divisor, width // divisor
+        blocks = image[:h * divisor, :w * divisor].reshape(h, divisor, w, divisor)
+        image = np.rint(blocks.mean(axis=(1, 3), dtype=np.float32)).astype(np.uint8)
+    out_h, out_w = max(1, round(height / scale)), max(1, round(width / scale))
+    rows = (np.arange(out_h) * image.shape[0] / out_h).astype(int)
+    cols = (np.arange(out_w) * image.shape[1] / out_w).astype(int)
+    return image[rows][:, cols]
+
+
+def preview_frame(path):
+    """First frame of a file, rescaled and windowed to 8 bits (own window, else its range)."""
+    ds = pydicom.dcmread(path)
+    pixels = ds.pixel_array
+    if int(ds.get("NumberOfFrames") or 1) > 1:
+        pixels = pixels[0]
+    if pixels.ndim == 3:  # colour: keep the luminance only
+        pixels = pixels.mean(axis=2)
+    slope, intercept = as_float(ds.get("RescaleSlope"), 1.0), as_float(ds.get("RescaleIntercept"), 0.0)
+    values = pixels.astype(np.float32) * slope + intercept
+    center, width = first_float(ds.get("WindowCenter")), first_float(ds.get("WindowWidth"))
+    if center is None or not width or width <= 0:
+        lo, hi = float(values.min()), float(values.max())
+        center, width = (lo + hi) / 2.0, max(hi - lo, 1.0)
+    return apply_window(values, center, width, ds.get("PhotometricInterpretation") == "MONOCHROME1")
+
+
+def _store(image, out_dir):
+    data = encode_png(image)
+    name = hashlib.sha256(data).hexdigest()[:HASH_LENGTH] + ".png"
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):  # same content => same name, nothing to do
+        with open(path, "wb") as out:
+            out.write(data)
+    return name
+
+
+def keyframe_indices(count, keyframes):
+    if keyframes <= 1 or count <= 1:
+        return [count // 2]
+    return sorted({round(i * (count - 1) / (keyframes - 1)) for i in range(keyframes)})
+
+
+def make_previews(job):
+    """
+    ``job`` is (seriesUID, [source paths], out_dir, size, keyframes).
+    Returns {"thumbnail", "keyframes"} file names, or {"error"}.
+    """
+    series_uid, paths, out_dir, size, keyframes = job
+    try:
+        result = {"thumbnail": _store(fit(preview_frame(paths[len(paths) // 2]), size), out_dir)}
+        if keyframes:
+            frames = keyframe_indices(len(paths), keyframes)
+            tiles = [fit(preview_frame(paths[i]), size) for i in frames]
+            tile_h, tile_w = max(t.shape[0] for t in tiles), max(t.shape[1] for t in tiles)
+            strip = np.zeros((tile_h, tile_w * len(tiles)), dtype=np.uint8)
+            for n, tile in enumerate(tiles):
+                strip[:tile.shape[0], n * tile_w:n * tile_w + tile.shape[1]] = tile
+            result["keyframes"] = {
+                "file": _store(strip, out_dir),
+                "tileWidth": tile_w,
+                "tileHeight": tile_h,
+                "frames": frames,
+            }
+        return result
+    except Exception as exc:
+        return {"error": f"{series_uid}: {exc}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a thumbnail and keyframe strip per series.")
+    parser.add_argument("manifest", help="manifest JSON (list of patients with imageFilePaths)")
+    parser.add_argument("--out-dir", required=True, help="folder receiving the content-hashed images")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /thumbs)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="longest side in pixels (default 128)")
+    parser.add_argument("--keyframes", type=int, default=0, help="frames in the keyframe strip (default: no strip)")
+    parser.add_argument("--workers", type=int, default=None, help="series processed in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    patients = load_manifest(args.manifest)
+    series_list = [s for s in iter_manifest_series(patients) if s.get("imageFilePaths")]
+    jobs = [
+        (s["seriesUID"], [local_path(p, args.public_dir) for p in s["imageFilePaths"]],
+         args.out_dir, args.size, args.keyframes)
+        for s in series_list
+    ]
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series, result in zip(series_list, pool.map(make_previews, jobs)):
+            if "error" in result:
+                print(f"WARNING: no preview for series {result['error']}")
+                continue
+            series["thumbnail"] = url_for(args.out_dir, result["thumbnail"], args.url_prefix)
+            if "keyframes" in result:
+                strip = dict(result["keyframes"])
+                strip["url"] = url_for(args.out_dir, strip.pop("file"), args.url_prefix)
+                series["keyframes"] = strip
+            done += 1
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"DONE! Previews for {done}/{len(series_list)} series => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Pack each series' pixel data into one contiguous, memory-mappable volume.
+
+For every series of a manifest this writes
+
+    <out-dir>/<seriesUID>-<hash>.vol  raw little-endian frames, back to back
+    <out-dir>/<seriesUID>.vol.json    small header: dims, bits, rescale, window,
+                                      geometry, the byte offset of each frame
+                                      and the name of the .vol file
+
+and points the series at the header ("volumeHeader").  A repack writes a
+new .vol under a new name before the header is swapped in, so a reader
+always gets a header and the volume it describes.  The viewer can then
+fetch a whole series, or any frame with an HTTP range request, from one
+file instead of one request + one DICOM parse per frame.  The other
+pipeline stages (renditions, MIP, MPR, ...) read the packed volumes through
+open_volume(), which memory-maps the .vol file.
+
+    python series_volume.py hammurabi-ui/src/data/dicomData_updated.json \
+        --public-dir hammurabi-ui/public --out-dir hammurabi-ui/public/volumes \
+        --url-prefix /volumes
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pydicom
+
+from manifest_writer import write_manifest
+
+VOLUME_SUFFIX = ".vol"
+HEADER_SUFFIX = ".vol.json"
+
+
+# ------------------------------------------------------------------------
+# Manifest helpers shared by the pipeline stages
+# ------------------------------------------------------------------------
+def load_manifest(manifest_json):
+    with open(manifest_json, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(patients, manifest_json):
+    """Rewrite a manifest, keeping its indented layout."""
+    write_manifest(patients, manifest_json)
+
+
+def iter_manifest_series(patients):
+    for patient in patients:
+        for study in patient["studies"]:
+            for series in study["series"]:
+                yield series
+
+
+def local_path(path, public_dir=None):
+    """Map a viewer URL (/assets/...) back to the file under ``public_dir``."""
+    if public_dir and path.startswith("/") and not os.path.exists(path):
+        return os.path.join(public_dir, *path.lstrip("/").split("/"))
+    return path
+
+
+def url_for(out_dir, name, url_prefix=None):
+    """URL of a generated file: <url_prefix>/<name>, or its path without a prefix."""
+    if url_prefix is None:
+        return os.path.join(out_dir, name)
+    return url_prefix.rstrip("/") + "/" + name
+
+
+def _signature(paths):
+    """Cheap fingerprint of the source files (path, size, mtime)."""
+    h = hashlib.sha256()
+    for p in paths:
+        st = os.stat(p)
+        h.update(f"{p}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _read_header(header_path):
+    """A previous run's header, or None when it is missing or unreadable (e.g. cut short)."""
+    try:
+        with open(header_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_stale_volumes(out_dir, series_uid, keep):
+    """Drop the .vol files of earlier packs of a series (UIDs never contain "-")."""
+    pattern = re.compile(re.escape(series_uid) + r"(-[0-9a-f]+)?" + re.escape(VOLUME_SUFFIX))
+    for name in os.listdir(out_dir):
+        if name != keep and pattern.fullmatch(name):
+            os.remove(os.path.join(out_dir, name))
+
+
+def as_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def first_float(value):
+    """First value of a possibly multi-valued DS (WindowCenter can hold several)."""
+    if isinstance(value, pydicom.multival.MultiValue):
+        value = value[0] if len(value) else None
+    return as_float(value)
+
+
+# ------------------------------------------------------------------------
+# Packing (runs in the worker processes)
+# ------------------------------------------------------------------------
+def pack_series(job):
+    """
+    Pack one series.  ``job`` is (seriesUID, [source paths], out_dir).
+
+    Returns the header dict, or {"seriesUID", "error"} when the series cannot
+    be packed (unreadable file, frames of different size / type).  A volume
+    whose header records the same source signature is left alone; a header
+    that cannot be read counts as stale.
+
+    Both files are written under temporary names: the volume is moved to
+    its own name (seriesUID-signature), then the header replaces the old
+    one, so the header on disk is always complete and names a volume that
+    matches it.  Volumes of earlier packs are removed last.
+    """
+    series_uid, paths, out_dir = job
+    header_path = os.path.join(out_dir, series_uid + HEADER_SUFFIX)
+    volume_path = None
+
+    try:
+        signature = _signature(paths)
+        previous = _read_header(header_path)
+        if (previous and previous.get("sourceSignature") == signature and previous.get("volume")
+                and os.path.isfile(os.path.join(out_dir, previous["volume"]))):
+            return previous
+
+        volume_name = f"{series_uid}-{signature[:16]}{VOLUME_SUFFIX}"
+        volume_path = os.path.join(out_dir, volume_name)
+
+        frames_meta, volume, dtype, shape, n = [], None, None, None, 0
+        total = None
+        for path in paths:
+            ds = pydicom.dcmread(path)
+            pixels = ds.pixel_array
+            frames = int(ds.get("NumberOfFrames") or 1)
+            if frames == 1:
+                pixels = pixels[np.newaxis, ...]
+
+            if volume is None:
+                # the first file fixes the layout; the frame count comes from the manifest order
+                dtype = pixels.dtype.newbyteorder("<")
+                shape = pixels.shape[1:]
+                total = frames * len(paths)
+                first = ds
+                volume = np.memmap(volume_path + ".tmp", dtype=dtype, mode="w+", shape=(total,) + shape)
+            elif pixels.shape[1:] != shape or pixels.dtype.newbyteorder("<") != dtype:
+                raise ValueError(f"{path}: frame {pixels.shape[1:]} {pixels.dtype} differs from {shape} {dtype}")
+
+            if n + frames > total:
+                raise ValueError(f"{path}: more frames than the first file announced")
+            volume[n:n + frames] = pixels
+            for _ in range(frames):
+                frames_meta.append({
+                    "path": path,
+                    "instanceNumber": ds.get("InstanceNumber"),
+                    "position": [float(v) for v in ds.get("ImagePositionPatient") or []] or None,
+                    "rescaleSlope": as_float(ds.get("RescaleSlope"), 1.0),
+                    "rescaleIntercept": as_float(ds.get("RescaleIntercept"), 0.0),
+                    "windowCenter": first_float(ds.get("WindowCenter")),
+                    "windowWidth": first_float(ds.get("WindowWidth")),
+                })
+            n += frames
+
+        if volume is None:
+            return {"seriesUID": series_uid, "error": "no files"}
+        volume.flush()
+        del volume
+        if n != total:
+            # fewer frames than assumed: trim the file to what was written
+            with open(volume_path + ".tmp", "r+b") as f:
+                f.truncate(n * int(np.prod(shape)) * dtype.itemsize)
+
+        # header fields are read before the volume replaces the previous one
+        frame_length = int(np.prod(shape)) * dtype.itemsize
+        header = {
+            "seriesUID": series_uid,
+            "volume": volume_name,
+            "dtype": dtype.str,
+            "frames": n,
+            "rows": int(shape[0]),
+            "columns": int(shape[1]),
+            "samplesPerPixel": int(shape[2]) if len(shape) == 3 else 1,
+            "bitsAllocated": int(first.BitsAllocated),
+            "bitsStored": int(first.get("BitsStored", first.BitsAllocated)),
+            "pixelRepresentation": int(first.get("PixelRepresentation", 0)),
+            "photometricInterpretation": str(first.get("PhotometricInterpretation", "")),
+            "pixelSpacing": [float(v) for v in first.get("PixelSpacing") or []] or None,
+            "sliceThickness": as_float(first.get("SliceThickness")),
+            "orientation": [float(v) for v in first.get("ImageOrientationPatient") or []] or None,
+            "frameLength": frame_length,
+            "frameOffsets": [i * frame_length for i in range(n)],
+        }
+        # per-frame values are stored once when the whole series shares them
+        for key in ("rescaleSlope", "rescaleIntercept", "windowCenter", "windowWidth"):
+            values = [f[key] for f in frames_meta]
+            header[key] = values[0] if len(set(values)) == 1 else values
+        header["positions"] = [f["position"] for f in frames_meta]
+        header["sourceSignature"] = signature
+
+        with open(header_path + ".tmp", "w", encoding="utf-8") as out:
+            json.dump(header, out, separators=(",", ":"))
+        os.replace(volume_path + ".tmp", volume_path)
+        os.replace(header_path + ".tmp", header_path)
+        _remove_stale_volumes(out_dir, series_uid, volume_name)
+    except Exception as exc:
+        for tmp in (volume_path and volume_path + ".tmp", header_path + ".tmp"):
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+        return {"seriesUID": series_uid, "error": str(exc)}
+    return header
+
+
+# ------------------------------------------------------------------------
+# Reading (used by the downstream stages)
+# ------------------------------------------------------------------------
+def open_volume(header_path):
+    """(header, read-only memmap of shape (frames, rows, columns[, samples]))."""
+    with open(header_path, "r", encoding="utf-8") as f:
+        header = json.load(f)
+    shape = (header["frames"], header["rows"], header["columns"])
+    if header.get("samplesPerPixel", 1) > 1:
+        shape += (header["samplesPerPixel"],)
+    volume_path = os.path.join(os.path.dirname(header_path), header["volume"])
+    return header, np.memmap(volume_path, dtype=np.dtype(header["dtype"]), mode="r", shape=shape)
+
+
+def frame_values(header, index):
+    """Per-frame (slope, intercept, center, width), whether stored once or per frame."""
+    def pick(key):
+        value = header.get(key)
+        return value[index] if isinstance(value, list) else value
+    return pick("rescaleSlope"), pick("rescaleIntercept"), pick("windowCenter"), pick("windowWidth")
+
+
+def per_frame_rescale(header):
+    """True when the frames of a series do not share one RescaleSlope / RescaleIntercept."""
+    return isinstance(header.get("rescaleSlope"), list) or isinstance(header.get("rescaleIntercept"), list)
+
+
+def chunk_values(header, start, stop, ndim=3):
+    """slope, intercept, center, width for frames [start, stop), shaped to broadcast per frame (NaN if unset)."""
+    values = [frame_values(header, i) for i in range(start, stop)]
+    shape = (-1,) + (1,) * (ndim - 1)
+    return [np.array([v[k] if v[k] is not None else np.nan for v in values],
+                     dtype=np.float32).reshape(shape) for k in range(4)]
+
+
+def header_path_for(series, public_dir=None):
+    """Local path of a series' packed volume header, or None if not packed."""
+    if not series.get("volumeHeader"):
+        return None
+    path = local_path(series["volumeHeader"], public_dir)
+    return path if os.path.exists(path) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack each series into one contiguous volume file + JSON header.")
+    parser.add_argument("manifest", help="manifest JSON produced by obtain_table_data.py / build_catalog.py")
+    parser.add_argument("--out-dir", required=True, help="folder receiving <seriesUID>-<hash>.vol and <seriesUID>.vol.json")
+    parser.add_argument("--public-dir", default=None, help="folder that /assets/... URLs in the manifest live under")
+    parser.add_argument("--url-prefix", default=None, help="URL the out-dir is served at (e.g. /volumes)")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--workers", type=int, default=None, help="series packed in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    patients = load_manifest(args.manifest)
+    series_list = [s for s in iter_manifest_series(patients) if s.get("imageFilePaths")]
+    jobs = [
+        (s["seriesUID"], [local_path(p, args.public_dir) for p in s["imageFilePaths"]], args.out_dir)
+        for s in series_list
+    ]
+
+    packed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series, header in zip(series_list, pool.map(pack_series, jobs)):
+            if "error" in header:
+                print(f"WARNING: series {series['seriesUID']} not packed: {header['error']}")
+                continue
+            series["volumeHeader"] = url_for(args.out_dir, series["seriesUID"] + HEADER_SUFFIX, args.url_prefix)
+            packed += 1
+            print(f" - {series['seriesUID']}: {header['frames']} frames, "
+                  f"{header['frames'] * header['frameLength'] / 1e6:.1f} MB")
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"\nDONE! Packed {packed}/{len(series_list)} series => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Histograms, robust percentiles and window presets of the packed series.
+
+The brightness/contrast controls of newViewer.tsx start from fixed
+defaults; picking a sensible window on the client would mean scanning
+every pixel of every frame.  This stage does that scan once at ingest:
+the rescaled values of each packed volume are histogrammed chunk by chunk
+(raw integer samples with a single bincount when the rescale is the same
+for the whole series, fixed float bins otherwise), percentiles are read
+off the cumulative histogram and turned into window/level presets:
+
+    "windowPresets": [{"name": "auto", "center": 412.0, "width": 801.0}, ...]
+    "histogram": {"min": ..., "max": ..., "percentiles": {"1": ..., "99": ...},
+                  "counts": [64 bins above the series minimum]}
+
+The series minimum (background, padding) is left out of the percentiles, so
+"auto" windows the anatomy instead of the air around it.  Run
+series_volume.py first.
+
+    python series_windows.py hammurabi-ui/src/data/dicomCatalog.json \
+        --public-dir hammurabi-ui/public
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from series_renditions import CHUNK_FRAMES
+from series_volume import (chunk_values, header_path_for, iter_manifest_series, load_manifest, open_volume,
+                           save_manifest)
+
+# Float bins when the samples cannot be counted exactly.
+FLOAT_BINS = 4096
+# Bins of the coarse histogram written into the manifest.
+MANIFEST_BINS = 64
+PERCENTILES = (0.1, 0.5, 1, 5, 25, 50, 75, 95, 99, 99.5, 99.9)
+# name -> (low percentile, high percentile); None means the series min / max
+PRESETS = {
+    "auto": (1, 99),
+    "wide": (0.1, 99.9),
+    "full": (None, None),
+}
+
+
+class Histogram:
+    """Counts of bins whose value (bin centre) is ``base + i * step``."""
+
+    def __init__(self, counts, base, step):
+        self.counts = counts
+        self.base = base
+        self.step = step
+
+    def values(self):
+        return self.base + np.arange(len(self.counts)) * self.step
+
+    def trimmed(self):
+        """The occupied bins only, without the lowest one (background / padding)."""
+        occupied = np.flatnonzero(self.counts)
+        if len(occupied) < 2:
+            return self
+        first, last = occupied[1], occupied[-1]
+        return Histogram(self.counts[first:last + 1], self.base + first * self.step, self.step)
+
+    def percentiles(self, qs):
+        cumulative = np.cumsum(self.counts, dtype=np.float64)
+        ranks = np.asarray(qs, dtype=np.float64) / 100.0 * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(self.counts) - 1)
+        return self.base + index * self.step
+
+    def coarse(self, bins):
+        """Re-bin to ``bins`` equal bins between the first and the last value."""
+        edges = np.linspace(self.base, self.base + (len(self.counts) - 1) * self.step, bins + 1)
+        which = np.clip(np.searchsorted(edges, self.values(), side="right") - 1, 0, bins - 1)
+        return np.bincount(which, weights=self.counts, minlength=bins).astype(np.int64)
+
+
+def _uniform_rescale(header):
+    slope, intercept = header.get("rescaleSlope"), header.get("rescaleIntercept")
+    if isinstance(slope, list) or isinstance(intercept, list):
+        return None
+    slope = 1.0 if slope is None else slope
+    return (slope, 0.0 if intercept is None else intercept) if slope > 0 else None
+
+
+def series_histogram(header, volume):
+    """Histogram of the rescaled values of a whole series, read chunk by chunk."""
+    rescale = _uniform_rescale(header)
+    if rescale is not None and volume.dtype.kind in "ui" and volume.dtype.itemsize <= 2:
+        # exact: count the raw samples (offset so that signed ones are >= 0)
+        offset = -np.iinfo(volume.dtype).min
+        counts = np.zeros(1 << (8 * volume.dtype.itemsize), dtype=np.int64)
+        for start in range(0, len(volume), CHUNK_FRAMES):
+            chunk = volume[start:start + CHUNK_FRAMES].ravel()
+            if offset:
+                chunk = chunk.astype(np.int32) + offset
+            counts += np.bincount(chunk, minlength=len(counts))
+        slope, intercept = rescale
+        return Histogram(counts, (-offset) * slope + intercept, slope)
+
+    # fixed float bins between the series min and max (two passes over the memmap)
+    lo, hi = np.inf, -np.inf
+    chunks = [(start, min(start + CHUNK_FRAMES, len(volume))) for start in range(0, len(volume), CHUNK_FRAMES)]
+    for start, stop in chunks:
+        slope, intercept, _, _ = chunk_values(header, start, stop, volume.ndim)
+        values = volume[start:stop].astype(np.float32) * np.nan_to_num(slope, nan=1.0) + np.nan_to_num(intercept)
+        lo, hi = min(lo, float(values.min())), max(hi, float(values.max()))
+    step = max(hi - lo, 1e-6) / FLOAT_BINS
+    counts = np.zeros(FLOAT_BINS, dtype=np.int64)
+    for start, stop in chunks:
+        slope, intercept, _, _ = chunk_values(header, start, stop, volume.ndim)
+        values = volume[start:stop].astype(np.float32) * np.nan_to_num(slope, nan=1.0) + np.nan_to_num(intercept)
+        index = np.minimum(((values.ravel() - lo) / step).astype(np.int64), FLOAT_BINS - 1)
+        counts += np.bincount(index, minlength=FLOAT_BINS)
+    return Histogram(counts, lo + step / 2.0, step)
+
+
+def window_presets(histogram):
+    """(presets, {"min", "max", "percentiles"}) of a series histogram."""
+    occupied = np.flatnonzero(histogram.counts)
+    lo = float(histogram.base + occupied[0] * histogram.step)
+    hi = float(histogram.base + occupied[-1] * histogram.step)
+    values = dict(zip(PERCENTILES, (float(v) for v in histogram.trimmed().percentiles(PERCENTILES))))
+    presets = []
+    for name, (low, high) in PRESETS.items():
+        bottom = lo if low is None else values[low]
+        top = hi if high is None else values[high]
+        presets.append({"name": name, "center": round((bottom + top) / 2.0, 3),
+                        "width": round(max(top - bottom, histogram.step, 1.0), 3)})
+    return presets, {"min": lo, "max": hi, "percentiles": {f"{q:g}": round(v, 3) for q, v in values.items()}}
+
+
+def analyse_series(header_path):
+    """{"windowPresets", "histogram"} of one packed series, or {"error"}."""
+    try:
+        header, volume = open_volume(header_path)
+        if header.get("samplesPerPixel", 1) > 1:
+            return {"error": "colour series have no window"}
+        histogram = series_histogram(header, volume)
+        presets, stats = window_presets(histogram)
+        stats["counts"] = histogram.trimmed().coarse(MANIFEST_BINS).tolist()
+        return {"windowPresets": presets, "histogram": stats}
+    except Exception as exc:
+        return {"error": str(exc)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add histogram-based window/level presets to every packed series.")
+    parser.add_argument("manifest", help="manifest JSON whose series carry a volumeHeader (series_volume.py)")
+    parser.add_argument("--public-dir", default=None, help="folder that URLs in the manifest live under")
+    parser.add_argument("--output", default=None, help="manifest to write (default: update the input in place)")
+    parser.add_argument("--workers", type=int, default=None, help="series analysed in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    patients = load_manifest(args.manifest)
+    series_list, jobs = [], []
+    for series in iter_manifest_series(patients):
+        header_path = header_path_for(series, args.public_dir)
+        if header_path is None:
+            print(f"WARNING: series {series['seriesUID']} has no packed volume, run series_volume.py first")
+            continue
+        series_list.append(series)
+        jobs.append(header_path)
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for series, result in zip(series_list, pool.map(analyse_series, jobs)):
+            if "error" in result:
+                print(f"WARNING: series {series['seriesUID']} skipped: {result['error']}")
+                continue
+            series.update(result)
+            auto = result["windowPresets"][0]
+            print(f" - {series['seriesUID']}: auto C {auto['center']:g} / W {auto['width']:g}")
+            done += 1
+
+    save_manifest(patients, args.output or args.manifest)
+    print(f"\nDONE! Window presets for {done}/{len(series_list)} series")
+
+
+if __name__ == "__main__":
+    main()
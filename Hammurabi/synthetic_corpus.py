@@ -0,0 +1,241 @@
+"""
+Synthetic archive generator for scaling tests.
+
+The bundled sample data (five RIDER series and the Esaote ones) is far too
+small to show how obtain_table_data.py, the catalog and the viewer behave
+on a real archive.  This script clones the bundled series into any number
+of patients x studies x series, with fresh (reproducible, --seed) patient,
+study, series, frame of reference and SOP instance UIDs, and lays them out
+like an NBIA download next to a matching metadata.csv, "File Size" comma
+quirk included:
+
+    <out-dir>/metadata.csv
+    <out-dir>/<collection>/<subject>/<date>-NA-<study>-<uid tail>/<n>.000000-<series>-<uid tail>/1-01.dcm
+
+Series are written in parallel (one series per task); files that already
+exist are kept, so an interrupted run can be resumed.
+
+    python synthetic_corpus.py --out-dir /data/synthetic --patients 1000 --studies 2 --series 5
+    python obtain_table_data.py --csv /data/synthetic/metadata.csv --base-dir /data/synthetic \
+        --output /tmp/synthetic.json --scan-headers
+"""
+import argparse
+import csv
+import itertools
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pydicom
+from pydicom.uid import UID, generate_uid
+
+from dicom_headers import read_catalog_header, read_header, sort_series_headers
+from dump_tags import iter_inputs
+
+DEFAULT_TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hammurabi-ui", "public", "assets")
+# Series handed to the pool per round trip; bounds the pending CSV rows.
+BATCH_SIZE = 256
+
+CSV_COLUMNS = [
+    "Series UID", "Collection", "3rd Party Analysis", "Data Description URI", "Subject ID", "Study UID",
+    "Study Description", "Study Date", "Series Description", "Manufacturer", "Modality", "SOP Class Name",
+    "SOP Class UID", "Number of Images", "File Size", "File Location", "Download Timestamp",
+]
+_TEMPLATE_TAGS = ["Manufacturer", "Modality", "SOPClassUID"]
+
+
+# ------------------------------------------------------------------------
+# 1) TEMPLATE SERIES
+# ------------------------------------------------------------------------
+def load_templates(inputs):
+    """[{"paths", "studyDescription", "studyDate", "seriesDescription", ...}] of the source series."""
+    by_series = {}
+    for path in iter_inputs(inputs):
+        header = read_catalog_header(path)
+        if "error" in header or not header["seriesUID"]:
+            continue
+        by_series.setdefault(header["seriesUID"], []).append(header)
+
+    templates = []
+    for headers in by_series.values():
+        ordered = sort_series_headers(headers)
+        first = ordered[0]
+        ds = read_header(first["path"], _TEMPLATE_TAGS)
+        sop_class = str(ds.get("SOPClassUID", ""))
+        templates.append({
+            "paths": [h["path"] for h in ordered],
+            "studyDescription": first["studyDescription"],
+            "studyDate": first["studyDate"],
+            "seriesDescription": first["seriesDescription"],
+            "manufacturer": str(ds.get("Manufacturer", "")) or "NA",
+            "modality": str(ds.get("Modality", "")),
+            "sopClassUID": sop_class,
+            "sopClassName": UID(sop_class).name if sop_class else "",
+        })
+    return sorted(templates, key=lambda t: t["paths"][0])
+
+
+# ------------------------------------------------------------------------
+# 2) CLONE ONE SERIES
+# ------------------------------------------------------------------------
+def _uid(seed, *parts):
+    return generate_uid(entropy_srcs=[str(seed)] + [str(p) for p in parts])
+
+
+def _dicom_date(text):
+    """MM-DD-YYYY (as in the NBIA CSV) -> YYYYMMDD."""
+    month, day, year = text.split("-")
+    return f"{year}{month}{day}"
+
+
+def _folder_name(text):
+    return re.sub(r'[<>:"/\\|?*]', "_", text).strip() or "NA"
+
+
+def subject_id(prefix, patient):
+    return f"{prefix}-{patient + 1:06d}"
+
+
+def clone_series(job):
+    """
+    ``job`` is (template, study template, out_dir, collection, prefix, seed,
+    (patient, study, series), images).  Writes one synthetic series and
+    returns its metadata.csv row, or {"error"}.  Study description and date
+    come from the study template, so all series of a study agree on them.
+    """
+    template, study, out_dir, collection, prefix, seed, (p, s, k), images = job
+    subject = subject_id(prefix, p)
+    study_uid = _uid(seed, "study", p, s)
+    series_uid = _uid(seed, "series", p, s, k)
+    frame_of_reference = _uid(seed, "frame", p, s, k)
+    series_number = k + 1
+    try:
+        study_dir = f"{study['studyDate'] or 'NA'}-NA-{_folder_name(study['studyDescription'])}-{study_uid[-5:]}"
+        series_dir = f"{series_number}.000000-{_folder_name(template['seriesDescription'])}-{series_uid[-5:]}"
+        location = os.path.join(collection, subject, study_dir, series_dir)
+        folder = os.path.join(out_dir, location)
+        os.makedirs(folder, exist_ok=True)
+
+        sources = template["paths"]
+        total = 0
+        for i in range(images or len(sources)):
+            target = os.path.join(folder, f"1-{i + 1:02d}.dcm")
+            if not os.path.exists(target):
+                ds = pydicom.dcmread(sources[i % len(sources)])
+                sop_uid = _uid(seed, "sop", p, s, k, i)
+                ds.PatientID = subject
+                ds.PatientName = subject
+                ds.StudyInstanceUID = study_uid
+                ds.StudyDescription = study["studyDescription"]
+                if study["studyDate"]:
+                    ds.StudyDate = _dicom_date(study["studyDate"])
+                ds.StudyID = str(s + 1)
+                ds.SeriesInstanceUID = series_uid
+                ds.SeriesNumber = series_number
+                ds.InstanceNumber = i + 1
+                ds.SOPInstanceUID = sop_uid
+                ds.file_meta.MediaStorageSOPInstanceUID = sop_uid
+                if "FrameOfReferenceUID" in ds:
+                    ds.FrameOfReferenceUID = frame_of_reference
+                tmp = target + ".tmp"
+                ds.save_as(tmp)
+                os.replace(tmp, target)
+            total += os.path.getsize(target)
+    except Exception as exc:
+        return {"error": f"{subject} series {series_uid}: {exc}"}
+
+    # NBIA writes the size with a decimal comma and without quotes, so it
+    # always spans two cells ("10,04 MB" -> "10", "04 MB")
+    whole, fraction = f"{total / 1e6:.2f}".split(".")
+    return {
+        "Series UID": series_uid,
+        "Collection": collection,
+        "3rd Party Analysis": "null",
+        "Data Description URI": "",
+        "Subject ID": subject,
+        "Study UID": study_uid,
+        "Study Description": study["studyDescription"],
+        "Study Date": study["studyDate"],
+        "Series Description": template["seriesDescription"],
+        "Manufacturer": template["manufacturer"],
+        "Modality": template["modality"],
+        "SOP Class Name": template["sopClassName"],
+        "SOP Class UID": template["sopClassUID"],
+        "Number of Images": images or len(sources),
+        "File Size": [whole, f"{fraction} MB"],
+        "File Location": ".\\" + location.replace("/", "\\"),
+        "Download Timestamp": datetime.now().isoformat(timespec="milliseconds"),
+    }
+
+
+def csv_cells(row):
+    cells = []
+    for column in CSV_COLUMNS:
+        value = row[column]
+        cells.extend(value if isinstance(value, list) else [value])
+    return cells
+
+
+# ------------------------------------------------------------------------
+# 3) MAIN
+# ------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Clone the sample series into a large NBIA-style synthetic archive.")
+    parser.add_argument("--out-dir", required=True, help="folder receiving metadata.csv and the series folders")
+    parser.add_argument("--templates", nargs="+", default=[DEFAULT_TEMPLATES],
+                        help="files, directories or globs of the series to clone (default: public/assets)")
+    parser.add_argument("--patients", type=int, default=10, help="number of patients (default 10)")
+    parser.add_argument("--studies", type=int, default=1, help="studies per patient (default 1)")
+    parser.add_argument("--series", type=int, default=3, help="series per study (default 3)")
+    parser.add_argument("--images", type=int, default=None,
+                        help="instances per series, repeating the template frames if needed "
+                             "(default: as many as the template series)")
+    parser.add_argument("--collection", default="SYNTHETIC", help="collection name (first folder level)")
+    parser.add_argument("--prefix", default="SYNTH", help="Subject ID prefix")
+    parser.add_argument("--seed", type=int, default=0, help="UID seed; the same seed gives the same UIDs")
+    parser.add_argument("--workers", type=int, default=None, help="series written in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    templates = load_templates(args.templates)
+    if not templates:
+        raise SystemExit("ERROR: no readable DICOM series among --templates")
+    print(f"{len(templates)} template series, writing "
+          f"{args.patients * args.studies * args.series} series into {args.out_dir}")
+
+    # series cycle over the templates; a study takes its description and date from its first series
+    def template_for(p, s, k):
+        return templates[(p * args.studies * args.series + s * args.series + k) % len(templates)]
+
+    slots = itertools.product(range(args.patients), range(args.studies), range(args.series))
+    jobs = (
+        (template_for(p, s, k), template_for(p, s, 0), args.out_dir, args.collection, args.prefix, args.seed,
+         (p, s, k), args.images)
+        for p, s, k in slots
+    )
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    written = images = failed = 0
+    with open(os.path.join(args.out_dir, "metadata.csv"), "w", encoding="utf-8", newline="") as out, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+        while True:
+            batch = list(itertools.islice(jobs, BATCH_SIZE))
+            if not batch:
+                break
+            for row in pool.map(clone_series, batch):
+                if "error" in row:
+                    print(f"WARNING: {row['error']}")
+                    failed += 1
+                    continue
+                writer.writerow(csv_cells(row))
+                written += 1
+                images += row["Number of Images"]
+            print(f" - {written} series, {images} instances")
+
+    print(f"\nDONE! {written} series ({images} instances) written, {failed} failed => {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
 #!/usr/bin/env python3
-import aws_cdk as cdk
+import hashlib
+import os
+import shutil
 
-# Import CdkGraph and the "diagram" plugin
-from aws_pdk.cdk_graph import CdkGraph, FilterPreset
-from aws_pdk.cdk_graph_plugin_diagram import CdkGraphDiagramPlugin
+import aws_cdk as cdk
 
 from react_ecs_complete_cdk.react_ecs_complete_cdk_stack import ReactCdkCompleteStack
 
+# Rendered diagrams, one folder per template hash (survives cdk.out being rebuilt)
+DIAGRAM_CACHE_DIR = ".cdkgraph-cache"
+
+
+def templates_hash(assembly):
+    """sha256 of every synthesized stack template, in stack name order."""
+    digest = hashlib.sha256()
+    for stack in sorted(assembly.stacks, key=lambda s: s.stack_name):
+        digest.update(stack.stack_name.encode())
+        with open(stack.template_full_path, "rb") as template:
+            digest.update(template.read())
+    return digest.hexdigest()
+
+
 def main():
     app = cdk.App()
 
@@ -17,6 +31,16 @@ def main():
         env=cdk.Environment(account="544547773663", region="us-east-1"),
     )
 
+    # The diagram is only rendered on request (cdk synth -c diagram=true):
+    # CdkGraph and graphviz add a lot to every synth/deploy otherwise.
+    if str(app.node.try_get_context("diagram")).lower() not in ("true", "1"):
+        app.synth()
+        return
+
+    # Import CdkGraph and the "diagram" plugin
+    from aws_pdk.cdk_graph import CdkGraph, FilterPreset
+    from aws_pdk.cdk_graph_plugin_diagram import CdkGraphDiagramPlugin
+
     # 2) Instantiate CdkGraph passing parameters to the plugin as keyword args
     #
     # - defaults: defines the default values used by all diagrams
@@ -50,9 +74,18 @@ def main():
         ],
     )
 
-    # 3) CDK synth and diagram generation
-    app.synth()
+    # 3) CDK synth and diagram generation, reusing the diagrams rendered for
+    #    the same templates by an earlier run
+    assembly = app.synth()
+    cached = os.path.join(app.node.try_get_context("diagramCacheDir") or DIAGRAM_CACHE_DIR,
+                          templates_hash(assembly))
+    rendered = os.path.join(assembly.directory, "cdkgraph")
+    if os.path.isdir(cached):
+        shutil.copytree(cached, rendered, dirs_exist_ok=True)
+        print(f"Architecture diagram unchanged, reused {cached}")
+        return
     graph.report()
+    shutil.copytree(rendered, cached, dirs_exist_ok=True)
 
 
 if __name__ == "__main__":
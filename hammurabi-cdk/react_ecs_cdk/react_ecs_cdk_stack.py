@@ -7,16 +7,23 @@ from aws_cdk import (
     aws_iam as iam,
     aws_cloudfront as cloudfront,
     aws_cloudfront_origins as origins,
+    aws_s3 as s3,
     Duration,
     CfnOutput,
+    RemovalPolicy,
 )
 from constructs import Construct
-import time
+import os
+
+from service_scaling import add_service_autoscaling, scaling_settings
 #from aws_cdk.aws_cloudfront import CfnInvalidation
 
 class ReactEcsCdkStack(Stack):
     def __init__(self, scope: Construct, id: str, **kwargs):
         super().__init__(scope, id, **kwargs)
+
+        # Task size and autoscaling bounds come from the "autoscaling" context.
+        scaling = scaling_settings(self.node)
         
         # Create a VPC spanning 2 AZs.
         vpc = ec2.Vpc(self, "ReactEcsVpc", max_azs=2)
@@ -33,9 +40,9 @@ class ReactEcsCdkStack(Stack):
         service = ecs_patterns.ApplicationLoadBalancedFargateService(
             self, "ReactFargateService",
             cluster=cluster,
-            cpu=256,                # 256 CPU units per task.
-            desired_count=2,        # Deploy 2 tasks.
-            memory_limit_mib=512,   # Each task gets 512 MiB memory.
+            cpu=scaling["cpu"],                     # CPU units per task.
+            desired_count=scaling["minCapacity"],   # Start at the autoscaling minimum.
+            memory_limit_mib=scaling["memoryMiB"],  # Memory per task.
             min_healthy_percent=100,
             task_image_options=ecs_patterns.ApplicationLoadBalancedTaskImageOptions(
                 image=ecs.ContainerImage.from_ecr_repository(repository, tag="latest"),
@@ -49,8 +56,10 @@ class ReactEcsCdkStack(Stack):
                     "REACT_APP_COGNITO_SCOPE": "phone openid email",
                     "REACT_APP_LOGOUT_URI": "https://depx7mmslfz65.cloudfront.net/aws-signout",
                     "REACT_APP_COGNITO_DOMAIN": "https://us-east-1llk8ieqxb.auth.us-east-1.amazoncognito.com",
-                    # Dummy variable to force redeployment - you might use a timestamp or git commit hash.
-                    "BUILD_TIMESTAMP": str(int(time.time()))
+                    # Variable to force redeployment: pass the commit time with -c buildTimestamp=...
+                    # (or SOURCE_DATE_EPOCH) so unchanged code synthesizes to the same template.
+                    "BUILD_TIMESTAMP": str(self.node.try_get_context("buildTimestamp")
+                                           or os.environ.get("SOURCE_DATE_EPOCH", "0"))
                 }
             ),
             public_load_balancer=True  # ALB will be internet-facing.
@@ -68,20 +77,42 @@ class ReactEcsCdkStack(Stack):
             )
         )
         
+        # Scale on ALB requests per target, on CPU and on schedule.
+        add_service_autoscaling(service, scaling)
+
         # (Optional) Configure the target group's health check.
         service.target_group.configure_health_check(
             path="/",
             interval=Duration.seconds(60),
         )
         
-        # Create a CloudFront distribution using the ALB as the origin.
+        # Private bucket for the DICOM corpus (kept out of the nginx image),
+        # readable only by CloudFront through an Origin Access Control.
+        assets_bucket = s3.Bucket(
+            self, "AssetsBucket",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
+        # Create a CloudFront distribution using the ALB as the origin,
+        # and the bucket as the origin of /assets/*.
         distribution = cloudfront.Distribution(
             self, "ReactAppDistribution",
             default_behavior=cloudfront.BehaviorOptions(
                 origin=origins.LoadBalancerV2Origin(service.load_balancer,
                         protocol_policy=cloudfront.OriginProtocolPolicy.HTTP_ONLY),
                 viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
-            )
+            ),
+            additional_behaviors={
+                "/assets/*": cloudfront.BehaviorOptions(
+                    origin=origins.S3BucketOrigin.with_origin_access_control(assets_bucket),
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                    cache_policy=cloudfront.CachePolicy.CACHING_OPTIMIZED,
+                    compress=True,
+                ),
+            },
         )
 
         ## Create a CloudFront invalidation to clear the cache.
@@ -103,3 +134,4 @@ class ReactEcsCdkStack(Stack):
         # Output the CloudFront domain name. Use this for your HTTPS endpoints.
         CfnOutput(self, "DistributionDomain", value=distribution.domain_name)
         CfnOutput(self, "ALBServiceURL", value=f"http://{service.load_balancer.load_balancer_dns_name}")
+        CfnOutput(self, "AssetsBucketName", value=assets_bucket.bucket_name)
@@ -1,491 +1,599 @@
-import os
-import json
-import time
-import uuid
-from aws_cdk import (
-    Stack,
-    aws_ec2 as ec2,
-    aws_ecs as ecs,
-    aws_ecs_patterns as ecs_patterns,
-    aws_ecr as ecr,
-    aws_iam as iam,
-    aws_cloudfront as cloudfront,
-    aws_cloudfront_origins as origins,
-    aws_cognito as cognito,
-    aws_secretsmanager as secretsmanager,
-    aws_wafv2 as wafv2,
-    aws_elasticloadbalancingv2 as elbv2,
-    aws_codedeploy as codedeploy,
-    custom_resources as cr,
-    SecretValue,
-    CfnOutput,
-    RemovalPolicy,
-    Duration,
-    Fn
-)
-from constructs import Construct
-
-
-class ReactCdkCompleteStack(Stack):
-    def __init__(self, scope: Construct, id: str, **kwargs):
-        super().__init__(scope, id, **kwargs)
-
-        # ---------------------------------------------------------------------
-        # (0)  TAG immagine da context (default “latest” se non passato)
-        # ---------------------------------------------------------------------
-        image_tag: str = self.node.try_get_context("imageTag") or "latest"
-
-        # ---------------------------------------------------------------------
-        # (A) Google OAuth – legge segreti locali
-        # ---------------------------------------------------------------------
-        google_json_path = os.path.join(os.path.dirname(__file__), "google_secrets.json")
-        with open(google_json_path, "r") as f:
-            google_config = json.load(f)
-        google_client_id = google_config["web"]["client_id"]
-        google_client_secret_str = google_config["web"]["client_secret"]
-
-        # Secret in Secrets Manager per il client‑secret Google
-        google_oauth_secret = secretsmanager.Secret(
-            self, "GoogleOAuthClientSecret",
-            secret_name="GoogleOAuthClientSecret",
-            removal_policy=RemovalPolicy.DESTROY,
-            secret_string_value=SecretValue.unsafe_plain_text(google_client_secret_str)
-        )
-
-        # ---------------------------------------------------------------------
-        # (B)  Secret header CloudFront → ALB
-        # ---------------------------------------------------------------------
-        cf_alb_secret_value = f"CF-Secret-{uuid.uuid4()}"
-        cf_header_secret = secretsmanager.Secret(
-            self, "CloudFrontALBSecret",
-            secret_name="CloudFrontALBSecret",
-            removal_policy=RemovalPolicy.DESTROY,
-            secret_string_value=SecretValue.unsafe_plain_text(cf_alb_secret_value)
-        )
-        get_secret_cr = cr.AwsCustomResource(
-            self, "GetSecretValue",
-            on_create=cr.AwsSdkCall(
-                service="SecretsManager",
-                action="getSecretValue",
-                parameters={"SecretId": cf_header_secret.secret_name},
-                physical_resource_id=cr.PhysicalResourceId.of("SecretValueFetch")
-            ),
-            policy=cr.AwsCustomResourcePolicy.from_statements([
-                iam.PolicyStatement(
-                    actions=["secretsmanager:GetSecretValue"],
-                    resources=[cf_header_secret.secret_arn]
-                )
-            ])
-        )
-        secret_header_value = get_secret_cr.get_response_field("SecretString")  # noqa: F841
-
-        # ---------------------------------------------------------------------
-        # (C)  VPC + ECS + ECR
-        # ---------------------------------------------------------------------
-        vpc = ec2.Vpc(self, "ReactEcsVpc", max_azs=2)
-        cluster = ecs.Cluster(self, "ReactEcsCluster", vpc=vpc)
-
-        repository = ecr.Repository.from_repository_name(
-            self, "HammurabiRepo", "hammurabi-ui-prod"
-        )
-
-        # ALB security‑group
-        alb_sg = ec2.SecurityGroup(
-            self, "ALBSecurityGroup",
-            vpc=vpc,
-            description="Security group for ALB",
-            allow_all_outbound=True
-        )
-        alb_sg.add_ingress_rule(ec2.Peer.any_ipv4(), ec2.Port.tcp(80), "HTTP")
-        alb_sg.add_ingress_rule(ec2.Peer.any_ipv4(), ec2.Port.tcp(443), "HTTPS")
-
-        # ---------- servizio Fargate con ALB pattern ----------
-        service = ecs_patterns.ApplicationLoadBalancedFargateService(
-            self, "ReactFargateService",
-            cluster=cluster,
-            cpu=256,
-            desired_count=2,
-            memory_limit_mib=512,
-            min_healthy_percent=100,
-            # 🔹 obbligatorio per CodeDeploy Blue/Green
-            deployment_controller = ecs.DeploymentController(
-                type = ecs.DeploymentControllerType.CODE_DEPLOY
-            ),
-            task_image_options=ecs_patterns.ApplicationLoadBalancedTaskImageOptions(
-                image=ecs.ContainerImage.from_ecr_repository(repository, tag=image_tag),
-                container_port=80,
+import os
+import json
+from aws_cdk import (
+    Stack,
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_ecs_patterns as ecs_patterns,
+    aws_ecr as ecr,
+    aws_iam as iam,
+    aws_cloudfront as cloudfront,
+    aws_cloudfront_origins as origins,
+    aws_cognito as cognito,
+    aws_secretsmanager as secretsmanager,
+    aws_wafv2 as wafv2,
+    aws_elasticloadbalancingv2 as elbv2,
+    aws_codedeploy as codedeploy,
+    aws_s3 as s3,
+    aws_s3_deployment as s3deploy,
+    custom_resources as cr,
+    SecretValue,
+    CfnOutput,
+    RemovalPolicy,
+    Duration,
+    Fn
+)
+from constructs import Construct
+
+from service_scaling import add_service_autoscaling, scaling_settings
+
+
+class ReactCdkCompleteStack(Stack):
+    def __init__(self, scope: Construct, id: str, **kwargs):
+        super().__init__(scope, id, **kwargs)
+
+        # ---------------------------------------------------------------------
+        # (0)  TAG immagine da context (default “latest” se non passato)
+        # ---------------------------------------------------------------------
+        image_tag: str = self.node.try_get_context("imageTag") or "latest"
+        # timestamp deterministico: dal context (CI: data del commit) o SOURCE_DATE_EPOCH
+        build_timestamp: str = str(
+            self.node.try_get_context("buildTimestamp") or os.environ.get("SOURCE_DATE_EPOCH", "0")
+        )
+        scaling = scaling_settings(self.node, blue_green=True)
+
+        # ---------------------------------------------------------------------
+        # (A) Google OAuth – legge segreti locali
+        # ---------------------------------------------------------------------
+        google_json_path = self.node.try_get_context("googleSecretsFile") or os.path.join(
+            os.path.dirname(__file__), "google_secrets.json"
+        )
+        with open(google_json_path, "r") as f:
+            google_config = json.load(f)
+        google_client_id = google_config["web"]["client_id"]
+        google_client_secret_str = google_config["web"]["client_secret"]
+
+        # Secret in Secrets Manager per il client‑secret Google
+        google_oauth_secret = secretsmanager.Secret(
+            self, "GoogleOAuthClientSecret",
+            secret_name="GoogleOAuthClientSecret",
+            removal_policy=RemovalPolicy.DESTROY,
+            secret_string_value=SecretValue.unsafe_plain_text(google_client_secret_str)
+        )
+
+        # ---------------------------------------------------------------------
+        # (B)  Secret header CloudFront → ALB
+        # ---------------------------------------------------------------------
+        # valore generato da Secrets Manager alla creazione (non più uuid4 a
+        # ogni synth): il template resta identico e il deploy non cambia nulla
+        cf_header_secret = secretsmanager.Secret(
+            self, "CloudFrontALBSecret",
+            secret_name="CloudFrontALBSecret",
+            removal_policy=RemovalPolicy.DESTROY,
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                exclude_punctuation=True,
+                password_length=40
+            )
+        )
+        # riferimento dinamico {{resolve:secretsmanager:...}}, risolto da CloudFormation
+        cf_alb_secret_value = cf_header_secret.secret_value.unsafe_unwrap()
+        get_secret_cr = cr.AwsCustomResource(
+            self, "GetSecretValue",
+            on_create=cr.AwsSdkCall(
+                service="SecretsManager",
+                action="getSecretValue",
+                parameters={"SecretId": cf_header_secret.secret_name},
+                physical_resource_id=cr.PhysicalResourceId.of("SecretValueFetch")
+            ),
+            policy=cr.AwsCustomResourcePolicy.from_statements([
+                iam.PolicyStatement(
+                    actions=["secretsmanager:GetSecretValue"],
+                    resources=[cf_header_secret.secret_arn]
+                )
+            ])
+        )
+        secret_header_value = get_secret_cr.get_response_field("SecretString")  # noqa: F841
+
+        # ---------------------------------------------------------------------
+        # (C)  VPC + ECS + ECR
+        # ---------------------------------------------------------------------
+        vpc = ec2.Vpc(self, "ReactEcsVpc", max_azs=2)
+        cluster = ecs.Cluster(self, "ReactEcsCluster", vpc=vpc)
+
+        repository = ecr.Repository.from_repository_name(
+            self, "HammurabiRepo", "hammurabi-ui-prod"
+        )
+
+        # ALB security‑group
+        alb_sg = ec2.SecurityGroup(
+            self, "ALBSecurityGroup",
+            vpc=vpc,
+            description="Security group for ALB",
+            allow_all_outbound=True
+        )
+        alb_sg.add_ingress_rule(ec2.Peer.any_ipv4(), ec2.Port.tcp(80), "HTTP")
+        alb_sg.add_ingress_rule(ec2.Peer.any_ipv4(), ec2.Port.tcp(443), "HTTPS")
+
+        # ---------- servizio Fargate con ALB pattern ----------
+        service = ecs_patterns.ApplicationLoadBalancedFargateService(
+            self, "ReactFargateService",
+            cluster=cluster,
+            cpu=scaling["cpu"],
+            desired_count=scaling["minCapacity"],
+            memory_limit_mib=scaling["memoryMiB"],
+            min_healthy_percent=100,
+            # 🔹 obbligatorio per CodeDeploy Blue/Green
+            deployment_controller = ecs.DeploymentController(
+                type = ecs.DeploymentControllerType.CODE_DEPLOY
+            ),
+            task_image_options=ecs_patterns.ApplicationLoadBalancedTaskImageOptions(
+                image=ecs.ContainerImage.from_ecr_repository(repository, tag=image_tag),
+                container_port=80,
                 environment={
                     # placeholder – will be overwritten later
-                    "REACT_APP_COGNITO_USER_POOL_ID": "PLACEHOLDER",
-                    "REACT_APP_COGNITO_CLIENT_ID": "PLACEHOLDER",
-                    "REACT_APP_COGNITO_REGION": self.region,
-                    "REACT_APP_COGNITO_REDIRECT_URI": "PLACEHOLDER",
-                    "REACT_APP_COGNITO_SCOPE": "phone openid email",
-                    "REACT_APP_LOGOUT_URI": "PLACEHOLDER",
-                    "REACT_APP_COGNITO_DOMAIN": "PLACEHOLDER",
-                    "BUILD_TIMESTAMP": str(int(time.time())),
-                    "BUILD_VERSION": image_tag
-                }
-            ),
-            public_load_balancer=True
-        )
-        service.load_balancer.add_security_group(alb_sg)
-
-        service.task_definition.add_to_execution_role_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "ecr:GetAuthorizationToken",
-                    "ecr:BatchCheckLayerAvailability",
-                    "ecr:GetDownloadUrlForLayer",
-                    "ecr:BatchGetImage"
-                ],
-                resources=["*"]
-            )
-        )
-
-        # ---------------------------------------------------------------------
-        # (C.1)  BLUE / GREEN  (CodeDeploy)
-        # ---------------------------------------------------------------------
-
-        # target‑group blue creato dal pattern
-        blue_tg = service.target_group
-
-        # target‑group green identico
-        green_tg = elbv2.ApplicationTargetGroup(
-            self, "GreenTG",
-            vpc=vpc,
-            port=80,
-            protocol=elbv2.ApplicationProtocol.HTTP,
-            target_type=elbv2.TargetType.IP,
-            health_check=elbv2.HealthCheck(path="/")
-        )
-
-        # App e Deployment‑Group CodeDeploy
-        cd_app = codedeploy.EcsApplication(self, "BlueGreenApp", application_name="BlueGreenApp")
-        codedeploy.EcsDeploymentGroup(
-            self, "BlueGreenDG",
-            application=cd_app,
-            service=service.service,
-            deployment_group_name="BlueGreenDG",
-            blue_green_deployment_config=codedeploy.EcsBlueGreenDeploymentConfig(
-                listener=service.listener,
-                blue_target_group=blue_tg,
-                green_target_group=green_tg
-            ),
-            deployment_config=codedeploy.EcsDeploymentConfig.LINEAR_10_PERCENT_EVERY_1_MINUTES,
-            auto_rollback=codedeploy.AutoRollbackConfig(
-                failed_deployment=True,
-                stopped_deployment=True
-            )
-        )
-
-        # ---------------------------------------------------------------------
-        # (D)  WAF per ALB
-        # ---------------------------------------------------------------------
-        alb_waf = wafv2.CfnWebACL(
-            self, "ALBWebACL",
-            scope="REGIONAL",
-            default_action=wafv2.CfnWebACL.DefaultActionProperty(allow={}),
-            visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                cloud_watch_metrics_enabled=True,
-                metric_name="ALBWebACL",
-                sampled_requests_enabled=True
-            ),
-            description="WebACL protecting ALB from unauthorized access",
-            rules=[
-                wafv2.CfnWebACL.RuleProperty(
-                    name="RequireCloudFrontHeader",
-                    priority=0,
-                    action=wafv2.CfnWebACL.RuleActionProperty(block={}),
-                    statement=wafv2.CfnWebACL.StatementProperty(
-                        not_statement=wafv2.CfnWebACL.NotStatementProperty(
-                            statement=wafv2.CfnWebACL.StatementProperty(
-                                byte_match_statement=wafv2.CfnWebACL.ByteMatchStatementProperty(
-                                    field_to_match=wafv2.CfnWebACL.FieldToMatchProperty(
-                                        single_header={"Name": "X-CloudFront-Auth"}
-                                    ),
-                                    positional_constraint="EXACTLY",
-                                    search_string=cf_alb_secret_value,
-                                    text_transformations=[
-                                        wafv2.CfnWebACL.TextTransformationProperty(
-                                            priority=0, type="NONE"
-                                        )
-                                    ],
-                                )
-                            )
-                        )
-                    ),
-                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                        cloud_watch_metrics_enabled=True,
-                        metric_name="RequireCloudFrontHeader",
-                        sampled_requests_enabled=True
-                    )
-                ),
-                wafv2.CfnWebACL.RuleProperty(
-                    name="AWSManagedCommonRule",
-                    priority=1,
-                    override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
-                    statement=wafv2.CfnWebACL.StatementProperty(
-                        managed_rule_group_statement=wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
-                            vendor_name="AWS",
-                            name="AWSManagedRulesCommonRuleSet"
-                        )
-                    ),
-                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                        cloud_watch_metrics_enabled=True,
-                        metric_name="AWSManagedCommonRule",
-                        sampled_requests_enabled=True
-                    )
-                ),
-                wafv2.CfnWebACL.RuleProperty(
-                    name="RateLimit",
-                    priority=2,
-                    action=wafv2.CfnWebACL.RuleActionProperty(block={}),
-                    statement=wafv2.CfnWebACL.StatementProperty(
-                        rate_based_statement=wafv2.CfnWebACL.RateBasedStatementProperty(
-                            limit=1000,
-                            aggregate_key_type="IP"
-                        )
-                    ),
-                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                        cloud_watch_metrics_enabled=True,
-                        metric_name="RateLimit",
-                        sampled_requests_enabled=True
-                    )
-                )
-            ]
-        )
-        wafv2.CfnWebACLAssociation(
-            self, "ALBWAFAssociation",
-            resource_arn=service.load_balancer.load_balancer_arn,
-            web_acl_arn=alb_waf.attr_arn
-        )
-
-        # ---------------------------------------------------------------------
-        # (E)  CloudFront + WAF
-        # ---------------------------------------------------------------------
-        cf_waf = wafv2.CfnWebACL(
-            self, "CloudFrontWAF",
-            scope="CLOUDFRONT",
-            default_action=wafv2.CfnWebACL.DefaultActionProperty(allow={}),
-            visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                cloud_watch_metrics_enabled=True,
-                metric_name="CloudFrontWAF",
-                sampled_requests_enabled=True
-            ),
-            description="WAF for CloudFront distribution",
-            rules=[
-                wafv2.CfnWebACL.RuleProperty(
-                    name="ManagedCommonRuleSet",
-                    priority=0,
-                    override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
-                    statement=wafv2.CfnWebACL.StatementProperty(
-                        managed_rule_group_statement=wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
-                            vendor_name="AWS",
-                            name="AWSManagedRulesCommonRuleSet"
-                        )
-                    ),
-                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                        cloud_watch_metrics_enabled=True,
-                        metric_name="CommonRuleSet",
-                        sampled_requests_enabled=True
-                    )
-                ),
-                wafv2.CfnWebACL.RuleProperty(
-                    name="ManagedIPReputationList",
-                    priority=1,
-                    override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
-                    statement=wafv2.CfnWebACL.StatementProperty(
-                        managed_rule_group_statement=wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
-                            vendor_name="AWS",
-                            name="AWSManagedRulesAmazonIpReputationList"
-                        )
-                    ),
-                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                        cloud_watch_metrics_enabled=True,
-                        metric_name="IPReputationList",
-                        sampled_requests_enabled=True
-                    )
-                ),
-                wafv2.CfnWebACL.RuleProperty(
-                    name="CloudFrontRateLimit",
-                    priority=2,
-                    action=wafv2.CfnWebACL.RuleActionProperty(block={}),
-                    statement=wafv2.CfnWebACL.StatementProperty(
-                        rate_based_statement=wafv2.CfnWebACL.RateBasedStatementProperty(
-                            limit=2000,
-                            aggregate_key_type="IP"
-                        )
-                    ),
-                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
-                        cloud_watch_metrics_enabled=True,
-                        metric_name="CloudFrontRateLimit",
-                        sampled_requests_enabled=True
-                    )
-                )
-            ]
-        )
-
-        alb_origin = origins.LoadBalancerV2Origin(
-            service.load_balancer,
-            protocol_policy=cloudfront.OriginProtocolPolicy.HTTP_ONLY,
-            custom_headers={"X-CloudFront-Auth": cf_alb_secret_value}
-        )
-        distribution = cloudfront.Distribution(
-            self, "ReactAppDistribution",
-            default_behavior=cloudfront.BehaviorOptions(
-                origin=alb_origin,
-                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
-                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
-                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED
-            ),
-            web_acl_id=cf_waf.attr_arn
-        )
-
-        # ---------------------------------------------------------------------
-        # (F)  Cognito + Google IdP
-        # ---------------------------------------------------------------------
-        external_id = self.account
-
-        sms_role = iam.Role(
-            self, "CognitoSMSRole",
-            assumed_by=iam.ServicePrincipal(
-                "cognito-idp.amazonaws.com",
-                conditions={"StringEquals": {"sts:ExternalId": external_id}}
-            ),
-            inline_policies={
-                "AllowSnsPublish": iam.PolicyDocument(statements=[
-                    iam.PolicyStatement(actions=["sns:Publish"], resources=["*"])
-                ])
-            }
-        )
-
-        user_pool = cognito.UserPool(
-            self, "UserPool",
-            self_sign_up_enabled=True,
-            sign_in_aliases=cognito.SignInAliases(email=True),
-            standard_attributes=cognito.StandardAttributes(
-                email=cognito.StandardAttribute(required=True, mutable=True),
-                given_name=cognito.StandardAttribute(required=True, mutable=True),
-                family_name=cognito.StandardAttribute(required=True, mutable=True)
-            ),
-            auto_verify=cognito.AutoVerifiedAttrs(email=True),
-            password_policy=cognito.PasswordPolicy(
-                min_length=8,
-                require_lowercase=True,
-                require_uppercase=True,
-                require_digits=True,
-                require_symbols=True
-            ),
-            account_recovery=cognito.AccountRecovery.EMAIL_ONLY,
-            mfa=cognito.Mfa.REQUIRED,
-            mfa_second_factor=cognito.MfaSecondFactor(sms=True, otp=True),
-            sms_role=sms_role,
-            sms_role_external_id=external_id,
-            removal_policy=RemovalPolicy.DESTROY
-        )
-
-        # forza MFA a livello CFN
-        cfn_user_pool = user_pool.node.default_child
-        cfn_user_pool.add_property_override("MfaConfiguration", "ON")
-        cfn_user_pool.add_property_override("EnabledMfas", ["SMS_MFA", "SOFTWARE_TOKEN_MFA"])
-        cfn_user_pool.add_property_override("SmsConfiguration", {
-            "ExternalId": external_id,
-            "SnsCallerArn": sms_role.role_arn
-        })
-
-        domain_prefix = f"auth-app-{self.account}"
-        user_pool.add_domain(
-            "UserPoolDomain",
-            cognito_domain=cognito.CognitoDomainOptions(domain_prefix=domain_prefix)
-        )
-        cognito_domain_url = f"https://{domain_prefix}.auth.{self.region}.amazoncognito.com"
-
-        google_idp = cognito.UserPoolIdentityProviderGoogle(
-            self, "GoogleIdP",
-            user_pool=user_pool,
-            client_id=google_client_id,
-            client_secret_value=google_oauth_secret.secret_value,
-            scopes=["openid", "email", "profile"],
-            attribute_mapping=cognito.AttributeMapping(
-                email=cognito.ProviderAttribute.GOOGLE_EMAIL,
-                given_name=cognito.ProviderAttribute.GOOGLE_GIVEN_NAME,
-                family_name=cognito.ProviderAttribute.GOOGLE_FAMILY_NAME
-            )
-        )
-
-        redirect_uri = f"https://{distribution.domain_name}"
-        logout_uri = f"https://{distribution.domain_name}/aws-signout"
-
-        user_pool_client = user_pool.add_client(
-            "UnifiedUserPoolClient",
-            supported_identity_providers=[
-                cognito.UserPoolClientIdentityProvider.GOOGLE,
-                cognito.UserPoolClientIdentityProvider.COGNITO
-            ],
-            o_auth=cognito.OAuthSettings(
-                flows=cognito.OAuthFlows(authorization_code_grant=True),
-                scopes=[
-                    cognito.OAuthScope.OPENID,
-                    cognito.OAuthScope.EMAIL,
-                    cognito.OAuthScope.PROFILE
-                ],
-                callback_urls=[redirect_uri, "http://localhost:3000", "http://localhost"],
-                logout_urls=[logout_uri, "http://localhost:3000/aws-signout", "http://localhost/aws-signout"]
-            ),
-            prevent_user_existence_errors=True,
-            auth_flows=cognito.AuthFlow(
-                user_password=True,
-                user_srp=True,
-                admin_user_password=True
-            )
-        )
-        user_pool_client.node.add_dependency(google_idp)
-
-        # ---------------------------------------------------------------------
-        # (G)  inject env nel container ECS
-        # ---------------------------------------------------------------------
-        container_def = service.task_definition.default_container
-        if container_def:
-            container_def.add_environment("REACT_APP_COGNITO_USER_POOL_ID", user_pool.user_pool_id)
-            container_def.add_environment("REACT_APP_COGNITO_CLIENT_ID", user_pool_client.user_pool_client_id)
-            container_def.add_environment("REACT_APP_COGNITO_REGION", self.region)
-            container_def.add_environment("REACT_APP_COGNITO_REDIRECT_URI", redirect_uri)
-            container_def.add_environment("REACT_APP_COGNITO_SCOPE", "profile openid email")
-            container_def.add_environment("REACT_APP_LOGOUT_URI", logout_uri)
-            container_def.add_environment("REACT_APP_COGNITO_DOMAIN", cognito_domain_url)
-            container_def.add_environment(
-                "REACT_APP_COGNITO_AUTHORITY",
-                f"https://cognito-idp.{self.region}.amazonaws.com/{user_pool.user_pool_id}"
-            )
-            container_def.add_environment("BUILD_VERSION", image_tag)
-
-        # ---------------------------------------------------------------------
-        # (H)  Outputs
-        # ---------------------------------------------------------------------
-        CfnOutput(self, "CloudFrontURL",
-                  value=f"https://{distribution.domain_name}",
-                  description="CloudFront distribution domain")
-
-        CfnOutput(self, "CognitoHostedUIDomain",
-                  value=cognito_domain_url,
-                  description="Cognito Hosted UI domain")
-
-        CfnOutput(self, "UserPoolID", value=user_pool.user_pool_id)
-        CfnOutput(self, "UserPoolClientID", value=user_pool_client.user_pool_client_id)
-        CfnOutput(self, "GoogleClientID", value=google_client_id)
-
-        CfnOutput(self, "LoadBalancerDNS",
-                  value=service.load_balancer.load_balancer_dns_name)
-
-        CfnOutput(self, "CloudFrontSecretHeader",
-                  value="X-CloudFront-Auth",
-                  description="Secret header name used for CloudFront authentication")
-
-        CfnOutput(self, "CloudFrontSecretValue",
-                  value="[Stored in AWS Secrets Manager]",
-                  description="Value stored in AWS Secrets Manager with name: CloudFrontALBSecret")
-        # print the image tag used
-        CfnOutput(self, "ImageTag",
-                  value=image_tag,
+                    "REACT_APP_COGNITO_USER_POOL_ID": "PLACEHOLDER",
+                    "REACT_APP_COGNITO_CLIENT_ID": "PLACEHOLDER",
+                    "REACT_APP_COGNITO_REGION": self.region,
+                    "REACT_APP_COGNITO_REDIRECT_URI": "PLACEHOLDER",
+                    "REACT_APP_COGNITO_SCOPE": "phone openid email",
+                    "REACT_APP_LOGOUT_URI": "PLACEHOLDER",
+                    "REACT_APP_COGNITO_DOMAIN": "PLACEHOLDER",
+                    "BUILD_TIMESTAMP": build_timestamp,
+                    "BUILD_VERSION": image_tag
+                }
+            ),
+            public_load_balancer=True
+        )
+        service.load_balancer.add_security_group(alb_sg)
+
+        # autoscaling su CPU e orari (context "autoscaling").  Niente tracking delle
+        # richieste ALB per target: la metrica segue solo il target‑group blue, che dopo
+        # il primo swap CodeDeploy non riceve traffico e porterebbe il servizio a minCapacity
+        add_service_autoscaling(service, scaling)
+
+        service.task_definition.add_to_execution_role_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "ecr:GetAuthorizationToken",
+                    "ecr:BatchCheckLayerAvailability",
+                    "ecr:GetDownloadUrlForLayer",
+                    "ecr:BatchGetImage"
+                ],
+                resources=["*"]
+            )
+        )
+
+        # ---------------------------------------------------------------------
+        # (C.1)  BLUE / GREEN  (CodeDeploy)
+        # ---------------------------------------------------------------------
+
+        # target‑group blue creato dal pattern
+        blue_tg = service.target_group
+
+        # target‑group green identico
+        green_tg = elbv2.ApplicationTargetGroup(
+            self, "GreenTG",
+            vpc=vpc,
+            port=80,
+            protocol=elbv2.ApplicationProtocol.HTTP,
+            target_type=elbv2.TargetType.IP,
+            health_check=elbv2.HealthCheck(path="/")
+        )
+
+        # App e Deployment‑Group CodeDeploy
+        cd_app = codedeploy.EcsApplication(self, "BlueGreenApp", application_name="BlueGreenApp")
+        codedeploy.EcsDeploymentGroup(
+            self, "BlueGreenDG",
+            application=cd_app,
+            service=service.service,
+            deployment_group_name="BlueGreenDG",
+            blue_green_deployment_config=codedeploy.EcsBlueGreenDeploymentConfig(
+                listener=service.listener,
+                blue_target_group=blue_tg,
+                green_target_group=green_tg
+            ),
+            deployment_config=codedeploy.EcsDeploymentConfig.LINEAR_10_PERCENT_EVERY_1_MINUTES,
+            auto_rollback=codedeploy.AutoRollbackConfig(
+                failed_deployment=True,
+                stopped_deployment=True
+            )
+        )
+
+        # ---------------------------------------------------------------------
+        # (D)  WAF per ALB
+        # ---------------------------------------------------------------------
+        alb_waf = wafv2.CfnWebACL(
+            self, "ALBWebACL",
+            scope="REGIONAL",
+            default_action=wafv2.CfnWebACL.DefaultActionProperty(allow={}),
+            visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                cloud_watch_metrics_enabled=True,
+                metric_name="ALBWebACL",
+                sampled_requests_enabled=True
+            ),
+            description="WebACL protecting ALB from unauthorized access",
+            rules=[
+                wafv2.CfnWebACL.RuleProperty(
+                    name="RequireCloudFrontHeader",
+                    priority=0,
+                    action=wafv2.CfnWebACL.RuleActionProperty(block={}),
+                    statement=wafv2.CfnWebACL.StatementProperty(
+                        not_statement=wafv2.CfnWebACL.NotStatementProperty(
+                            statement=wafv2.CfnWebACL.StatementProperty(
+                                byte_match_statement=wafv2.CfnWebACL.ByteMatchStatementProperty(
+                                    field_to_match=wafv2.CfnWebACL.FieldToMatchProperty(
+                                        single_header={"Name": "X-CloudFront-Auth"}
+                                    ),
+                                    positional_constraint="EXACTLY",
+                                    search_string=cf_alb_secret_value,
+                                    text_transformations=[
+                                        wafv2.CfnWebACL.TextTransformationProperty(
+                                            priority=0, type="NONE"
+                                        )
+                                    ],
+                                )
+                            )
+                        )
+                    ),
+                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                        cloud_watch_metrics_enabled=True,
+                        metric_name="RequireCloudFrontHeader",
+                        sampled_requests_enabled=True
+                    )
+                ),
+                wafv2.CfnWebACL.RuleProperty(
+                    name="AWSManagedCommonRule",
+                    priority=1,
+                    override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
+                    statement=wafv2.CfnWebACL.StatementProperty(
+                        managed_rule_group_statement=wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
+                            vendor_name="AWS",
+                            name="AWSManagedRulesCommonRuleSet"
+                        )
+                    ),
+                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                        cloud_watch_metrics_enabled=True,
+                        metric_name="AWSManagedCommonRule",
+                        sampled_requests_enabled=True
+                    )
+                ),
+                wafv2.CfnWebACL.RuleProperty(
+                    name="RateLimit",
+                    priority=2,
+                    action=wafv2.CfnWebACL.RuleActionProperty(block={}),
+                    statement=wafv2.CfnWebACL.StatementProperty(
+                        rate_based_statement=wafv2.CfnWebACL.RateBasedStatementProperty(
+                            limit=1000,
+                            aggregate_key_type="IP"
+                        )
+                    ),
+                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                        cloud_watch_metrics_enabled=True,
+                        metric_name="RateLimit",
+                        sampled_requests_enabled=True
+                    )
+                )
+            ]
+        )
+        wafv2.CfnWebACLAssociation(
+            self, "ALBWAFAssociation",
+            resource_arn=service.load_balancer.load_balancer_arn,
+            web_acl_arn=alb_waf.attr_arn
+        )
+
+        # ---------------------------------------------------------------------
+        # (E)  CloudFront + WAF
+        # ---------------------------------------------------------------------
+        cf_waf = wafv2.CfnWebACL(
+            self, "CloudFrontWAF",
+            scope="CLOUDFRONT",
+            default_action=wafv2.CfnWebACL.DefaultActionProperty(allow={}),
+            visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                cloud_watch_metrics_enabled=True,
+                metric_name="CloudFrontWAF",
+                sampled_requests_enabled=True
+            ),
+            description="WAF for CloudFront distribution",
+            rules=[
+                wafv2.CfnWebACL.RuleProperty(
+                    name="ManagedCommonRuleSet",
+                    priority=0,
+                    override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
+                    statement=wafv2.CfnWebACL.StatementProperty(
+                        managed_rule_group_statement=wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
+                            vendor_name="AWS",
+                            name="AWSManagedRulesCommonRuleSet"
+                        )
+                    ),
+                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                        cloud_watch_metrics_enabled=True,
+                        metric_name="CommonRuleSet",
+                        sampled_requests_enabled=True
+                    )
+                ),
+                wafv2.CfnWebACL.RuleProperty(
+                    name="ManagedIPReputationList",
+                    priority=1,
+                    override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
+                    statement=wafv2.CfnWebACL.StatementProperty(
+                        managed_rule_group_statement=wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
+                            vendor_name="AWS",
+                            name="AWSManagedRulesAmazonIpReputationList"
+                        )
+                    ),
+                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                        cloud_watch_metrics_enabled=True,
+                        metric_name="IPReputationList",
+                        sampled_requests_enabled=True
+                    )
+                ),
+                wafv2.CfnWebACL.RuleProperty(
+                    name="CloudFrontRateLimit",
+                    priority=2,
+                    action=wafv2.CfnWebACL.RuleActionProperty(block={}),
+                    statement=wafv2.CfnWebACL.StatementProperty(
+                        rate_based_statement=wafv2.CfnWebACL.RateBasedStatementProperty(
+                            limit=2000,
+                            aggregate_key_type="IP"
+                        )
+                    ),
+                    visibility_config=wafv2.CfnWebACL.VisibilityConfigProperty(
+                        cloud_watch_metrics_enabled=True,
+                        metric_name="CloudFrontRateLimit",
+                        sampled_requests_enabled=True
+                    )
+                )
+            ]
+        )
+
+        alb_origin = origins.LoadBalancerV2Origin(
+            service.load_balancer,
+            protocol_policy=cloudfront.OriginProtocolPolicy.HTTP_ONLY,
+            custom_headers={"X-CloudFront-Auth": cf_alb_secret_value}
+        )
+
+        # ---------- bucket S3 per il corpus DICOM (/assets/*) ----------
+        # i .dcm non sono più nell'immagine nginx: CloudFront li legge dal
+        # bucket (privato, accesso solo tramite Origin Access Control)
+        assets_bucket = s3.Bucket(
+            self, "AssetsBucket",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            # dati clinici: il bucket sopravvive alla cancellazione dello stack
+            removal_policy=RemovalPolicy.RETAIN
+        )
+        assets_origin = origins.S3BucketOrigin.with_origin_access_control(assets_bucket)
+
+        # upload opzionale da context (-c assetsDir=...); in CI si usa `aws s3 sync`
+        assets_dir = self.node.try_get_context("assetsDir")
+        if assets_dir:
+            s3deploy.BucketDeployment(
+                self, "AssetsDeployment",
+                sources=[s3deploy.Source.asset(assets_dir)],
+                destination_bucket=assets_bucket,
+                destination_key_prefix="assets/",
+                prune=False,
+                memory_limit=1024
+            )
+        # ---------- cache policy per tipo di contenuto ----------
+        # bundle JS/CSS con hash nel nome: immutabili, cache "per sempre"
+        static_cache_policy = cloudfront.CachePolicy(
+            self, "StaticBundleCachePolicy",
+            comment="Hashed CRA bundles (/static/*): immutable, cached for a year",
+            default_ttl=Duration.days(365),
+            min_ttl=Duration.days(1),
+            max_ttl=Duration.days(365),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True
+        )
+        # file DICOM: nominati per UID, non cambiano; nessun header nella cache
+        # key (Range compreso), così CloudFront tiene l'oggetto intero e serve
+        # i byte‑range dalla cache
+        assets_cache_policy = cloudfront.CachePolicy(
+            self, "DicomAssetsCachePolicy",
+            comment="DICOM corpus and media (/assets/*): long TTL, range requests served from cache",
+            default_ttl=Duration.days(30),
+            min_ttl=Duration.hours(1),
+            max_ttl=Duration.days(365),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True
+        )
+
+        def cached_behavior(cache_policy, origin=alb_origin):
+            # GET/HEAD soltanto, nessun cookie o header di auth verso l'origin
+            return cloudfront.BehaviorOptions(
+                origin=origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD_OPTIONS,
+                cached_methods=cloudfront.CachedMethods.CACHE_GET_HEAD_OPTIONS,
+                cache_policy=cache_policy,
+                compress=True
+            )
+
+        def uncached_behavior():
+            # entry point e config runtime: sempre dall'origin
+            return cloudfront.BehaviorOptions(
+                origin=alb_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                compress=True
+            )
+
+        distribution = cloudfront.Distribution(
+            self, "ReactAppDistribution",
+            # route SPA: non in cache, header di auth e cookie inoltrati all'app
+            default_behavior=cloudfront.BehaviorOptions(
+                origin=alb_origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER
+            ),
+            additional_behaviors={
+                "/static/*": cached_behavior(static_cache_policy),
+                "/assets/*": cached_behavior(assets_cache_policy, assets_origin),
+                "/index.html": uncached_behavior(),
+                "/env-config.js": uncached_behavior(),
+            },
+            web_acl_id=cf_waf.attr_arn
+        )
+
+        # ---------------------------------------------------------------------
+        # (F)  Cognito + Google IdP
+        # ---------------------------------------------------------------------
+        external_id = self.account
+
+        sms_role = iam.Role(
+            self, "CognitoSMSRole",
+            assumed_by=iam.ServicePrincipal(
+                "cognito-idp.amazonaws.com",
+                conditions={"StringEquals": {"sts:ExternalId": external_id}}
+            ),
+            inline_policies={
+                "AllowSnsPublish": iam.PolicyDocument(statements=[
+                    iam.PolicyStatement(actions=["sns:Publish"], resources=["*"])
+                ])
+            }
+        )
+
+        user_pool = cognito.UserPool(
+            self, "UserPool",
+            self_sign_up_enabled=True,
+            sign_in_aliases=cognito.SignInAliases(email=True),
+            standard_attributes=cognito.StandardAttributes(
+                email=cognito.StandardAttribute(required=True, mutable=True),
+                given_name=cognito.StandardAttribute(required=True, mutable=True),
+                family_name=cognito.StandardAttribute(required=True, mutable=True)
+            ),
+            auto_verify=cognito.AutoVerifiedAttrs(email=True),
+            password_policy=cognito.PasswordPolicy(
+                min_length=8,
+                require_lowercase=True,
+                require_uppercase=True,
+                require_digits=True,
+                require_symbols=True
+            ),
+            account_recovery=cognito.AccountRecovery.EMAIL_ONLY,
+            mfa=cognito.Mfa.REQUIRED,
+            mfa_second_factor=cognito.MfaSecondFactor(sms=True, otp=True),
+            sms_role=sms_role,
+            sms_role_external_id=external_id,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # forza MFA a livello CFN
+        cfn_user_pool = user_pool.node.default_child
+        cfn_user_pool.add_property_override("MfaConfiguration", "ON")
+        cfn_user_pool.add_property_override("EnabledMfas", ["SMS_MFA", "SOFTWARE_TOKEN_MFA"])
+        cfn_user_pool.add_property_override("SmsConfiguration", {
+            "ExternalId": external_id,
+            "SnsCallerArn": sms_role.role_arn
+        })
+
+        domain_prefix = f"auth-app-{self.account}"
+        user_pool.add_domain(
+            "UserPoolDomain",
+            cognito_domain=cognito.CognitoDomainOptions(domain_prefix=domain_prefix)
+        )
+        cognito_domain_url = f"https://{domain_prefix}.auth.{self.region}.amazoncognito.com"
+
+        google_idp = cognito.UserPoolIdentityProviderGoogle(
+            self, "GoogleIdP",
+            user_pool=user_pool,
+            client_id=google_client_id,
+            client_secret_value=google_oauth_secret.secret_value,
+            scopes=["openid", "email", "profile"],
+            attribute_mapping=cognito.AttributeMapping(
+                email=cognito.ProviderAttribute.GOOGLE_EMAIL,
+                given_name=cognito.ProviderAttribute.GOOGLE_GIVEN_NAME,
+                family_name=cognito.ProviderAttribute.GOOGLE_FAMILY_NAME
+            )
+        )
+
+        redirect_uri = f"https://{distribution.domain_name}"
+        logout_uri = f"https://{distribution.domain_name}/aws-signout"
+
+        user_pool_client = user_pool.add_client(
+            "UnifiedUserPoolClient",
+            supported_identity_providers=[
+                cognito.UserPoolClientIdentityProvider.GOOGLE,
+                cognito.UserPoolClientIdentityProvider.COGNITO
+            ],
+            o_auth=cognito.OAuthSettings(
+                flows=cognito.OAuthFlows(authorization_code_grant=True),
+                scopes=[
+                    cognito.OAuthScope.OPENID,
+                    cognito.OAuthScope.EMAIL,
+                    cognito.OAuthScope.PROFILE
+                ],
+                callback_urls=[redirect_uri, "http://localhost:3000", "http://localhost"],
+                logout_urls=[logout_uri, "http://localhost:3000/aws-signout", "http://localhost/aws-signout"]
+            ),
+            prevent_user_existence_errors=True,
+            auth_flows=cognito.AuthFlow(
+                user_password=True,
+                user_srp=True,
+                admin_user_password=True
+            )
+        )
+        user_pool_client.node.add_dependency(google_idp)
+
+        # ---------------------------------------------------------------------
+        # (G)  inject env nel container ECS
+        # ---------------------------------------------------------------------
+        container_def = service.task_definition.default_container
+        if container_def:
+            container_def.add_environment("REACT_APP_COGNITO_USER_POOL_ID", user_pool.user_pool_id)
+            container_def.add_environment("REACT_APP_COGNITO_CLIENT_ID", user_pool_client.user_pool_client_id)
+            container_def.add_environment("REACT_APP_COGNITO_REGION", self.region)
+            container_def.add_environment("REACT_APP_COGNITO_REDIRECT_URI", redirect_uri)
+            container_def.add_environment("REACT_APP_COGNITO_SCOPE", "profile openid email")
+            container_def.add_environment("REACT_APP_LOGOUT_URI", logout_uri)
+            container_def.add_environment("REACT_APP_COGNITO_DOMAIN", cognito_domain_url)
+            container_def.add_environment(
+                "REACT_APP_COGNITO_AUTHORITY",
+                f"https://cognito-idp.{self.region}.amazonaws.com/{user_pool.user_pool_id}"
+            )
+            container_def.add_environment("BUILD_VERSION", image_tag)
+
+        # ---------------------------------------------------------------------
+        # (H)  Outputs
+        # ---------------------------------------------------------------------
+        CfnOutput(self, "CloudFrontURL",
+                  value=f"https://{distribution.domain_name}",
+                  description="CloudFront distribution domain")
+
+        CfnOutput(self, "CognitoHostedUIDomain",
+                  value=cognito_domain_url,
+                  description="Cognito Hosted UI domain")
+
+        CfnOutput(self, "UserPoolID", value=user_pool.user_pool_id)
+        CfnOutput(self, "UserPoolClientID", value=user_pool_client.user_pool_client_id)
+        CfnOutput(self, "GoogleClientID", value=google_client_id)
+
+        CfnOutput(self, "AssetsBucketName",
+                  value=assets_bucket.bucket_name,
+                  description="S3 bucket behind /assets/* (sync public/assets to s3://<bucket>/assets/)")
+
+        CfnOutput(self, "LoadBalancerDNS",
+                  value=service.load_balancer.load_balancer_dns_name)
+
+        CfnOutput(self, "CloudFrontSecretHeader",
+                  value="X-CloudFront-Auth",
+                  description="Secret header name used for CloudFront authentication")
+
+        CfnOutput(self, "CloudFrontSecretValue",
+                  value="[Stored in AWS Secrets Manager]",
+                  description="Value stored in AWS Secrets Manager with name: CloudFrontALBSecret")
+        # print the image tag used
+        CfnOutput(self, "ImageTag",
+                  value=image_tag,
                   description="Image tag used for the ECR image")
\ No newline at end of file
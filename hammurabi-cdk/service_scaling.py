@@ -0,0 +1,99 @@
+"""
+Task size and autoscaling of ReactFargateService, read from CDK context.
+
+Both stacks used to pin the service at two 256 CPU / 512 MiB tasks.  The
+"autoscaling" context key (cdk.json, or -c autoscaling='{"maxCapacity": 8}')
+overrides any of the DEFAULTS below; the service then tracks the ALB
+request count per target and the CPU utilisation between minCapacity and
+maxCapacity, and "schedules" move those bounds for known busy hours.
+Blue/green services (ReactCdkCompleteStack) scale on CPU and schedules only,
+see scaling_settings():
+
+    "autoscaling": {
+        "minCapacity": 2, "maxCapacity": 10,
+        "schedules": [{"name": "ReadingHours", "schedule": "cron(0 6 ? * MON-FRI *)",
+                       "minCapacity": 4}]
+    }
+"""
+import json
+
+from aws_cdk import Duration, aws_applicationautoscaling as appscaling
+
+DEFAULTS = {
+    "cpu": 256,
+    "memoryMiB": 512,
+    "minCapacity": 2,
+    "maxCapacity": 6,
+    # target tracking; set either to 0 to drop that policy
+    "requestsPerTarget": 1000,
+    "cpuTargetPercent": 60,
+    "scaleInCooldownSeconds": 300,
+    "scaleOutCooldownSeconds": 60,
+    # [{"name", "schedule" (cron()/rate()/at() expression, UTC), "minCapacity", "maxCapacity"}]
+    "schedules": [],
+}
+
+
+def scaling_settings(node, blue_green=False):
+    """
+    DEFAULTS overridden by the "autoscaling" context value (a dict or a JSON string).
+
+    With ``blue_green`` (a CodeDeploy blue/green service) request count
+    tracking is off: ALBRequestCountPerTarget follows a single target group,
+    which stops receiving traffic after the first swap and would hold the
+    service at minCapacity.  Setting requestsPerTarget there is an error
+    rather than a value silently ignored.
+    """
+    override = node.try_get_context("autoscaling") or {}
+    if isinstance(override, str):
+        override = json.loads(override)
+    unknown = set(override) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown autoscaling setting(s) {sorted(unknown)}")
+    settings = {**DEFAULTS, **override}
+    if blue_green:
+        if override.get("requestsPerTarget"):
+            raise ValueError("requestsPerTarget is not supported for blue/green services "
+                             "(the metric follows one target group); use cpuTargetPercent and schedules")
+        settings["requestsPerTarget"] = 0
+    if not 1 <= settings["minCapacity"] <= settings["maxCapacity"]:
+        raise ValueError("autoscaling needs 1 <= minCapacity <= maxCapacity")
+    for schedule in settings["schedules"]:
+        if not schedule.get("name") or not schedule.get("schedule"):
+            raise ValueError(f"scheduled scaling needs a name and a schedule: {schedule}")
+        if schedule.get("minCapacity") is None and schedule.get("maxCapacity") is None:
+            raise ValueError(f"scheduled scaling {schedule['name']} sets neither minCapacity nor maxCapacity")
+    return settings
+
+
+def add_service_autoscaling(service, settings):
+    """Attach the target tracking and scheduled policies of ``settings`` to an ALB Fargate service."""
+    scaling = service.service.auto_scale_task_count(
+        min_capacity=settings["minCapacity"],
+        max_capacity=settings["maxCapacity"],
+    )
+    cooldowns = {
+        "scale_in_cooldown": Duration.seconds(settings["scaleInCooldownSeconds"]),
+        "scale_out_cooldown": Duration.seconds(settings["scaleOutCooldownSeconds"]),
+    }
+    if settings["requestsPerTarget"]:
+        scaling.scale_on_request_count(
+            "RequestCountScaling",
+            requests_per_target=settings["requestsPerTarget"],
+            target_group=service.target_group,
+            **cooldowns,
+        )
+    if settings["cpuTargetPercent"]:
+        scaling.scale_on_cpu_utilization(
+            "CpuScaling",
+            target_utilization_percent=settings["cpuTargetPercent"],
+            **cooldowns,
+        )
+    for schedule in settings["schedules"]:
+        scaling.scale_on_schedule(
+            schedule["name"],
+            schedule=appscaling.Schedule.expression(schedule["schedule"]),
+            min_capacity=schedule.get("minCapacity"),
+            max_capacity=schedule.get("maxCapacity"),
+        )
+    return scaling
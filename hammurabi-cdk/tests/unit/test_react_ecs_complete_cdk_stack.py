@@ -0,0 +1,175 @@
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from react_ecs_complete_cdk.react_ecs_complete_cdk_stack import ReactCdkCompleteStack
+
+
+def synth(tmp_path, **context):
+    secrets = tmp_path / "google_secrets.json"
+    secrets.write_text(json.dumps({"web": {"client_id": "test-client", "client_secret": "test-secret"}}))
+    app = core.App(context={"googleSecretsFile": str(secrets), **context})
+    stack = ReactCdkCompleteStack(app, "react-cdk-complete")
+    return assertions.Template.from_stack(stack)
+
+
+@pytest.fixture(scope="module")
+def template(tmp_path_factory):
+    return synth(tmp_path_factory.mktemp("complete"))
+
+
+def behavior(template, path_pattern):
+    distribution = next(iter(template.find_resources("AWS::CloudFront::Distribution").values()))
+    for item in distribution["Properties"]["DistributionConfig"]["CacheBehaviors"]:
+        if item["PathPattern"] == path_pattern:
+            return item
+    raise AssertionError(f"no cache behavior for {path_pattern}")
+
+
+def cache_policy(template, behavior_item):
+    policy_id = behavior_item["CachePolicyId"]
+    if isinstance(policy_id, dict):  # one of ours: {"Ref": logical id}
+        return template.to_json()["Resources"][policy_id["Ref"]]["Properties"]["CachePolicyConfig"]
+    return policy_id  # managed policy id
+
+
+# Managed CloudFront policy ids
+CACHING_DISABLED = "4135ea2d-6df8-44a3-9df3-4b5a84be39ad"
+ALL_VIEWER_EXCEPT_HOST_HEADER = "b689b0a8-53d0-40ab-baf2-68738e2966ac"
+
+
+def test_default_behavior_is_uncached_and_forwards_viewer_headers(template):
+    template.has_resource_properties("AWS::CloudFront::Distribution", {
+        "DistributionConfig": assertions.Match.object_like({
+            "DefaultCacheBehavior": assertions.Match.object_like({
+                "CachePolicyId": CACHING_DISABLED,
+                "OriginRequestPolicyId": ALL_VIEWER_EXCEPT_HOST_HEADER,
+                "ViewerProtocolPolicy": "redirect-to-https",
+            }),
+        }),
+    })
+
+
+@pytest.mark.parametrize("path_pattern", ["/static/*", "/assets/*"])
+def test_static_and_assets_are_cached_long_and_compressed(template, path_pattern):
+    item = behavior(template, path_pattern)
+    assert item["Compress"] is True
+    assert item["AllowedMethods"] == ["GET", "HEAD", "OPTIONS"]
+    assert item["CachedMethods"] == ["GET", "HEAD", "OPTIONS"]
+    # nothing viewer-specific travels to the origin or into the cache key
+    assert "OriginRequestPolicyId" not in item
+
+    policy = cache_policy(template, item)
+    assert policy["DefaultTTL"] >= 30 * 24 * 3600
+    assert policy["MaxTTL"] == 365 * 24 * 3600
+    key = policy["ParametersInCacheKeyAndForwardedToOrigin"]
+    assert key["EnableAcceptEncodingGzip"] is True
+    assert key["EnableAcceptEncodingBrotli"] is True
+    # no header (Range included) in the key: ranges are served from the cached object
+    assert key["HeadersConfig"] == {"HeaderBehavior": "none"}
+    assert key["CookiesConfig"] == {"CookieBehavior": "none"}
+    assert key["QueryStringsConfig"] == {"QueryStringBehavior": "none"}
+
+
+def test_hashed_bundles_are_cached_for_a_year(template):
+    assert cache_policy(template, behavior(template, "/static/*"))["DefaultTTL"] == 365 * 24 * 3600
+
+
+@pytest.mark.parametrize("path_pattern", ["/index.html", "/env-config.js"])
+def test_entry_point_and_runtime_config_are_uncached(template, path_pattern):
+    item = behavior(template, path_pattern)
+    assert item["CachePolicyId"] == CACHING_DISABLED
+    assert item["AllowedMethods"] == ["GET", "HEAD"]
+    assert "OriginRequestPolicyId" not in item
+
+
+def origin_of(template, behavior_item):
+    distribution = next(iter(template.find_resources("AWS::CloudFront::Distribution").values()))
+    origins = distribution["Properties"]["DistributionConfig"]["Origins"]
+    return next(o for o in origins if o["Id"] == behavior_item["TargetOriginId"])
+
+
+def test_assets_come_from_private_bucket_through_oac(template):
+    origin = origin_of(template, behavior(template, "/assets/*"))
+    assert "S3OriginConfig" in origin
+    assert "OriginAccessControlId" in origin
+    template.resource_count_is("AWS::CloudFront::OriginAccessControl", 1)
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "PublicAccessBlockConfiguration": {
+            "BlockPublicAcls": True,
+            "BlockPublicPolicy": True,
+            "IgnorePublicAcls": True,
+            "RestrictPublicBuckets": True,
+        },
+    })
+    template.has_resource_properties("AWS::S3::BucketPolicy", {
+        "PolicyDocument": {
+            "Statement": assertions.Match.array_with([
+                assertions.Match.object_like({
+                    "Action": "s3:GetObject",
+                    "Principal": {"Service": "cloudfront.amazonaws.com"},
+                }),
+            ]),
+        },
+    })
+
+
+def test_app_behaviors_stay_on_the_load_balancer(template):
+    for path_pattern in ["/static/*", "/index.html", "/env-config.js"]:
+        assert "CustomOriginConfig" in origin_of(template, behavior(template, path_pattern))
+
+
+def test_corpus_upload_only_with_assets_dir_context(template, tmp_path):
+    template.resource_count_is("Custom::CDKBucketDeployment", 0)
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "1-01.dcm").write_bytes(b"\0" * 132)
+    with_upload = synth(tmp_path, assetsDir=str(assets))
+    with_upload.has_resource_properties("Custom::CDKBucketDeployment", {
+        "DestinationBucketKeyPrefix": "assets/",
+        "Prune": False,
+    })
+
+
+def test_service_scales_on_cpu_and_schedule_not_blue_target_group_requests(tmp_path):
+    template = synth(tmp_path, autoscaling={
+        "minCapacity": 2,
+        "maxCapacity": 8,
+        "schedules": [{"name": "ReadingHoursStart", "schedule": "cron(0 6 ? * MON-FRI *)", "minCapacity": 4}],
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "MinCapacity": 2,
+        "MaxCapacity": 8,
+        "ScheduledActions": [assertions.Match.object_like({"ScalableTargetAction": {"MinCapacity": 4}})],
+    })
+    metrics = sorted(
+        r["Properties"]["TargetTrackingScalingPolicyConfiguration"]["PredefinedMetricSpecification"]["PredefinedMetricType"]
+        for r in template.find_resources("AWS::ApplicationAutoScaling::ScalingPolicy").values()
+    )
+    # blue/green: ALBRequestCountPerTarget would only see the blue target group
+    assert metrics == ["ECSServiceAverageCPUUtilization"]
+
+
+def test_request_count_target_is_rejected_for_blue_green(tmp_path):
+    with pytest.raises(Exception, match="requestsPerTarget"):
+        synth(tmp_path, autoscaling={"requestsPerTarget": 1000})
+
+
+def test_unchanged_code_synthesizes_to_the_same_template(template, tmp_path):
+    # no random CloudFront secret, no wall-clock BUILD_TIMESTAMP
+    assert synth(tmp_path).to_json() == template.to_json()
+    template.has_resource_properties("AWS::SecretsManager::Secret", {
+        "Name": "CloudFrontALBSecret",
+        "GenerateSecretString": assertions.Match.object_like({"ExcludePunctuation": True}),
+    })
+
+
+def test_build_timestamp_comes_from_context(tmp_path):
+    template = synth(tmp_path, buildTimestamp="1760000000")
+    template.has_resource_properties("AWS::ECS::TaskDefinition", {
+        "ContainerDefinitions": [assertions.Match.object_like({
+            "Environment": assertions.Match.array_with([{"Name": "BUILD_TIMESTAMP", "Value": "1760000000"}]),
+        })],
+    })
@@ -13,3 +13,16 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def test_assets_served_from_private_bucket():
+    app = core.App()
+    stack = ReactEcsCdkStack(app, "react-ecs-cdk")
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::CloudFront::OriginAccessControl", 1)
+    template.has_resource_properties("AWS::CloudFront::Distribution", {
+        "DistributionConfig": assertions.Match.object_like({
+            "CacheBehaviors": [assertions.Match.object_like({"PathPattern": "/assets/*", "Compress": True})],
+        }),
+    })
@@ -0,0 +1,78 @@
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from react_ecs_cdk.react_ecs_cdk_stack import ReactEcsCdkStack
+
+
+def synth(autoscaling=None):
+    app = core.App(context={"autoscaling": autoscaling} if autoscaling is not None else None)
+    return assertions.Template.from_stack(ReactEcsCdkStack(app, "react-ecs-cdk"))
+
+
+def tracking_policies(template):
+    return {
+        props["TargetTrackingScalingPolicyConfiguration"]["PredefinedMetricSpecification"]["PredefinedMetricType"]:
+            props["TargetTrackingScalingPolicyConfiguration"]
+        for props in (r["Properties"] for r in template.find_resources("AWS::ApplicationAutoScaling::ScalingPolicy").values())
+    }
+
+
+def test_default_scaling_tracks_requests_and_cpu():
+    template = synth()
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "MinCapacity": 2,
+        "MaxCapacity": 6,
+        "ScalableDimension": "ecs:service:DesiredCount",
+    })
+    policies = tracking_policies(template)
+    assert set(policies) == {"ALBRequestCountPerTarget", "ECSServiceAverageCPUUtilization"}
+    assert policies["ALBRequestCountPerTarget"]["TargetValue"] == 1000
+    assert policies["ALBRequestCountPerTarget"]["ScaleInCooldown"] == 300
+    assert policies["ALBRequestCountPerTarget"]["ScaleOutCooldown"] == 60
+    assert policies["ECSServiceAverageCPUUtilization"]["TargetValue"] == 60
+    template.has_resource_properties("AWS::ECS::Service", {"DesiredCount": 2})
+
+
+def test_context_sets_capacity_task_size_and_schedules():
+    template = synth(json.dumps({
+        "cpu": 512,
+        "memoryMiB": 1024,
+        "minCapacity": 3,
+        "maxCapacity": 12,
+        "requestsPerTarget": 400,
+        "schedules": [
+            {"name": "ReadingHoursStart", "schedule": "cron(0 6 ? * MON-FRI *)", "minCapacity": 6},
+            {"name": "ReadingHoursEnd", "schedule": "cron(0 19 ? * MON-FRI *)", "minCapacity": 3},
+        ],
+    }))
+    template.has_resource_properties("AWS::ECS::TaskDefinition", {"Cpu": "512", "Memory": "1024"})
+    template.has_resource_properties("AWS::ECS::Service", {"DesiredCount": 3})
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "MinCapacity": 3,
+        "MaxCapacity": 12,
+        "ScheduledActions": [
+            {"ScalableTargetAction": {"MinCapacity": 6}, "Schedule": "cron(0 6 ? * MON-FRI *)",
+             "ScheduledActionName": "ReadingHoursStart"},
+            {"ScalableTargetAction": {"MinCapacity": 3}, "Schedule": "cron(0 19 ? * MON-FRI *)",
+             "ScheduledActionName": "ReadingHoursEnd"},
+        ],
+    })
+    assert tracking_policies(template)["ALBRequestCountPerTarget"]["TargetValue"] == 400
+
+
+def test_a_zero_target_drops_that_policy():
+    policies = tracking_policies(synth({"cpuTargetPercent": 0}))
+    assert set(policies) == {"ALBRequestCountPerTarget"}
+
+
+@pytest.mark.parametrize("autoscaling", [
+    {"minCapacity": 5, "maxCapacity": 2},
+    {"maxCapacitty": 4},
+    {"schedules": [{"name": "Night", "schedule": "cron(0 22 * * ? *)"}]},
+])
+def test_invalid_settings_are_rejected(autoscaling):
+    with pytest.raises(Exception):
+        synth(autoscaling)